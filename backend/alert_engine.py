@@ -0,0 +1,278 @@
+import itertools
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+
+from conditions import ConditionIndex
+
+
+@dataclass
+class Alert:
+    """Ценовой алерт: срабатывает, когда цена пересекает целевой уровень."""
+    id: int
+    owner: str
+    symbol: str
+    price: float
+    created_at: float = field(default_factory=time.time)
+
+
+class _SymbolAlerts:
+    """
+    Индекс алертов одного символа.
+    Уровни хранятся в двух отсортированных массивах (выше и ниже текущей цены),
+    параллельно им хранятся id алертов - так пересечение находится бинарным поиском.
+    """
+    __slots__ = ('above_prices', 'above_ids', 'below_prices', 'below_ids', 'pending_ids')
+
+    def __init__(self):
+        self.above_prices: list[float] = []
+        self.above_ids: list[int] = []
+        self.below_prices: list[float] = []
+        self.below_ids: list[int] = []
+        # Алерты, добавленные до первой известной цены: сторону определим на первом тике
+        self.pending_ids: list[int] = []
+
+    def __len__(self):
+        return len(self.above_ids) + len(self.below_ids) + len(self.pending_ids)
+
+    @staticmethod
+    def _insert(prices: list, ids: list, price: float, alert_id: int):
+        index = bisect_right(prices, price)
+        prices.insert(index, price)
+        ids.insert(index, alert_id)
+
+    @staticmethod
+    def _remove(prices: list, ids: list, price: float, alert_id: int) -> bool:
+        index = bisect_left(prices, price)
+        while index < len(prices) and prices[index] == price:
+            if ids[index] == alert_id:
+                del prices[index]
+                del ids[index]
+                return True
+            index += 1
+        return False
+
+    def add(self, alert: Alert, last_price: float | None):
+        if last_price is None:
+            self.pending_ids.append(alert.id)
+        elif alert.price > last_price:
+            self._insert(self.above_prices, self.above_ids, alert.price, alert.id)
+        else:
+            self._insert(self.below_prices, self.below_ids, alert.price, alert.id)
+
+    def remove(self, alert: Alert) -> bool:
+        if alert.id in self.pending_ids:
+            self.pending_ids.remove(alert.id)
+            return True
+        return (self._remove(self.above_prices, self.above_ids, alert.price, alert.id)
+                or self._remove(self.below_prices, self.below_ids, alert.price, alert.id))
+
+    def pop_crossed(self, previous_price: float, price: float) -> list[int]:
+        """
+        Забирает id всех алертов, уровни которых лежат между предыдущей и текущей ценой.
+        Сложность O(log n + k), где k - число сработавших алертов.
+        """
+        if price > previous_price:
+            prices, ids = self.above_prices, self.above_ids
+        elif price < previous_price:
+            prices, ids = self.below_prices, self.below_ids
+        else:
+            return []
+
+        low, high = min(previous_price, price), max(previous_price, price)
+        start = bisect_left(prices, low)
+        end = bisect_right(prices, high)
+        if start == end:
+            return []
+
+        crossed = ids[start:end]
+        del prices[start:end]
+        del ids[start:end]
+        return crossed
+
+
+class AlertEngine:
+    """
+    Серверный движок ценовых алертов.
+    Проверяется на каждом тике из BinanceWsClient, поэтому не зависит от открытых вкладок браузера.
+    """
+
+    def __init__(self, on_trigger=None, last_prices_ref: dict | None = None,
+                 candle_store=None, on_condition_trigger=None):
+        """
+        :param on_trigger: Синхронный колбэк on_trigger(alerts, price, previous_price),
+                           вызывается для сработавших алертов. Не должен блокировать цикл.
+        :param last_prices_ref: Словарь последних цен, по нему новый алерт относится к стороне "выше"/"ниже".
+        :param candle_store: CandleStore; если задан, поддерживаются условные алерты (ConditionIndex).
+        :param on_condition_trigger: Синхронный колбэк on_condition_trigger([(alert, value)], price).
+        """
+        self._on_trigger = on_trigger
+        self._on_condition_trigger = on_condition_trigger
+        self.conditions = ConditionIndex(candle_store) if candle_store is not None else None
+        self._alerts: dict[int, Alert] = {}
+        self._by_key: dict[tuple, int] = {}  # (owner, symbol, price) -> id, защита от дубликатов
+        self._symbols: dict[str, _SymbolAlerts] = {}
+        self._last_prices: dict[str, float] = last_prices_ref if last_prices_ref is not None else {}
+        self._ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def set_trigger_callback(self, on_trigger):
+        self._on_trigger = on_trigger
+
+    def add_condition(self, owner: str, symbol: str, kind: str, threshold: float, window: int,
+                      direction: str, cooldown: float):
+        """Добавляет условный алерт (см. conditions.ConditionAlert). None, если такой уже есть."""
+        return self.conditions.add(owner, symbol, kind, threshold, window, direction, cooldown)
+
+    def remove_condition(self, key: tuple):
+        return self.conditions.remove(key)
+
+    def add_alert(self, owner: str, symbol: str, price: float) -> Alert | None:
+        """Добавляет алерт. Возвращает None, если такой алерт у владельца уже есть."""
+        key = (owner, symbol, price)
+        if key in self._by_key:
+            return None
+        alert = Alert(id=next(self._ids), owner=owner, symbol=symbol, price=price)
+        self._alerts[alert.id] = alert
+        self._by_key[key] = alert.id
+        book = self._symbols.get(symbol)
+        if book is None:
+            book = self._symbols[symbol] = _SymbolAlerts()
+        book.add(alert, self._last_prices.get(symbol))
+        return alert
+
+    def remove_alert(self, owner: str, symbol: str, price: float) -> Alert | None:
+        alert_id = self._by_key.get((owner, symbol, price))
+        if alert_id is None:
+            return None
+        alert = self._alerts[alert_id]
+        self._forget(alert)
+        book = self._symbols.get(symbol)
+        if book is not None:
+            book.remove(alert)
+            if not book:
+                del self._symbols[symbol]
+        return alert
+
+    def remove_owner_alerts(self, owner: str, symbol: str | None = None) -> list[Alert]:
+        """Удаляет все алерты владельца (или только по одному символу)."""
+        removed = [
+            a for a in list(self._alerts.values())
+            if a.owner == owner and (symbol is None or a.symbol == symbol)
+        ]
+        for alert in removed:
+            self.remove_alert(alert.owner, alert.symbol, alert.price)
+        return removed
+
+    def symbols(self) -> set:
+        """Символы, по которым есть хотя бы один активный алерт."""
+        if self.conditions is not None:
+            return set(self._symbols) | self.conditions.symbols()
+        return set(self._symbols)
+
+    def price_alert_symbols(self) -> set:
+        """Символы, по которым есть ценовые алерты."""
+        return set(self._symbols)
+
+    def market_symbols(self) -> tuple[set, set]:
+        """Символы, для которых нужны стакан (@depth) и сделки (@aggTrade)."""
+        if self.conditions is None:
+            return set(), set()
+        return self.conditions.market_symbols()
+
+    def get_alerts(self, owner: str | None = None, symbol: str | None = None) -> list[Alert]:
+        return [
+            a for a in self._alerts.values()
+            if (owner is None or a.owner == owner) and (symbol is None or a.symbol == symbol)
+        ]
+
+    def process_tick(self, symbol: str, previous_price: float | None, price: float,
+                     now: float | None = None) -> list[Alert]:
+        """
+        Находит и снимает все алерты символа, пересечённые движением previous_price -> price,
+        и проверяет условные алерты символа.
+        Вызывается из BinanceWsClient._process_message на каждом тике.
+        """
+        self._last_prices[symbol] = price
+        if self.conditions is not None:
+            fired = self.conditions.evaluate(symbol, price, now if now is not None else time.time())
+            if fired and self._on_condition_trigger is not None:
+                self._on_condition_trigger(fired, price)
+
+        book = self._symbols.get(symbol)
+        if book is None:
+            return []
+
+        if book.pending_ids:
+            self._classify_pending(book, price)
+        if previous_price is None or previous_price == price:
+            return []
+
+        return self._trigger_crossed(symbol, book, previous_price, price)
+
+    def process_range(self, symbol: str, low: float, high: float) -> list[Alert]:
+        """
+        Снимает ценовые алерты символа, уровни которых лежат между последней ценой и low/high -
+        цена побывала в этом диапазоне, пока поток тиков был недоступен (восстанавливается по REST).
+        Последняя цена не меняется: её обновит первый тик после переподключения.
+        """
+        book = self._symbols.get(symbol)
+        last_price = self._last_prices.get(symbol)
+        if book is None or last_price is None:
+            return []
+        if book.pending_ids:
+            self._classify_pending(book, last_price)
+        triggered = []
+        for extreme in (high, low):
+            triggered += self._trigger_crossed(symbol, book, last_price, extreme)
+        return triggered
+
+    def _trigger_crossed(self, symbol: str, book: _SymbolAlerts, previous_price: float, price: float) -> list[Alert]:
+        crossed_ids = book.pop_crossed(previous_price, price)
+        if not crossed_ids:
+            return []
+
+        triggered = []
+        for alert_id in crossed_ids:
+            alert = self._alerts[alert_id]
+            self._forget(alert)
+            triggered.append(alert)
+        if not book:
+            del self._symbols[symbol]
+
+        if self._on_trigger is not None:
+            self._on_trigger(triggered, price, previous_price)
+        return triggered
+
+    def process_trade(self, symbol: str, price: float, quantity: float, buyer_maker: bool, now: float):
+        """Проверяет условия по сделкам. Вызывается на каждом событии @aggTrade."""
+        if self.conditions is None:
+            return
+        fired = self.conditions.evaluate_trade(symbol, price, quantity, buyer_maker, now)
+        if fired and self._on_condition_trigger is not None:
+            self._on_condition_trigger(fired, price)
+
+    def process_book(self, symbol: str, order_book, now: float):
+        """Проверяет условия по стакану. Вызывается после каждого применённого обновления @depth."""
+        if self.conditions is None:
+            return
+        # При пустой стороне стакана средней цены нет - в сообщении будет последняя цена тикера
+        price = order_book.mid_price()
+        if price is None:
+            price = self._last_prices.get(symbol)
+            if price is None:
+                return
+        fired = self.conditions.evaluate_book(symbol, order_book, now)
+        if fired and self._on_condition_trigger is not None:
+            self._on_condition_trigger(fired, price)
+
+    def _classify_pending(self, book: _SymbolAlerts, price: float):
+        pending, book.pending_ids = book.pending_ids, []
+        for alert_id in pending:
+            book.add(self._alerts[alert_id], price)
+
+    def _forget(self, alert: Alert):
+        self._alerts.pop(alert.id, None)
+        self._by_key.pop((alert.owner, alert.symbol, alert.price), None)
@@ -1,113 +1,401 @@
 import logging
 import asyncio
-import requests
+import functools
+import inspect
+import time
 
-import aiohttp
 from aiohttp import web
 import socketio
 import aiohttp_cors
 
 from config import (
-    HOST, PORT, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, CORS_ALLOWED_ORIGINS
+    HOST, PORT, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, CORS_ALLOWED_ORIGINS,
+    DB_PATH, DB_FLUSH_INTERVAL_SECONDS, PRICE_FLUSH_INTERVAL_MS, BINANCE_STREAM_TYPE,
+    ALERT_COOLDOWN_SECONDS, TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE,
+    TELEGRAM_COALESCE_WINDOW_SECONDS, TELEGRAM_QUEUE_SIZE, PRICE_DELTA_HISTORY,
+    APP_ROLE, FEED_SOCKET_PATH, INGEST_PORT,
+    LOG_LEVEL, LOG_FORMAT, LOG_RATE_LIMIT_BURST, LOG_RATE_LIMIT_PERIOD_SECONDS,
+    MARKET_CACHE_PATH, MARKET_REFRESH_INTERVAL_SECONDS, BINANCE_DEPTH_SNAPSHOT_LIMIT,
+    CLIENT_BACKLOG_HIGH, CLIENT_BACKLOG_LOW, CLIENT_BACKLOG_MAX, CLIENT_SLOW_TIMEOUT_SECONDS,
+    CLIENT_MAX_PENDING_SYMBOLS, BINANCE_MAX_DEPTH_SYMBOLS
 )
 
 from binance_client import BinanceWsClient
-from telegram_bot import setup_telegram_bot
+from binance_rest import create_session, fetch_ticker_prices, fetch_depth_snapshot, fetch_klines
+from market_meta import MarketMetadata
+from alert_engine import AlertEngine
+from storage import AlertStore
+from subscriptions import SubscriptionRegistry, symbol_room, watchlist_room
+from publisher import PriceUpdatePublisher
+from backpressure import SlowClientGuard
+from candles import CandleStore, INTERVALS
+from conditions import validate_condition, BOOK_KINDS
+from telegram_bot import setup_telegram_bot, BOT_COMMANDS
+from telegram_users import TelegramUsers, owner_chat
+from telegram_queue import TelegramDeliveryQueue
+from symbol_index import SymbolSearchIndex, MAX_QUERY_LENGTH
+from snapshots import SnapshotCache
+from codec import SocketJson
+from feed import FeedHub, FeedClient, FeedPubSubManager
+from logs import setup_logging
+import metrics
 
 # --- Настройка логирования ---
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
-logging.getLogger('httpx').setLevel(logging.WARNING)
-logging.getLogger('aiohttp.access').setLevel(logging.WARNING)
+setup_logging(LOG_LEVEL, LOG_FORMAT, burst=LOG_RATE_LIMIT_BURST, period=LOG_RATE_LIMIT_PERIOD_SECONDS)
+logger = logging.getLogger('app')
+
+# --- Метрики (остальные объявлены в модулях горячего пути, все отдаются на /metrics) ---
+SOCKET_EVENTS = metrics.Counter('socketio_events_total', 'Handled Socket.IO events', ('event',))
+SOCKET_EVENT_SECONDS = metrics.Histogram('socketio_event_seconds', 'Socket.IO event handler time', ('event',))
 
 # --- Конфигурация ---
 INITIAL_SYMBOLS = ['BTC', 'ETH', 'ADA', 'LINK', 'LTC', 'SOL', 'XRP', 'DOT', 'DOGE', 'TON', 'TRUMP']
-# Интервал обновления в секундах (6 часов = 21600 секунд)
-DATA_REFRESH_INTERVAL_SECONDS = 6 * 60 * 60
+# Как часто воркеры проверяют, не обновил ли ingest кэш метаданных рынка
+MARKET_CACHE_RELOAD_SECONDS = 60
 
 # --- Инициализация ---
-sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins=CORS_ALLOWED_ORIGINS)
+if APP_ROLE not in ('all', 'ingest', 'worker'):
+    raise ValueError(f"Unknown APP_ROLE: {APP_ROLE}")
+
+# В режимах ingest/worker процессы связаны локальной шиной (feed.py), в режиме all её нет
+feed_hub = feed_client = client_manager = None
+if APP_ROLE == 'ingest':
+    feed_hub = FeedHub(
+        FEED_SOCKET_PATH,
+        on_worker_symbols=lambda worker_id, symbols: on_worker_symbols(worker_id, symbols),
+        call_handler=lambda name, client_id, data: handle_ingest_call(name, client_id, data)
+    )
+    # У ingest нет своих клиентов: его emit (алерты, бот) только уходят воркерам
+    client_manager = FeedPubSubManager(feed_hub, write_only=True)
+elif APP_ROLE == 'worker':
+    feed_client = FeedClient(
+        FEED_SOCKET_PATH,
+        on_symbols=lambda: binance_client.sync_subscriptions(),
+        on_connect=lambda: asyncio.create_task(sync_from_ingest())
+    )
+    client_manager = FeedPubSubManager(feed_client)
+
+# SocketJson не кодирует повторно заранее подготовленные снимки цен (см. SnapshotCache)
+sio = socketio.AsyncServer(
+    async_mode='aiohttp', cors_allowed_origins=CORS_ALLOWED_ORIGINS, json=SocketJson,
+    client_manager=client_manager
+)
 app = web.Application()
 sio.attach(app)
 
 latest_prices = {}
-current_symbols = list(INITIAL_SYMBOLS)
 background_tasks = {}
-valid_usdt_symbols = set()
-coin_names = {}
+# Метаданные рынка обновляются на месте, поэтому на эти объекты можно ссылаться напрямую
+market = MarketMetadata(MARKET_CACHE_PATH)
+valid_usdt_symbols = market.symbols
+coin_names = market.names
+symbol_index = SymbolSearchIndex((), {})
+sid_clients = {}  # sid -> client_id (постоянный id браузера из localStorage)
+last_triggered_prices = {}  # client_id -> {symbol: price}
+saved_watchlists = {}  # client_id -> [symbols], последний список каждого клиента
+# Служебный подписчик: символы с активными алертами отслеживаются, даже если ни одна вкладка не открыта
+ALERTS_SUBSCRIBER = '__alerts__'
+# То же для символов из списков чатов Telegram (см. telegram_users.py)
+TELEGRAM_SUBSCRIBER = '__telegram__'
 
 # --- Функции-помощники ---
-def update_app_data_from_binance(symbols_to_fetch):
+async def refresh_market_metadata(session):
+    """Условно перезапрашивает торгуемые пары и названия активов (см. market_meta.py) и применяет разницу."""
+    logger.info("Refreshing market metadata from Binance")
+    apply_market_change(await market.refresh(session))
+
+async def sync_from_ingest():
     """
-    Запрашивает exchangeInfo, все активы (для имен) и опционально цены.
+    Воркер не ходит в Binance REST: после подключения к шине он берёт метаданные рынка
+    и текущие цены у ingest (дальше метаданные обновляются из кэш-файла ingest).
     """
-    global latest_prices, valid_usdt_symbols, coin_names
-    print("Fetching all valid symbols and initial prices from Binance...")
-    
-    # Получаем все валидные символы
     try:
-        info_response = requests.get('https://api.binance.com/api/v3/exchangeInfo', timeout=10)
-        info_response.raise_for_status()
-        info_data = info_response.json()
-        
-        # Фильтруем символы: только спот, торгуются к USDT и статус TRADING
-        current_valid_symbols = {
-            item['baseAsset'] 
-            for item in info_data['symbols']
-            if item.get('quoteAsset') == 'USDT' and item.get('status') == 'TRADING'
-        }
-        valid_usdt_symbols = current_valid_symbols
-        print(f"Loaded {len(valid_usdt_symbols)} actively trading USDT pairs.")
-
+        data = await feed_client.call('market_metadata', None)
+        if data and data['symbols']:
+            apply_market_change(market.update(data['symbols'], data['names']))
+        await pre_fetch_prices(list(set(INITIAL_SYMBOLS) | subscriptions.symbols()))
     except Exception as e:
-        print(f"!!! CRITICAL: Could not fetch exchange info from Binance: {e}")
-        # В случае ошибки оставляем кэш пустым, валидация будет невозможна
-        valid_usdt_symbols = set()
+        logger.exception("Could not sync market data from ingest: %s", e)
 
-    # Получаем все активы и их полные имена
+def apply_market_change(change):
+    """
+    valid_usdt_symbols и coin_names market уже обновил на месте; здесь - последствия изменения:
+    поисковый индекс, кэш снимков, а при делистинге - отписка от стримов и уведомление клиентов.
+    """
+    global symbol_index
+    if not change:
+        return
+    # Поисковый индекс пересобираем один раз на обновление, запросы к нему - только чтение
+    symbol_index = SymbolSearchIndex(valid_usdt_symbols, coin_names)
+    snapshot_cache.invalidate()
+    logger.info("Market metadata changed", extra={
+        'listed': len(change.listed), 'delisted': len(change.delisted), 'index_version': symbol_index.version
+    })
+    if not change.delisted or APP_ROLE == 'worker':
+        # Воркеры узнают о делистинге от ingest: через набор символов шины и emit по pub/sub
+        return
+    logger.warning("Symbols delisted: %s", ', '.join(sorted(change.delisted)))
+    for symbol in sorted(change.delisted):
+        asyncio.create_task(sio.emit('symbol_delisted', {'pair': f"{symbol}/USDT"}, room=symbol_room(symbol)))
+        for chat_id in telegram_users.chats_watching(symbol):
+            schedule_telegram_message(f"⚠️ {symbol}/USDT снята с торгов Binance", chat_id)
+    sync_upstream()
+
+def get_client_id(sid):
+    return sid_clients.get(sid, sid)
+
+def client_room(client_id):
+    """Комната Socket.IO со всеми вкладками одного клиента."""
+    return f"client:{client_id}"
+
+def parse_pair(pair):
+    """'BTC/USDT' -> 'BTC'"""
+    if not isinstance(pair, str) or not pair.endswith('/USDT'):
+        return None
+    return pair[:-5] or None
+
+def parse_alert_price(value):
     try:
-        response = requests.get('https://www.binance.com/bapi/asset/v2/public/asset/asset/get-all-asset', timeout=10)
-        response.raise_for_status()
-        assets_data = response.json()
-        
-        # Создаем словарь { "BTC": "Bitcoin", "ETH": "Ethereum", ... }
-        temp_coin_names = {
-            asset['assetCode']: asset['assetName']
-            for asset in assets_data.get('data', [])
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 else None
+
+def format_alert_message(symbol, target_price, price, previous_price):
+    pair = f"{symbol}/USDT"
+    movement_dir = '📈' if price > previous_price else '📉'
+    movement_text = 'поднялась выше' if price > previous_price else 'опустилась ниже'
+    return f"{pair} {movement_dir} {movement_text} {target_price:.5f} USDT. (Сейчас: {price:.5f} USDT)"
+
+def get_telegram_bot():
+    ptb_app = app.get('ptb_app')
+    return ptb_app.bot if ptb_app else None
+
+telegram_queue = TelegramDeliveryQueue(
+    get_bot=get_telegram_bot,
+    max_size=TELEGRAM_QUEUE_SIZE,
+    global_rate=TELEGRAM_GLOBAL_RATE,
+    per_chat_rate=TELEGRAM_CHAT_RATE,
+    coalesce_window=TELEGRAM_COALESCE_WINDOW_SECONDS
+)
+
+def schedule_telegram_message(text, chat_id=None):
+    """
+    Ставит сообщение в очередь доставки Telegram, не блокируя вызывающий код.
+    Без chat_id сообщение уходит в общий чат TELEGRAM_CHAT_ID (алерты из браузера).
+    """
+    chat_id = chat_id or TELEGRAM_CHAT_ID
+    if not TELEGRAM_BOT_TOKEN or not chat_id:
+        if not TELEGRAM_BOT_TOKEN:
+            logger.error("TELEGRAM_BOT_TOKEN is not set in .env file")
+        if not chat_id:
+            logger.error("TELEGRAM_CHAT_ID is not set in .env file")
+        return False
+    if not telegram_queue.enqueue(chat_id, text):
+        logger.warning("Telegram delivery queue is full, message dropped")
+        return False
+    return True
+
+def on_alerts_triggered(alerts, price, previous_price):
+    """
+    Колбэк AlertEngine. Вызывается прямо из цикла тиков, поэтому только планирует отправку.
+    """
+    sent_to_telegram = set()
+    for alert in alerts:
+        alert_store.delete_alert(alert.owner, alert.symbol, alert.price)
+        alert_store.save_last_triggered(alert.owner, alert.symbol, alert.price)
+        last_triggered_prices.setdefault(alert.owner, {})[alert.symbol] = alert.price
+        message = format_alert_message(alert.symbol, alert.price, price, previous_price)
+        logger.info("Alert triggered: %s", message, extra={'owner': alert.owner})
+        chat_id = owner_chat(alert.owner)
+        if chat_id is not None:
+            # Алерт из бота: владелец и есть чат, перебирать пользователей не нужно
+            schedule_telegram_message(message, chat_id)
+            continue
+        payload = {
+            'kind': 'price',
+            'pair': f"{alert.symbol}/USDT",
+            'price': alert.price,
+            'currentPrice': price,
+            'message': message,
         }
-        coin_names = temp_coin_names
-        print(f"Loaded {len(coin_names)} full asset names.")
-    except Exception as e:
-        print(f"!!! Could not fetch asset names: {e}")
-        coin_names = {}
+        asyncio.create_task(sio.emit('alert_triggered', payload, room=client_room(alert.owner)))
+        # Один и тот же уровень у нескольких клиентов - одно сообщение в общий чат
+        if (alert.symbol, alert.price) not in sent_to_telegram:
+            sent_to_telegram.add((alert.symbol, alert.price))
+            schedule_telegram_message(message)
+    refresh_alert_subscriptions()
+
+def format_condition_message(alert, value, price):
+    pair = f"{alert.symbol}/USDT"
+    minutes = alert.window / 60
+    window_text = f"{minutes:g} мин" if alert.window >= 60 else f"{alert.window} сек"
+    if alert.kind == 'trade_size':
+        side_text = 'покупка' if value > 0 else 'продажа'
+        text = f"{pair} 🐋 крупная {side_text} по рынку на {abs(value):,.0f} USDT"
+    elif alert.kind == 'spread':
+        text = f"{pair} ↔️ спред {value:.3f}% (порог {alert.threshold:g}%)"
+    elif alert.kind == 'depth_imbalance':
+        side_text = 'покупателей' if value > 0 else 'продавцов'
+        text = f"{pair} ⚖️ перевес {side_text} в стакане {value:+.2f} по {alert.window} уровням"
+    elif alert.kind == 'pct_change':
+        movement_dir = '📈' if value > 0 else '📉'
+        text = f"{pair} {movement_dir} изменение {value:+.2f}% за {window_text}"
+    elif alert.kind == 'ma_cross':
+        movement_text = 'снизу вверх' if alert.direction == 'up' else 'сверху вниз'
+        text = f"{pair} 📊 цена пересекла среднюю за {window_text} {movement_text} ({value:+.2f}%)"
+    else:
+        text = f"{pair} 🔊 объём за минуту в {value:.1f} раз выше среднего за {window_text}"
+    return f"{text}. (Сейчас: {price:.5f} USDT)"
+
+def on_conditions_triggered(fired, price):
+    """Колбэк условных алертов. Условия не снимаются после срабатывания - их сдерживает cooldown."""
+    for alert, value in fired:
+        message = format_condition_message(alert, value, price)
+        logger.info("Condition alert triggered: %s", message, extra={'owner': alert.owner})
+        chat_id = owner_chat(alert.owner)
+        if chat_id is not None:
+            schedule_telegram_message(message, chat_id)
+            continue
+        payload = {
+            'kind': alert.kind,
+            'pair': f"{alert.symbol}/USDT",
+            'condition': alert.to_dict(),
+            'value': value,
+            'currentPrice': price,
+            'message': message,
+        }
+        asyncio.create_task(sio.emit('alert_triggered', payload, room=client_room(alert.owner)))
+        schedule_telegram_message(message)
+
+candle_store = CandleStore()
+alert_engine = AlertEngine(
+    on_trigger=on_alerts_triggered,
+    last_prices_ref=latest_prices,
+    candle_store=candle_store,
+    on_condition_trigger=on_conditions_triggered
+)
+alert_store = AlertStore(DB_PATH, flush_interval=DB_FLUSH_INTERVAL_SECONDS)
+telegram_users = TelegramUsers(
+    alert_engine, alert_store, valid_usdt_symbols, on_change=lambda: refresh_alert_subscriptions()
+)
+subscriptions = SubscriptionRegistry()
+slow_clients = SlowClientGuard(
+    sio, subscriptions, high_watermark=CLIENT_BACKLOG_HIGH, low_watermark=CLIENT_BACKLOG_LOW,
+    max_backlog=CLIENT_BACKLOG_MAX, slow_timeout=CLIENT_SLOW_TIMEOUT_SECONDS, max_pending=CLIENT_MAX_PENDING_SYMBOLS
+)
+publisher = PriceUpdatePublisher(
+    sio, subscriptions, flush_interval=PRICE_FLUSH_INTERVAL_MS / 1000, history_size=PRICE_DELTA_HISTORY,
+    guard=slow_clients
+)
+snapshot_cache = SnapshotCache(latest_prices, lambda: coin_names, publisher)
+# ingest не рассылает цены клиентам, worker не проверяет алерты - это делает ingest
+def upstream_symbols():
+    """Символы для подписки на Binance: без снятых с торгов (пока метаданных нет - все)."""
+    symbols = subscriptions.symbols()
+    return symbols & valid_usdt_symbols if valid_usdt_symbols else symbols
+
+binance_client = BinanceWsClient(
+    get_symbols_func=feed_client.symbols if feed_client else upstream_symbols,
+    publisher=None if APP_ROLE == 'ingest' else publisher,
+    latest_prices_ref=latest_prices,
+    alert_engine=None if APP_ROLE == 'worker' else alert_engine,
+    stream_type=BINANCE_STREAM_TYPE,
+    candle_store=candle_store,
+    upstream=feed_client,
+    forward=feed_hub.broadcast_ticks if feed_hub else None,
+    market_symbols_func=None if APP_ROLE == 'worker' else alert_engine.market_symbols,
+    depth_snapshot=lambda symbol: fetch_depth_snapshot(app['aiohttp_session'], symbol, BINANCE_DEPTH_SNAPSHOT_LIMIT),
+    ticker_prices=lambda symbols: fetch_ticker_prices(app['aiohttp_session'], symbols),
+    klines=lambda symbol, start_time, limit: fetch_klines(app['aiohttp_session'], symbol, start_time=start_time, limit=limit)
+)
 
-    # Предзагружаем цены для нашего стартового списка
-    if symbols_to_fetch:
-        print(f"Pre-fetching initial prices for: {symbols_to_fetch}")
-        try:
-            prices_response = requests.get('https://api.binance.com/api/v3/ticker/price', timeout=10)
-            prices_response.raise_for_status()
-            prices_data = prices_response.json()
-            
-            fetched_prices = {
-                item['symbol'][:-4]: float(item['price'])
-                for item in prices_data
-                if item['symbol'].endswith('USDT') and item['symbol'][:-4] in symbols_to_fetch
-            }
-            latest_prices = fetched_prices
-            print(f"Pre-fetched {len(latest_prices)} initial prices.")
-        except Exception as e:
-            print(f"!!! Could not pre-fetch initial prices: {e}")
+# Глубины очередей и счётчики, которые компоненты уже ведут сами, читаются при опросе /metrics
+metrics.Gauge('socketio_connected_clients', 'Socket.IO clients connected to this process').set_function(
+    lambda: sum(1 for _ in sio.manager.get_participants('/', None)))
+metrics.Gauge('socketio_slow_clients', 'Clients whose price updates are held because their send queue is backed up'
+              ).set_function(lambda: len(slow_clients))
+metrics.Gauge('tracked_symbols', 'Symbols tracked upstream (union of all watchlists)').set_function(
+    lambda: len(subscriptions.symbols()))
+metrics.Gauge('price_pending_symbols', 'Symbols waiting for the next price_updates flush').set_function(
+    lambda: publisher.stats()['pending_symbols'])
+metrics.Counter('price_messages_emitted_total', 'price_updates messages emitted to rooms').set_function(
+    lambda: publisher.messages_emitted)
+metrics.Counter('price_updates_emitted_total', 'Symbol updates emitted inside price_updates').set_function(
+    lambda: publisher.updates_emitted)
+metrics.Gauge('alerts_active', 'Active price and condition alerts').set_function(lambda: len(alert_engine))
+metrics.Gauge('store_pending_writes', 'SQLite writes waiting for the next flush').set_function(lambda: len(alert_store))
+metrics.Gauge('telegram_queue_depth', 'Messages waiting in the Telegram delivery queue').set_function(
+    lambda: len(telegram_queue))
+metrics.Counter('telegram_messages_sent_total', 'Messages delivered to Telegram').set_function(
+    lambda: telegram_queue.sent_messages)
+metrics.Counter('telegram_messages_dropped_total', 'Messages dropped because the Telegram queue was full').set_function(
+    lambda: telegram_queue.dropped)
+if feed_hub is not None:
+    metrics.Gauge('feed_workers', 'Workers connected to the feed hub').set_function(lambda: feed_hub.stats()['workers'])
+    metrics.Counter('feed_ticks_dropped_total', 'Tick frames dropped for slow workers').set_function(
+        lambda: feed_hub.ticks_dropped)
+
+def sync_upstream():
+    """Досылает изменения набора символов туда, откуда приходят тики."""
+    if feed_client is not None:
+        feed_client.set_symbols(subscriptions.symbols())
+        return
+    binance_client.sync_subscriptions()
+    if feed_hub is not None:
+        feed_hub.broadcast_symbols(upstream_symbols())
+
+def on_worker_symbols(worker_id, symbols):
+    """Набор символов воркера учитывается как служебный подписчик, так же как ALERTS_SUBSCRIBER."""
+    key = f"__worker:{worker_id}__"
+    if symbols:
+        subscriptions.set_watchlist(key, symbols, service=True)
+    else:
+        subscriptions.remove(key)
+    sync_upstream()
+
+def refresh_alert_subscriptions():
+    """Держит в подписках Binance все символы, по которым есть алерты, и символы из списков чатов Telegram."""
+    joined, left = subscriptions.set_watchlist(ALERTS_SUBSCRIBER, alert_engine.symbols(), service=True)
+    chats_joined, chats_left = subscriptions.set_watchlist(TELEGRAM_SUBSCRIBER, telegram_users.symbols(), service=True)
+    if joined or left or chats_joined or chats_left:
+        sync_upstream()
+    elif feed_client is None:
+        # Символ уже отслеживался, но у него мог появиться или пропасть алерт по стакану или сделкам
+        binance_client.sync_market_streams()
+
+def restore_state_from_store():
+    """Поднимает алерты и сохранённые списки символов клиентов из локального хранилища."""
+    alert_store.open()
+    state = alert_store.load()
+    for owner, symbol, price in state['alerts']:
+        alert_engine.add_alert(owner, symbol, price)
+    for owner, symbol, kind, threshold, window, direction, cooldown in state['condition_alerts']:
+        alert_engine.add_condition(owner, symbol, kind, threshold, window, direction, cooldown)
+    telegram_users.load(state['telegram_chats'])
+    subscriptions.set_watchlist(ALERTS_SUBSCRIBER, alert_engine.symbols(), service=True)
+    subscriptions.set_watchlist(TELEGRAM_SUBSCRIBER, telegram_users.symbols(), service=True)
+    saved_watchlists.update(state['client_symbols'])
+    last_triggered_prices.update(state['last_triggered'])
+    logger.info("Restored state from %s", DB_PATH,
+                extra={'alerts': len(alert_engine), 'client_symbol_lists': len(state['client_symbols']),
+                       'telegram_chats': len(telegram_users)})
 
 # --- Асинхронные задачи ---
 async def run_telegram_bot_task(app_instance):
     if not TELEGRAM_BOT_TOKEN: return
-    ptb_app = setup_telegram_bot(TELEGRAM_BOT_TOKEN, lambda: current_symbols, sio)
+    ptb_app = setup_telegram_bot(TELEGRAM_BOT_TOKEN, telegram_users, latest_prices)
     app_instance['ptb_app'] = ptb_app
     async with ptb_app:
         await ptb_app.initialize()
         await ptb_app.start()
         await ptb_app.updater.start_polling()
-        print("Telegram bot is running.")
+        logger.info("Telegram bot is running")
+        # post_init срабатывает только в run_polling, а бот запускается вручную - меню команд ставим здесь
+        try:
+            await ptb_app.bot.set_my_commands(BOT_COMMANDS)
+        except Exception as e:
+            logger.warning("Could not set Telegram bot commands: %s", e)
         if TELEGRAM_CHAT_ID:
             await ptb_app.bot.send_message(chat_id=TELEGRAM_CHAT_ID, text="Привет! Добро пожаловать в бот CryptOn!")
         await ptb_app.updater.running
@@ -116,7 +404,7 @@ async def run_telegram_bot_task(app_instance):
 #     binance_client = BinanceWsClient(get_symbols_func=lambda: current_symbols, sio_server=sio, latest_prices_ref=latest_prices)
     
 #     binance_task = asyncio.create_task(binance_client.run())
-#     updater_task = asyncio.create_task(periodic_data_updater())
+#     updater_task = asyncio.create_task(periodic_data_updater(app_instance['aiohttp_session']))
 
 #     background_tasks['binance'] = binance_task
 #     background_tasks['updater'] = updater_task
@@ -131,41 +419,57 @@ async def run_telegram_bot_task(app_instance):
 #     await asyncio.gather(*tasks_to_run)
 
 async def main_background_tasks(app_instance):
-    binance_task = asyncio.create_task(
-        BinanceWsClient(
-            get_symbols_func=lambda: current_symbols, 
-            sio_server=sio, 
-            latest_prices_ref=latest_prices
-        ).run()
-    )
-    updater_task = asyncio.create_task(periodic_data_updater())
+    binance_task = asyncio.create_task(binance_client.run())
+    updater_task = asyncio.create_task(periodic_data_updater(app_instance['aiohttp_session']))
+    loop_lag_task = asyncio.create_task(metrics.monitor_loop_lag())
 
     # Сохраняем в словарь
     background_tasks['binance'] = binance_task
     background_tasks['updater'] = updater_task
+    background_tasks['loop_lag'] = loop_lag_task
     
-    tasks_to_run = [binance_task, updater_task]
-
-    if TELEGRAM_BOT_TOKEN:
+    tasks_to_run = [binance_task, updater_task, loop_lag_task]
+
+    # Рассылку цен клиентам ведут процессы с клиентами, общее состояние - процесс с хранилищем
+    if APP_ROLE != 'ingest':
+        publisher_task = asyncio.create_task(publisher.run())
+        background_tasks['publisher'] = publisher_task
+        tasks_to_run.append(publisher_task)
+    if APP_ROLE != 'worker':
+        store_task = asyncio.create_task(alert_store.run())
+        background_tasks['store'] = store_task
+        tasks_to_run.append(store_task)
+
+    if TELEGRAM_BOT_TOKEN and APP_ROLE != 'worker':
         telegram_task = asyncio.create_task(run_telegram_bot_task(app_instance))
+        telegram_queue_task = asyncio.create_task(telegram_queue.run())
         background_tasks['telegram'] = telegram_task
-        tasks_to_run.append(telegram_task)
+        background_tasks['telegram_queue'] = telegram_queue_task
+        tasks_to_run.extend([telegram_task, telegram_queue_task])
     
     await asyncio.gather(*tasks_to_run)
 
-async def periodic_data_updater():
+async def periodic_data_updater(session):
     """
-    Бесконечный цикл, который периодически обновляет данные с Binance.
+    Бесконечный цикл обновления метаданных рынка. Процесс, который ходит в Binance (all/ingest),
+    обновляет их, когда подходит срок (в том числе срок, записанный в кэше прошлым запуском);
+    воркеры только перечитывают кэш-файл, который пишет ingest.
     """
     while True:
+        delay = MARKET_CACHE_RELOAD_SECONDS
         try:
-            print(f"--- Running periodic data update. Next update in {DATA_REFRESH_INTERVAL_SECONDS / 3600} hours. ---")
-            update_app_data_from_binance(symbols_to_fetch=[])
+            if APP_ROLE == 'worker':
+                apply_market_change(market.reload_if_changed())
+            else:
+                delay = market.updated_at + MARKET_REFRESH_INTERVAL_SECONDS - time.time()
+                if delay <= 0:
+                    await refresh_market_metadata(session)
+                    delay = MARKET_REFRESH_INTERVAL_SECONDS
         except Exception as e:
-            print(f"!!! ERROR during periodic data update: {e}")
+            logger.exception("Error during periodic data update: %s", e)
         
         # "Спим" до следующего обновления
-        await asyncio.sleep(DATA_REFRESH_INTERVAL_SECONDS)
+        await asyncio.sleep(delay)
 
 # HTTP ЭНДПОИНТ ДЛЯ ВАЛИДАЦИИ
 async def validate_symbol(request):
@@ -182,102 +486,436 @@ async def validate_symbol(request):
     else:
         return web.json_response({'valid': False, 'message': f'Symbol {symbol} not found.'}, status=404)
 
+# HTTP ЭНДПОИНТ ДЛЯ ПОДСКАЗОК ПРИ ВВОДЕ
+async def search_symbols(request):
+    """
+    Префиксный и нечеткий поиск по тикерам и названиям: /api/search_symbols?q=bit&limit=10
+    Ответ зависит только от запроса и версии индекса, поэтому отдаем ETag и разрешаем кэширование.
+    """
+    # Обрезаем до разбора: эндпоинт открытый, а длинный запрос дорог для нечёткого поиска
+    query = request.query.get('q', '')[:MAX_QUERY_LENGTH]
+    try:
+        limit = min(max(int(request.query.get('limit', 10)), 1), 50)
+    except ValueError:
+        return web.json_response({'message': 'limit must be a number'}, status=400)
+
+    index = symbol_index
+    etag = f'"{index.version}"'
+    headers = {'ETag': etag, 'Cache-Control': 'public, max-age=300'}
+    if etag in request.headers.get('If-None-Match', ''):
+        return web.Response(status=304, headers=headers)
+    return web.json_response({'results': index.search(query, limit)}, headers=headers)
+
+# HTTP ЭНДПОИНТ ДЛЯ СВЕЧЕЙ
+async def get_candles(request):
+    """
+    Свечи по символу: /api/candles?symbol=BTC&interval=1m&limit=100[&start=...&end=...]
+    Время - unix-секунды начала свечи. Формат строки: [time, open, high, low, close, volume].
+    """
+    symbol = request.query.get('symbol', '').upper()
+    interval = request.query.get('interval', '1m')
+    if not symbol:
+        return web.json_response({'message': 'Symbol is required'}, status=400)
+    if interval not in INTERVALS:
+        return web.json_response({'message': f"Interval must be one of: {', '.join(INTERVALS)}"}, status=400)
+    try:
+        limit = int(request.query['limit']) if 'limit' in request.query else None
+        start = float(request.query['start']) if 'start' in request.query else None
+        end = float(request.query['end']) if 'end' in request.query else None
+    except ValueError:
+        return web.json_response({'message': 'limit, start and end must be numbers'}, status=400)
+    if limit is not None and limit <= 0:
+        return web.json_response({'message': 'limit must be positive'}, status=400)
+
+    candles = candle_store.query(symbol, interval, start=start, end=end, limit=limit)
+    return web.json_response({'symbol': symbol, 'interval': interval, 'candles': candles})
+
+async def publisher_stats(request):
+    """
+    Счетчики пакетной рассылки (сколько тиков пришло и сколько сообщений ушло клиентам)
+    и очереди доставки в Telegram (глубина, задержка, повторы).
+    """
+    feed = feed_hub or feed_client
+    return web.json_response({
+        'publisher': publisher.stats(),
+        'slow_clients': slow_clients.stats(),
+        'snapshots': snapshot_cache.stats(),
+        'telegram': {**telegram_queue.stats(), **telegram_users.stats()},
+        'market': market.stats(),
+        'binance': binance_client.stats(),
+        'feed': feed.stats() if feed else {'role': APP_ROLE},
+    })
+
+async def metrics_endpoint(request):
+    """Метрики процесса в текстовом формате Prometheus (в режиме worker - только этого воркера)."""
+    return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8',
+                        headers={'X-Prometheus-Format': '0.0.4'})
+
+# --- Операции с общим состоянием (алерты, SQLite, Telegram) ---
+async def call_ingest(name, sid, data=None):
+    """
+    Выполняет операцию в процессе, который владеет общим состоянием:
+    в режиме worker - в ingest через шину, иначе - здесь же.
+    """
+    client_id = get_client_id(sid)
+    if feed_client is not None:
+        return await feed_client.call(name, client_id, data)
+    return await handle_ingest_call(name, client_id, data)
+
+async def handle_ingest_call(name, client_id, data):
+    handler = INGEST_CALLS.get(name)
+    if handler is None:
+        logger.warning("Unknown ingest call: %s", name)
+        return None
+    return await handler(client_id, data)
+
+async def handle_client_state(client_id, data=None):
+    """Сохранённый список символов и последние сработавшие цены клиента."""
+    return {
+        'watchlist': saved_watchlists.get(client_id),
+        'lastTriggered': last_triggered_prices.get(client_id, {}),
+    }
+
+async def handle_market_metadata(client_id, data=None):
+    return {'symbols': sorted(valid_usdt_symbols), 'names': coin_names}
+
+async def handle_prices(client_id, symbols):
+    missing = [symbol for symbol in symbols if symbol not in latest_prices]
+    if missing:
+        await pre_fetch_prices(missing)
+    return {symbol: latest_prices[symbol] for symbol in symbols if symbol in latest_prices}
+
+async def handle_save_watchlist(client_id, symbols):
+    saved_watchlists[client_id] = symbols
+    alert_store.save_client_symbols(client_id, symbols)
+
 # --- Socket.IO события ---
-@sio.event
+def sio_event(handler):
+    """@sio.event со счётчиком вызовов и гистограммой длительности обработчика."""
+    calls = SOCKET_EVENTS.labels(handler.__name__)
+    durations = SOCKET_EVENT_SECONDS.labels(handler.__name__)
+    # Socket.IO подбирает аргументы по сигнатуре (например, reason у disconnect) - передаём столько, сколько принимает обработчик
+    max_args = len(inspect.signature(handler).parameters)
+
+    @functools.wraps(handler)
+    async def wrapper(*args):
+        started = time.perf_counter()
+        try:
+            return await handler(*args[:max_args])
+        finally:
+            durations.observe(time.perf_counter() - started)
+            calls.inc()
+    return sio.event(wrapper)
+
+@sio_event
 async def connect(sid, environ, auth=None):
-    print(f'>>> Frontend Client connected: {sid}')
-    if latest_prices:
-        prices_to_send = {s: p for s, p in latest_prices.items() if s in current_symbols}
-        if prices_to_send:
-            initial_data = [
-                {
-                    'symbol': s,
-                    'price': p,
-                    'name': coin_names.get(s, s) # Берем имя из кэша
-                } for s, p in prices_to_send.items()
-            ]
-            await sio.emit('initial_prices', {'cryptos': initial_data}, to=sid)
-            print(f"Sent initial_prices for {len(prices_to_send)} symbols to {sid}")
-
-@sio.event
+    logger.info("Frontend client connected", extra={'sid': sid})
+    client_id = auth.get('clientId') if isinstance(auth, dict) else None
+    # Префикс владельцев из Telegram браузеру недоступен: иначе можно было бы управлять чужими алертами
+    if isinstance(client_id, str) and client_id and owner_chat(client_id) is None:
+        sid_clients[sid] = client_id
+    await sio.enter_room(sid, client_room(get_client_id(sid)))
+    state = await call_ingest('client_state', sid) or {}
+    client_triggered = state.get('lastTriggered')
+    if client_triggered:
+        await sio.emit('last_triggered_prices', {
+            'prices': {f"{s}/USDT": p for s, p in client_triggered.items()}
+        }, to=sid)
+    # До первого resubscribe клиент следит за своим сохранённым списком (или за стартовым)
+    watchlist = state.get('watchlist')
+    await set_client_watchlist(sid, INITIAL_SYMBOLS if watchlist is None else watchlist)
+    await send_initial_state(sid, auth)
+
+async def send_initial_state(sid, auth):
+    """
+    Переподключившийся клиент присылает epoch и seq последнего полученного пакета:
+    если история рассылки их ещё покрывает, досылаем только пропущенные изменения,
+    иначе - полный снимок из общего кэша.
+    """
+    watchlist = subscriptions.watchlist(sid)
+    if not watchlist:
+        return
+    last_seq = auth.get('lastSeq') if isinstance(auth, dict) else None
+    if isinstance(last_seq, int) and not isinstance(last_seq, bool):
+        updates = publisher.changes_since(auth.get('epoch'), last_seq, watchlist)
+        if updates is not None:
+            await sio.emit('price_updates', {
+                'updates': updates, 'seq': publisher.seq, 'epoch': publisher.epoch
+            }, to=sid, ignore_queue=True)
+            logger.info("Sent missed updates", extra={'sid': sid, 'updates': len(updates), 'since_seq': last_seq})
+            return
+    snapshot = snapshot_cache.get(watchlist)
+    if snapshot is not None:
+        # Клиент подключён к этому процессу: снимок не нужно пропускать через шину
+        await sio.emit('initial_prices', snapshot, to=sid, ignore_queue=True)
+        logger.info("Sent initial_prices snapshot", extra={'sid': sid, 'symbols': len(watchlist)})
+
+@sio_event
 async def disconnect(sid):
-    print(f'>>> Frontend Client disconnected: {sid}')
+    logger.info("Frontend client disconnected", extra={'sid': sid})
+    sid_clients.pop(sid, None)
+    # Комнаты sid Socket.IO очищает сам, нам остается уменьшить счетчики символов
+    subscriptions.remove(sid)
+    sync_upstream()
+
+async def fetch_prices(symbols):
+    if feed_client is not None:
+        # Цены знает ingest (недостающие он догрузит сам), воркеры в Binance REST не ходят
+        return await feed_client.call('prices', None, symbols) or {}
+    return await fetch_ticker_prices(app['aiohttp_session'], symbols)
+
+async def pre_fetch_prices(symbols_to_fetch):
+    logger.info("Pre-fetching prices", extra={'symbols': len(symbols_to_fetch)})
+    try:
+        before = {symbol: latest_prices.get(symbol) for symbol in symbols_to_fetch}
+        prices = await fetch_prices(symbols_to_fetch)
+        now = time.time()
+        for symbol, price in prices.items():
+            previous = before.get(symbol)
+            if latest_prices.get(symbol) != previous:
+                continue  # пока шёл запрос, пришёл тик из стрима - он свежее
+            # Как обычный тик: алерты между старой и новой ценой срабатывают, а AlertEngine
+            # (он пишет в тот же latest_prices) относит уровни к правильной стороне
+            alert_engine.process_tick(symbol, previous, price, now=now)
+        snapshot_cache.invalidate()
+    except Exception as e:
+        logger.error("Could not pre-fetch prices: %s", e)
 
-@sio.event
+async def set_client_watchlist(sid, symbols):
+    """
+    Меняет список символов клиента: переводит sid между комнатами символов
+    и досылает в Binance подписки только для символов, которых раньше не было ни у кого.
+    """
+    upstream_before = set(subscriptions.symbols())
+    old_watchlist = subscriptions.watchlist(sid)
+    joined, left = subscriptions.set_watchlist(sid, symbols)
+    # Пакеты price_updates рассылаются по комнатам одинаковых списков
+    if old_watchlist:
+        await sio.leave_room(sid, watchlist_room(old_watchlist))
+    if subscriptions.watchlist(sid):
+        await sio.enter_room(sid, watchlist_room(subscriptions.watchlist(sid)))
+    for symbol in left:
+        await sio.leave_room(sid, symbol_room(symbol))
+    for symbol in joined:
+        await sio.enter_room(sid, symbol_room(symbol))
+
+    new_upstream = subscriptions.symbols() - upstream_before
+    if new_upstream and 'aiohttp_session' in app:
+        await pre_fetch_prices(list(new_upstream))
+    if new_upstream or left:
+        # Соединение с Binance не пересоздаётся: досылаем SUBSCRIBE/UNSUBSCRIBE только для разницы
+        sync_upstream()
+
+@sio_event
 async def resubscribe(sid, data):
-    global current_symbols
-
     new_symbols = data.get('symbols')
     if new_symbols is None or not isinstance(new_symbols, list):
         return
+    new_symbols = [s.upper() for s in new_symbols if isinstance(s, str) and s]
 
-    # Не перезапускаем, если список не изменился
-    if set(new_symbols) == set(current_symbols):
+    # Ничего не делаем, если список не изменился
+    if set(new_symbols) == subscriptions.watchlist(sid):
         return
 
-    print(f"Received request to resubscribe with new symbols: {new_symbols}")
-    current_symbols = new_symbols
-    
-    old_task = background_tasks.get('binance')
-    if old_task and not old_task.done():
-        old_task.cancel()
-        print("Cancelled old Binance WS task.")
-
-    def pre_fetch_prices(symbols_to_fetch):
-        global latest_prices
-        print(f"Pre-fetching prices for: {symbols_to_fetch}")
-        try:
-            prices_response = requests.get('https://api.binance.com/api/v3/ticker/price', timeout=10)
-            prices_response.raise_for_status()
-            prices_data = prices_response.json()
-            
-            # Обновляем цены только для тех символов, что есть в списке
-            for item in prices_data:
-                if item['symbol'].endswith('USDT'):
-                    base_symbol = item['symbol'][:-4]
-                    if base_symbol in symbols_to_fetch:
-                        latest_prices[base_symbol] = float(item['price'])
-            print(f"Updated/pre-fetched prices for {len(symbols_to_fetch)} symbols.")
-        except Exception as e:
-            print(f"!!! Could not pre-fetch prices: {e}")
+    logger.info("Client resubscribed", extra={'sid': sid, 'symbols': len(new_symbols)})
+    await call_ingest('save_watchlist', sid, new_symbols)
+    await set_client_watchlist(sid, new_symbols)
 
-    pre_fetch_prices(current_symbols)
+@sio_event
+async def sync_alerts(sid, data):
+    return await call_ingest('sync_alerts', sid, data)
 
-    new_client = BinanceWsClient(get_symbols_func=lambda: current_symbols, sio_server=sio, latest_prices_ref=latest_prices)
-    new_task = asyncio.create_task(new_client.run())
-    background_tasks['binance'] = new_task
-    print("New Binance WS task started.")
+async def handle_sync_alerts(client_id, data):
+    """
+    Синхронизирует полный список алертов клиента: {'alerts': {'BTC/USDT': [{'price': ...}], ...}}.
+    Лишние алерты удаляются, новые добавляются, уже существующие не трогаются.
+    """
+    alerts_by_pair = data.get('alerts') if isinstance(data, dict) else None
+    if not isinstance(alerts_by_pair, dict):
+        return
 
-@sio.event
+    wanted = set()
+    for pair, pair_alerts in alerts_by_pair.items():
+        symbol = parse_pair(pair)
+        if not symbol or not isinstance(pair_alerts, list):
+            continue
+        for item in pair_alerts:
+            price = parse_alert_price(item.get('price') if isinstance(item, dict) else item)
+            if price is not None:
+                wanted.add((symbol, price))
+
+    existing = {(a.symbol, a.price) for a in alert_engine.get_alerts(owner=client_id)}
+    for symbol, price in existing - wanted:
+        alert_engine.remove_alert(client_id, symbol, price)
+        alert_store.delete_alert(client_id, symbol, price)
+    for symbol, price in wanted - existing:
+        alert_engine.add_alert(client_id, symbol, price)
+        alert_store.save_alert(client_id, symbol, price)
+    refresh_alert_subscriptions()
+    logger.info("Synced alerts", extra={'client_id': client_id, 'alerts': len(wanted)})
+
+@sio_event
+async def add_alert(sid, data):
+    return await call_ingest('add_alert', sid, data)
+
+async def handle_add_alert(client_id, data):
+    symbol = parse_pair(data.get('pair')) if isinstance(data, dict) else None
+    price = parse_alert_price(data.get('price')) if symbol else None
+    if price is None:
+        return {'ok': False}
+    if alert_engine.add_alert(client_id, symbol, price):
+        alert_store.save_alert(client_id, symbol, price)
+        refresh_alert_subscriptions()
+    return {'ok': True}
+
+@sio_event
+async def remove_alert(sid, data):
+    return await call_ingest('remove_alert', sid, data)
+
+async def handle_remove_alert(client_id, data):
+    symbol = parse_pair(data.get('pair')) if isinstance(data, dict) else None
+    price = parse_alert_price(data.get('price')) if symbol else None
+    if price is None:
+        return {'ok': False}
+    removed = alert_engine.remove_alert(client_id, symbol, price)
+    if removed:
+        alert_store.delete_alert(client_id, symbol, price)
+        refresh_alert_subscriptions()
+    return {'ok': removed is not None}
+
+def parse_condition(data):
+    """
+    Разбирает параметры условного алерта из события клиента.
+    :return: (symbol, kind, threshold, window, direction, cooldown) или строка с ошибкой.
+    """
+    if not isinstance(data, dict):
+        return 'Invalid payload'
+    symbol = parse_pair(data.get('pair'))
+    if not symbol:
+        return 'Pair must look like BTC/USDT'
+    kind = data.get('kind')
+    direction = data.get('direction', 'any')
+    try:
+        threshold = float(data.get('threshold', 0))
+        window = int(data.get('window', 0))
+        cooldown = float(data.get('cooldown', ALERT_COOLDOWN_SECONDS))
+    except (TypeError, ValueError):
+        return 'threshold, window and cooldown must be numbers'
+    error = validate_condition(kind, threshold, window, direction)
+    if error:
+        return error
+    return symbol, kind, threshold, window, direction, max(cooldown, 0.0)
+
+@sio_event
+async def add_condition_alert(sid, data):
+    return await call_ingest('add_condition_alert', sid, data)
+
+async def handle_add_condition_alert(client_id, data):
+    """
+    Условный алерт: {'pair', 'kind': 'pct_change'|'ma_cross'|'volume_spike'|'trade_size'|'spread'|'depth_imbalance',
+                     'threshold', 'window' (сек; для depth_imbalance - число уровней),
+                     'direction': 'up'|'down'|'any', 'cooldown' (сек)}
+    """
+    parsed = parse_condition(data)
+    if isinstance(parsed, str):
+        return {'ok': False, 'message': parsed}
+    symbol, kind = parsed[:2]
+    if kind in BOOK_KINDS:
+        # Стаканы держатся не больше чем для BINANCE_MAX_DEPTH_SYMBOLS символов: сверх лимита алерт не сработал бы
+        depth_symbols, _ = alert_engine.market_symbols()
+        if symbol not in depth_symbols and len(depth_symbols) >= BINANCE_MAX_DEPTH_SYMBOLS:
+            return {'ok': False, 'message': f"Order book alerts are limited to {BINANCE_MAX_DEPTH_SYMBOLS} symbols"}
+    alert = alert_engine.add_condition(client_id, *parsed)
+    if alert is None:
+        return {'ok': False, 'message': 'Such condition already exists'}
+    alert_store.save_condition_alert(alert)
+    refresh_alert_subscriptions()
+    return {'ok': True, 'alert': alert.to_dict()}
+
+@sio_event
+async def remove_condition_alert(sid, data):
+    return await call_ingest('remove_condition_alert', sid, data)
+
+async def handle_remove_condition_alert(client_id, data):
+    parsed = parse_condition(data)
+    if isinstance(parsed, str):
+        return {'ok': False, 'message': parsed}
+    symbol, kind, threshold, window, direction, _ = parsed
+    alert = alert_engine.remove_condition((client_id, symbol, kind, threshold, window, direction))
+    if alert is None:
+        return {'ok': False}
+    alert_store.delete_condition_alert(alert)
+    refresh_alert_subscriptions()
+    return {'ok': True}
+
+@sio_event
+async def get_condition_alerts(sid, data=None):
+    return await call_ingest('get_condition_alerts', sid, data)
+
+async def handle_get_condition_alerts(client_id, data=None):
+    return {'alerts': [a.to_dict() for a in alert_engine.conditions.get_alerts(owner=client_id)]}
+
+@sio_event
 async def send_telegram_alert(sid, data):
+    return await call_ingest('send_telegram_alert', sid, data)
+
+async def handle_send_telegram_alert(client_id, data):
     message = data.get('message')
     if not message: 
-        print("Backend: Received 'send_telegram_alert' event WITHOUT a message.")
+        logger.warning("Received 'send_telegram_alert' event without a message")
         return
     
-    print(f"Backend: Received alert request. Message: '{message[:50]}...'")
-    
-    ptb_app = app.get('ptb_app')
-    if ptb_app and TELEGRAM_CHAT_ID:
-        try:
-            # Создаем задачу для отправки, чтобы не блокировать обработчик
-            asyncio.create_task(ptb_app.bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=message))
-            print("Backend: Alert message scheduled to be sent to Telegram.")
-        except Exception as e:
-            print(f"!!! BACKEND FAILED TO SEND TELEGRAM MESSAGE: {e}")
-    else:
-        if not ptb_app:
-            print("!!! ERROR: Telegram bot instance ('ptb_app') not found in app context.")
-        if not TELEGRAM_CHAT_ID:
-            print("!!! ERROR: TELEGRAM_CHAT_ID is not set in .env file.")
+    try:
+        # Ставим в очередь доставки, чтобы не блокировать обработчик
+        if schedule_telegram_message(message):
+            logger.info("Alert message scheduled to be sent to Telegram", extra={'client_id': client_id})
+    except Exception as e:
+        logger.exception("Failed to schedule Telegram message: %s", e)
+
+# Операции, которые воркеры выполняют через ingest (см. call_ingest)
+INGEST_CALLS = {
+    'client_state': handle_client_state,
+    'market_metadata': handle_market_metadata,
+    'prices': handle_prices,
+    'save_watchlist': handle_save_watchlist,
+    'sync_alerts': handle_sync_alerts,
+    'add_alert': handle_add_alert,
+    'remove_alert': handle_remove_alert,
+    'add_condition_alert': handle_add_condition_alert,
+    'remove_condition_alert': handle_remove_condition_alert,
+    'get_condition_alerts': handle_get_condition_alerts,
+    'send_telegram_alert': handle_send_telegram_alert,
+}
 
 # --- Запуск приложения ---
 async def start_background_tasks(app_instance):
-    app_instance['aiohttp_session'] = aiohttp.ClientSession()
+    if feed_hub is not None:
+        await feed_hub.start()
+    if feed_client is not None:
+        # Менеджер Socket.IO по умолчанию стартует при первом клиенте; emit из ingest
+        # (алерты) должны приниматься сразу, иначе они копятся в очереди шины
+        sio.manager_initialized = True
+        sio.manager.initialize()
+    app_instance['aiohttp_session'] = create_session()
+    # Метаданные рынка - из локального кэша, обновит их periodic_data_updater
+    change = market.load()
+    if change is not None:
+        apply_market_change(change)
+    if feed_client is not None:
+        # Метаданные и цены воркер получит от ingest, когда подключится к шине (sync_from_ingest)
+        app_instance['main_task'] = asyncio.create_task(main_background_tasks(app_instance))
+        return
+    if change is None:
+        # Без кэша (первый запуск) ждём загрузку, иначе валидация символов невозможна
+        await refresh_market_metadata(app_instance['aiohttp_session'])
+    startup_symbols = set(INITIAL_SYMBOLS) | subscriptions.symbols()
+    for symbols in saved_watchlists.values():
+        startup_symbols.update(symbols)
+    await pre_fetch_prices(list(startup_symbols))
     app_instance['main_task'] = asyncio.create_task(main_background_tasks(app_instance))
 
 async def cleanup_background_tasks(app_instance):
-    print("Stopping background tasks...")
+    logger.info("Stopping background tasks")
     await app_instance['aiohttp_session'].close()
 
     for task in background_tasks.values():
@@ -287,10 +925,14 @@ async def cleanup_background_tasks(app_instance):
         app_instance['main_task'].cancel()
         try: await app_instance['main_task']
         except asyncio.CancelledError: pass
-    print("Background tasks were successfully cancelled.")
+    if feed_hub is not None:
+        await feed_hub.stop()
+    alert_store.close()
+    logger.info("Background tasks were successfully cancelled")
 
 if __name__ == '__main__':
-    update_app_data_from_binance(INITIAL_SYMBOLS)
+    if APP_ROLE != 'worker':
+        restore_state_from_store()
     cors = aiohttp_cors.setup(app, defaults={
         CORS_ALLOWED_ORIGINS: aiohttp_cors.ResourceOptions(
             allow_credentials=True,
@@ -301,7 +943,16 @@ if __name__ == '__main__':
     })
     resource = cors.add(app.router.add_resource("/api/validate_symbol"))
     cors.add(resource.add_route("GET", validate_symbol))
+    resource = cors.add(app.router.add_resource("/api/search_symbols"))
+    cors.add(resource.add_route("GET", search_symbols))
+    resource = cors.add(app.router.add_resource("/api/candles"))
+    cors.add(resource.add_route("GET", get_candles))
+    resource = cors.add(app.router.add_resource("/api/stats"))
+    cors.add(resource.add_route("GET", publisher_stats))
+    app.router.add_get("/metrics", metrics_endpoint)
     app.on_startup.append(start_background_tasks)
     app.on_cleanup.append(cleanup_background_tasks)
-    print(f"Starting aiohttp server on http://{HOST}:{PORT}")
-    web.run_app(app, host=HOST, port=PORT)
\ No newline at end of file
+    # Воркеры делят один порт (SO_REUSEPORT): ядро распределяет между ними websocket-соединения
+    port = INGEST_PORT if APP_ROLE == 'ingest' else PORT
+    logger.info("Starting aiohttp server (%s) on http://%s:%s", APP_ROLE, HOST, port)
+    web.run_app(app, host=HOST, port=port, reuse_port=APP_ROLE == 'worker', print=None)
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""
+Защита рассылки от медленных клиентов Socket.IO.
+
+Engine.IO складывает исходящие пакеты каждого клиента в неограниченную очередь: клиент, который
+не успевает читать, копит в памяти сервера устаревшие цены. SlowClientGuard следит за длиной
+этой очереди:
+- больше high_watermark пакетов - клиент медленный: price_updates ему не отправляются, а копятся
+  в отложенном наборе - только последнее состояние символа, не больше max_pending символов
+  (при переполнении вытесняется дольше всех не обновлявшийся);
+- очередь опустилась до low_watermark - отложенное уходит одним сообщением;
+- клиент медленный дольше slow_timeout секунд или очередь длиннее max_backlog - соединение
+  обрывается вместе с TCP: writer Engine.IO, застрявший в ws.send у нечитающего клиента,
+  сразу получает ошибку, а не ждёт таймаута; клиент переподключится и догонит по lastSeq или снимком.
+Рассылка остальным клиентам и чтение из Binance от медленных клиентов не зависят.
+"""
+import logging
+import time
+from itertools import islice
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFERRED_UPDATES = metrics.Counter('socketio_deferred_updates_total', 'Symbol updates held back for slow clients')
+DROPPED_UPDATES = metrics.Counter(
+    'socketio_dropped_updates_total', 'Held symbol updates evicted because a slow client had too many pending symbols'
+)
+SLOW_DISCONNECTS = metrics.Counter(
+    'socketio_slow_client_disconnects_total', 'Clients disconnected because their send queue stayed backed up', ('reason',)
+)
+MAX_BACKLOG = metrics.Gauge('socketio_send_backlog_max', 'Longest Engine.IO send queue among clients at the last check')
+
+
+class _SlowClient:
+    __slots__ = ('since', 'pending')
+
+    def __init__(self, since: float):
+        self.since = since
+        self.pending: dict[str, dict] = {}  # symbol -> payload, от давно обновлённых к свежим
+
+
+class SlowClientGuard:
+    def __init__(self, sio_server, subscriptions, high_watermark: int = 32, low_watermark: int = 4,
+                 max_backlog: int = 500, slow_timeout: float = 30.0, max_pending: int = 500):
+        self._sio = sio_server
+        self._subscriptions = subscriptions
+        self._high_watermark = high_watermark
+        self._low_watermark = low_watermark
+        self._max_backlog = max_backlog
+        self._slow_timeout = slow_timeout
+        self._max_pending = max_pending
+        self._slow: dict[str, _SlowClient] = {}
+        self._held: dict[frozenset, list[str]] = {}  # список символов -> sid медленных клиентов с ним
+        self.marked_slow = 0
+        self.recovered = 0
+        self.disconnected = 0
+
+    def __len__(self):
+        return len(self._slow)
+
+    def held(self, watchlist) -> list[str] | None:
+        """sid медленных клиентов с этим списком: рассылка их пропускает (skip_sid) и передаёт в defer."""
+        return self._held.get(watchlist)
+
+    def defer(self, sid: str, updates: list[dict]):
+        """Откладывает обновления медленного клиента, оставляя по символу только последнее."""
+        slow = self._slow.get(sid)
+        if slow is None:
+            return
+        pending = slow.pending
+        for payload in updates:
+            symbol = payload['symbol']
+            previous = pending.pop(symbol, None)
+            if previous is not None:
+                # Пакеты из истории publisher общие для всех клиентов - не меняем их на месте
+                payload = {**payload, 'previousPrice': previous['previousPrice']}
+            pending[symbol] = payload
+        DEFERRED_UPDATES.inc(len(updates))
+        overflow = len(pending) - self._max_pending
+        if overflow > 0:
+            for symbol in list(islice(pending, overflow)):
+                del pending[symbol]
+            DROPPED_UPDATES.inc(overflow)
+
+    async def check(self) -> list[tuple[str, list[dict]]]:
+        """
+        Проверяет очереди всех клиентов процесса.
+        :return: [(sid, обновления)] клиентов, которые догнали очередь, - им нужно отправить отложенное.
+        """
+        now = time.monotonic()
+        sockets = self._sio.eio.sockets
+        released = []
+        longest = 0
+        for sid, eio_sid in list(self._sio.manager.get_participants('/', None)):
+            socket = sockets.get(eio_sid)
+            if socket is None or socket.closed:
+                continue
+            backlog = socket.queue.qsize()
+            longest = max(longest, backlog)
+            slow = self._slow.get(sid)
+            if backlog > self._max_backlog:
+                await self._disconnect(sid, socket, 'backlog', backlog)
+            elif slow is None:
+                if backlog > self._high_watermark:
+                    self._slow[sid] = _SlowClient(now)
+                    self.marked_slow += 1
+                    logger.info("Client is slow, holding price updates", extra={'sid': sid, 'backlog': backlog})
+            elif backlog <= self._low_watermark:
+                del self._slow[sid]
+                self.recovered += 1
+                watchlist = self._subscriptions.watchlist(sid)
+                updates = [payload for symbol, payload in slow.pending.items() if symbol in watchlist]
+                if updates:
+                    released.append((sid, updates))
+            elif now - slow.since > self._slow_timeout:
+                await self._disconnect(sid, socket, 'timeout', backlog)
+        MAX_BACKLOG.set(longest)
+
+        for sid in [sid for sid in self._slow if not self._sio.manager.is_connected(sid, '/')]:
+            del self._slow[sid]
+        # Список символов клиента мог смениться, поэтому группировка пересобирается на каждой проверке
+        held = {}
+        for sid in self._slow:
+            held.setdefault(self._subscriptions.watchlist(sid), []).append(sid)
+        self._held = held
+        return released
+
+    async def _disconnect(self, sid: str, socket, reason: str, backlog: int):
+        self._slow.pop(sid, None)
+        self.disconnected += 1
+        SLOW_DISCONNECTS.labels(reason).inc()
+        logger.warning("Disconnecting slow client", extra={'sid': sid, 'reason': reason, 'backlog': backlog})
+        # Накопленное клиенту уже не нужно: освобождаем память сразу, не дожидаясь его сокета
+        while not socket.queue.empty():
+            socket.queue.get_nowait()
+            socket.queue.task_done()
+        # Задачу writer Engine.IO не отменить снаружи, а отправка, начатая до обрыва, ждёт, пока клиент
+        # прочитает буфер: закрываем TCP-соединение, и ожидание в ws.send сразу завершается ошибкой
+        environ = self._sio.get_environ(sid) or {}
+        request = environ.get('aiohttp.request')
+        # abort: не ждём, пока клиент дочитает очередь (обычный disconnect ждал бы его бесконечно)
+        await socket.close(wait=False, abort=True)
+        socket.queue.put_nowait(None)  # останавливает writer Engine.IO, если он ждёт пакетов
+        if request is not None and request.transport is not None:
+            request.transport.abort()
+
+    def stats(self) -> dict:
+        return {
+            'slow_clients': len(self._slow),
+            'held_updates': sum(len(slow.pending) for slow in self._slow.values()),
+            'marked_slow': self.marked_slow,
+            'recovered': self.recovered,
+            'disconnected': self.disconnected,
+        }
@@ -0,0 +1,275 @@
+"""
+Локальная замена Binance для бенчмарков: комбинированные WebSocket-стримы тикеров
+(а также @depth@100ms и @aggTrade для алертов по стакану и сделкам)
+и REST-эндпоинты, которые backend вызывает при старте.
+
+Тики синтетические (цена каждого символа монотонно растёт, поэтому пара (символ, цена)
+уникальна и по ней можно найти время отправки) или берутся из записи - файла JSONL
+с кадрами комбинированного стрима в формате Binance ({"stream": ..., "data": {...}}).
+
+Отдельный запуск, чтобы направить на него backend:
+    python -m bench.fake_binance --port 9100 --rate 2000
+    BINANCE_WS_BASE_URL=ws://127.0.0.1:9100/stream BINANCE_API_BASE_URL=http://127.0.0.1:9100 \\
+    BINANCE_WEB_BASE_URL=http://127.0.0.1:9100 python app.py
+"""
+import argparse
+import asyncio
+import json
+import time
+from itertools import islice
+
+from aiohttp import web, WSMsgType
+
+ALL_MINI_TICKERS_STREAM = '!miniTicker@arr'
+# Шаг генератора: тики рассылаются пачками раз в TICK_INTERVAL секунд
+TICK_INTERVAL = 0.01
+# Сколько последних цен на символ помнить для расчёта задержки
+SENT_HISTORY_PER_SYMBOL = 20000
+
+
+def bench_symbols(count: int) -> list[str]:
+    """Синтетические базовые активы: B0000, B0001, ..."""
+    return [f"B{i:04d}" for i in range(count)]
+
+
+class FakeBinance:
+    """
+    :param symbols: Базовые активы "рынка" (для exchangeInfo и !miniTicker@arr).
+    :param rate: Суммарное число тиков в секунду по всем подписанным стримам.
+    :param replay: Кадры записанного трафика; если заданы, вместо синтетики крутятся по кругу.
+    """
+
+    def __init__(self, symbols: list[str], rate: float, replay: list[dict] | None = None):
+        self.symbols = list(symbols)
+        self.rate = rate
+        self._replay = replay
+        self._replay_position = 0
+        self._connections: dict[web.WebSocketResponse, set[str]] = {}
+        self._prices: dict[str, float] = {}
+        self._counters: dict[str, int] = {}
+        self._depth_ids: dict[str, int] = {}  # последний update id стакана по символу
+        self._cursor = 0
+        # symbol -> {price: perf_counter() отправки}
+        self.sent_at: dict[str, dict[float, float]] = {}
+        self.ticks_sent = 0
+        self.frames_sent = 0
+        self._runner: web.AppRunner | None = None
+        self._generator: asyncio.Task | None = None
+
+    # --- HTTP/WS сервер ---
+    def _app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/stream', self._stream)
+        app.router.add_get('/api/v3/exchangeInfo', self._exchange_info)
+        app.router.add_get('/api/v3/ticker/price', self._ticker_price)
+        app.router.add_get('/api/v3/depth', self._depth)
+        app.router.add_get('/api/v3/klines', self._klines)
+        app.router.add_get('/bapi/asset/v2/public/asset/asset/get-all-asset', self._assets)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        """Запускает сервер и генератор тиков, возвращает порт."""
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self._generator = asyncio.create_task(self._generate())
+        return self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._generator is not None:
+            self._generator.cancel()
+        for ws in list(self._connections):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _stream(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams = {s for s in request.query.get('streams', '').split('/') if s}
+        self._connections[ws] = streams
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                command = json.loads(message.data)
+                params = set(command.get('params') or ())
+                if command.get('method') == 'SUBSCRIBE':
+                    streams |= params
+                elif command.get('method') == 'UNSUBSCRIBE':
+                    streams -= params
+                await ws.send_json({'result': None, 'id': command.get('id')})
+        finally:
+            del self._connections[ws]
+        return ws
+
+    async def _exchange_info(self, request):
+        # Как у CDN перед Binance: ETag по содержимому и 304 на условный запрос
+        etag = f'"{hash(tuple(self.symbols)) & 0xffffffff:x}"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.json_response({'symbols': [
+            {'symbol': f"{s}USDT", 'baseAsset': s, 'quoteAsset': 'USDT', 'status': 'TRADING'}
+            for s in self.symbols
+        ]}, headers={'ETag': etag, 'X-MBX-USED-WEIGHT-1M': '20'})
+
+    async def _ticker_price(self, request):
+        return web.json_response([
+            {'symbol': f"{s}USDT", 'price': repr(self._price(s))} for s in self.symbols
+        ])
+
+    async def _depth(self, request):
+        symbol = request.query['symbol'].removesuffix('USDT')
+        price = self._price(symbol)
+        levels = range(1, min(int(request.query.get('limit', 100)), 20) + 1)
+        return web.json_response({
+            'lastUpdateId': self._depth_ids.setdefault(symbol, 1),
+            'bids': [[repr(round(price * (1 - i * 1e-3), 8)), '1.0'] for i in levels],
+            'asks': [[repr(round(price * (1 + i * 1e-3), 8)), '1.0'] for i in levels],
+        }, headers={'X-MBX-USED-WEIGHT-1M': '25'})
+
+    async def _klines(self, request):
+        # Одна минутная свеча с колебанием ±1% вокруг текущей цены (для догрузки после обрыва)
+        price = self._price(request.query['symbol'].removesuffix('USDT'))
+        open_time = int(time.time() // 60 * 60 * 1000)
+        return web.json_response([[
+            open_time, repr(price), repr(price * 1.01), repr(price * 0.99), repr(price), '0', open_time + 59999
+        ]], headers={'X-MBX-USED-WEIGHT-1M': '2'})
+
+    async def _assets(self, request):
+        return web.json_response({'data': [{'assetCode': s, 'assetName': f"Bench {s}"} for s in self.symbols]})
+
+    # --- Генерация тиков ---
+    def _price(self, symbol: str) -> float:
+        price = self._prices.get(symbol)
+        if price is None:
+            price = self._prices[symbol] = 100.0 + len(self._prices) % 1000
+        return price
+
+    def _next_tick(self, symbol: str) -> dict:
+        count = self._counters.get(symbol, 0) + 1
+        self._counters[symbol] = count
+        price = round(self._price(symbol) * (1 + count * 1e-6), 8)
+        self._record(symbol, price)
+        return {
+            'e': '24hrTicker', 'E': int(time.time() * 1000), 's': f"{symbol}USDT",
+            'c': repr(price), 'o': repr(self._price(symbol)), 'P': '0.0', 'q': repr(count * 1000.0),
+        }
+
+    def _next_depth_update(self, symbol: str) -> dict:
+        first_id = self._depth_ids.get(symbol, 1) + 1
+        last_id = self._depth_ids[symbol] = first_id + 2
+        price = self._price(symbol)
+        quantity = repr(float(last_id % 7 + 1))
+        return {
+            'e': 'depthUpdate', 'E': int(time.time() * 1000), 's': f"{symbol}USDT", 'U': first_id, 'u': last_id,
+            'b': [[repr(round(price * 0.999, 8)), quantity]], 'a': [[repr(round(price * 1.001, 8)), '1.0']],
+        }
+
+    def _next_trade(self, symbol: str) -> dict:
+        count = self._counters.get(symbol, 0)
+        return {
+            'e': 'aggTrade', 'E': int(time.time() * 1000), 's': f"{symbol}USDT",
+            'p': repr(self._price(symbol)), 'q': repr(float(count % 50 + 1)), 'm': count % 2 == 0,
+        }
+
+    def _record(self, symbol: str, price: float):
+        history = self.sent_at.setdefault(symbol, {})
+        history[price] = time.perf_counter()
+        if len(history) > SENT_HISTORY_PER_SYMBOL:
+            for old_price in list(islice(history, SENT_HISTORY_PER_SYMBOL // 2)):
+                del history[old_price]
+
+    async def _generate(self):
+        budget = 0.0
+        while True:
+            await asyncio.sleep(TICK_INTERVAL)
+            budget += self.rate * TICK_INTERVAL
+            count = int(budget)
+            budget -= count
+            if count and self._connections:
+                await self._send_ticks(count)
+
+    async def _send_ticks(self, count: int):
+        if self._replay:
+            frames = self._replay_frames(count)
+        else:
+            frames = self._synthetic_frames(count)
+        for ws, streams in list(self._connections.items()):
+            for stream, frame in frames:
+                if stream in streams and not ws.closed:
+                    await ws.send_str(frame)
+                    self.frames_sent += 1
+
+    def _synthetic_frames(self, count: int) -> list[tuple[str, str]]:
+        subscribed = sorted(set().union(*self._connections.values()))
+        frames = []
+        if ALL_MINI_TICKERS_STREAM in subscribed:
+            # Один кадр на весь рынок, по count символов за шаг
+            data = []
+            for _ in range(min(count, len(self.symbols))):
+                symbol = self.symbols[self._cursor % len(self.symbols)]
+                self._cursor += 1
+                data.append({**self._next_tick(symbol), 'e': '24hrMiniTicker'})
+            self.ticks_sent += len(data)
+            frames.append((ALL_MINI_TICKERS_STREAM, json.dumps({'stream': ALL_MINI_TICKERS_STREAM, 'data': data})))
+            subscribed.remove(ALL_MINI_TICKERS_STREAM)
+        if not subscribed:
+            return frames
+        for _ in range(count):
+            stream = subscribed[self._cursor % len(subscribed)]
+            self._cursor += 1
+            pair, stream_type = stream.split('@', 1)
+            symbol = pair.upper().removesuffix('USDT')
+            if stream_type.startswith('depth'):
+                data = self._next_depth_update(symbol)
+            elif stream_type == 'aggTrade':
+                data = self._next_trade(symbol)
+            else:
+                data = self._next_tick(symbol)
+            frames.append((stream, json.dumps({'stream': stream, 'data': data})))
+        self.ticks_sent += count
+        return frames
+
+    def _replay_frames(self, count: int) -> list[tuple[str, str]]:
+        frames = []
+        for _ in range(count):
+            frame = self._replay[self._replay_position % len(self._replay)]
+            self._replay_position += 1
+            items = frame['data'] if isinstance(frame['data'], list) else [frame['data']]
+            for item in items:
+                item['E'] = int(time.time() * 1000)
+                self._record(item['s'].removesuffix('USDT'), float(item['c']))
+            self.ticks_sent += len(items)
+            frames.append((frame['stream'], json.dumps(frame)))
+        return frames
+
+
+def load_replay(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def _serve(args):
+    replay = load_replay(args.replay) if args.replay else None
+    fake = FakeBinance(bench_symbols(args.symbols), args.rate, replay)
+    port = await fake.start(args.host, args.port)
+    print(f"Fake Binance is listening on ws://{args.host}:{port}/stream ({args.rate} ticks/s)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local fake Binance ticker streams')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--rate', type=float, default=1000, help='ticks per second across all streams')
+    parser.add_argument('--symbols', type=int, default=500, help='size of the synthetic market')
+    parser.add_argument('--replay', help='JSONL file with recorded combined-stream frames')
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
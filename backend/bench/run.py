@@ -0,0 +1,294 @@
+"""
+Бенчмарк горячего пути: фейковый Binance -> backend (отдельные процессы) -> симулированные клиенты Socket.IO.
+
+Измеряет задержку тик -> клиент (p50/p99), CPU backend на тик и память для заданного
+числа символов, клиентов и алертов. Пороги --max-* делают запуск пригодным для CI:
+при их превышении процесс завершается с кодом 1.
+
+    cd backend
+    python -m bench.run --symbols 200 --clients 100 --alerts 1000 --rate 2000 --duration 20
+    python -m bench.run --workers 4 ...   # режим ingest + 4 воркера (см. feed.py)
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import socketio
+
+from bench.fake_binance import FakeBinance, bench_symbols, load_replay
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_TIMEOUT_SECONDS = 60
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def process_cpu_seconds(pid: int) -> float | None:
+    """user + system время процесса из /proc (только Linux)."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def process_rss_mb(pid: int) -> float | None:
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class BenchClient:
+    """Симулированная вкладка браузера: свой список символов и алерты, замер задержки обновлений."""
+
+    def __init__(self, index: int, url: str, watchlist: list[str], alerts: list[tuple[str, float]], fake: FakeBinance):
+        self.url = url
+        self.watchlist = watchlist
+        self.alerts = alerts
+        self._fake = fake
+        self._sio = socketio.AsyncClient(reconnection=False)
+        self._sio.on('price_updates', self._on_price_updates)
+        self._client_id = f"bench-{index}"
+        self.latencies: list[float] = []
+        self.updates = 0
+        self.unmatched = 0
+
+    async def connect(self):
+        await self._sio.connect(self.url, transports=['websocket'], auth={'clientId': self._client_id})
+        await self._sio.emit('resubscribe', {'symbols': self.watchlist})
+        await self._sio.emit('sync_alerts', {'alerts': {}})
+        for symbol, price in self.alerts:
+            await self._sio.call('add_alert', {'pair': f"{symbol}/USDT", 'price': price})
+
+    async def _on_price_updates(self, data):
+        now = time.perf_counter()
+        sent_at = self._fake.sent_at
+        for update in data.get('updates', ()):
+            sent = sent_at.get(update['symbol'], {}).get(update['price'])
+            if sent is None:
+                self.unmatched += 1
+                continue
+            self.updates += 1
+            self.latencies.append(now - sent)
+
+    def reset(self):
+        self.latencies.clear()
+        self.updates = self.unmatched = 0
+
+    async def close(self):
+        await self._sio.disconnect()
+
+
+def start_backend(args, fake_port: int, port: int, workdir: str) -> list[subprocess.Popen]:
+    env = {
+        **os.environ,
+        'PORT': str(port),
+        'BINANCE_WS_BASE_URL': f"ws://127.0.0.1:{fake_port}/stream",
+        'BINANCE_API_BASE_URL': f"http://127.0.0.1:{fake_port}",
+        'BINANCE_WEB_BASE_URL': f"http://127.0.0.1:{fake_port}",
+        'BINANCE_STREAM_TYPE': args.stream_type,
+        'PRICE_FLUSH_INTERVAL_MS': str(args.flush_ms),
+        'DB_PATH': os.path.join(workdir, 'bench.db'),
+        'MARKET_CACHE_PATH': os.path.join(workdir, 'market_cache.json.gz'),
+        'FEED_SOCKET_PATH': os.path.join(workdir, 'feed.sock'),
+        'INGEST_PORT': str(free_port()),
+        'TELEGRAM_BOT_TOKEN': '',
+        'TELEGRAM_CHAT_ID': '',
+    }
+    log = open(os.path.join(workdir, 'backend.log'), 'w')
+    command = [sys.executable, 'app.py']
+    if not args.workers:
+        return [subprocess.Popen(command, cwd=BACKEND_DIR, env={**env, 'APP_ROLE': 'all'}, stdout=log, stderr=log)]
+    processes = [subprocess.Popen(command, cwd=BACKEND_DIR, env={**env, 'APP_ROLE': 'ingest'}, stdout=log, stderr=log)]
+    for _ in range(args.workers):
+        processes.append(subprocess.Popen(command, cwd=BACKEND_DIR, env={**env, 'APP_ROLE': 'worker'},
+                                          stdout=log, stderr=log))
+    return processes
+
+
+async def wait_for_backend(port: int, processes: list[subprocess.Popen]):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if any(p.poll() is not None for p in processes):
+                raise RuntimeError('backend exited during startup, see backend.log')
+            try:
+                async with session.get(f"http://127.0.0.1:{port}/api/stats") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError('backend did not start in time')
+
+
+def build_clients(args, url: str, fake: FakeBinance) -> list[BenchClient]:
+    rng = random.Random(args.seed)
+    symbols = fake.symbols
+    per_client = min(args.watchlist, len(symbols))
+    clients = []
+    for i in range(args.clients):
+        watchlist = rng.sample(symbols, per_client)
+        # Уровни далеко от цены: алерты проверяются на каждом тике, но не срабатывают
+        alerts_count = args.alerts // args.clients + (1 if i < args.alerts % args.clients else 0)
+        alerts = [(rng.choice(watchlist), round(rng.uniform(1, 50), 4)) for _ in range(alerts_count)]
+        clients.append(BenchClient(i, url, watchlist, alerts, fake))
+    return clients
+
+
+async def run(args) -> dict:
+    replay = load_replay(args.replay) if args.replay else None
+    fake = FakeBinance(bench_symbols(args.symbols), args.rate, replay)
+    fake_port = await fake.start()
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix='crypton-bench-')
+    processes = start_backend(args, fake_port, port, workdir)
+    clients = []
+    try:
+        await wait_for_backend(port, processes)
+        clients = build_clients(args, f"http://127.0.0.1:{port}", fake)
+        semaphore = asyncio.Semaphore(50)
+
+        async def connect(client):
+            async with semaphore:
+                await client.connect()
+
+        await asyncio.gather(*(connect(c) for c in clients))
+        print(f"Connected {len(clients)} clients, warming up for {args.warmup}s...")
+        await asyncio.sleep(args.warmup)
+
+        for client in clients:
+            client.reset()
+        ticks_before, frames_before = fake.ticks_sent, fake.frames_sent
+        cpu_before = [process_cpu_seconds(p.pid) for p in processes]
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        elapsed = time.perf_counter() - started
+        cpu_after = [process_cpu_seconds(p.pid) for p in processes]
+        rss = [process_rss_mb(p.pid) for p in processes]
+        ticks = fake.ticks_sent - ticks_before
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/api/stats") as response:
+                backend_stats = await response.json()
+    finally:
+        await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        await fake.stop()
+
+    latencies = [latency for c in clients for latency in c.latencies]
+    updates = sum(c.updates for c in clients)
+    cpu = None
+    if all(v is not None for v in cpu_before + cpu_after):
+        cpu = sum(after - before for before, after in zip(cpu_before, cpu_after))
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        'config': {
+            'symbols': args.symbols, 'clients': args.clients, 'watchlist': args.watchlist,
+            'alerts': args.alerts, 'rate': args.rate, 'duration': args.duration,
+            'flush_ms': args.flush_ms, 'stream_type': args.stream_type, 'workers': args.workers,
+            'replay': args.replay,
+        },
+        'ticks_sent': ticks,
+        'ticks_per_second': round(ticks / elapsed, 1),
+        'frames_sent': fake.frames_sent - frames_before,
+        'client_updates': updates,
+        'client_updates_per_second': round(updates / elapsed, 1),
+        'unmatched_updates': sum(c.unmatched for c in clients),
+        'latency_p50_ms': ms(percentile(latencies, 0.5)),
+        'latency_p99_ms': ms(percentile(latencies, 0.99)),
+        'latency_max_ms': ms(max(latencies) if latencies else None),
+        'backend_cpu_seconds': round(cpu, 3) if cpu is not None else None,
+        'backend_cpu_percent': round(cpu / elapsed * 100, 1) if cpu is not None else None,
+        'backend_cpu_us_per_tick': round(cpu / ticks * 1e6, 2) if cpu is not None and ticks else None,
+        'backend_cpu_us_per_client_update': round(cpu / updates * 1e6, 2) if cpu is not None and updates else None,
+        'backend_rss_mb': [round(v, 1) if v is not None else None for v in rss],
+        'backend_stats': backend_stats,
+        'log': os.path.join(workdir, 'backend.log'),
+    }
+
+
+def check_thresholds(result: dict, args) -> list[str]:
+    failures = []
+    for key, limit in (('latency_p99_ms', args.max_p99_ms),
+                       ('backend_cpu_us_per_tick', args.max_cpu_us_per_tick),
+                       ('backend_rss_mb', args.max_rss_mb)):
+        if limit is None:
+            continue
+        value = result[key]
+        value = max((v for v in value if v is not None), default=None) if isinstance(value, list) else value
+        if value is None or value > limit:
+            failures.append(f"{key} = {value} exceeds {limit}")
+    if not result['client_updates']:
+        failures.append('clients received no price updates')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tick-to-client benchmark against a local fake Binance')
+    parser.add_argument('--symbols', type=int, default=100, help='size of the synthetic market')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--watchlist', type=int, default=10, help='symbols per client')
+    parser.add_argument('--alerts', type=int, default=500, help='price alerts across all clients')
+    parser.add_argument('--rate', type=float, default=1000, help='ticks per second from fake Binance')
+    parser.add_argument('--duration', type=float, default=15, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--flush-ms', type=int, default=200, help='PRICE_FLUSH_INTERVAL_MS of the backend')
+    parser.add_argument('--stream-type', default='ticker', choices=('ticker', 'miniTicker', 'allMiniTickers'))
+    parser.add_argument('--workers', type=int, default=0, help='0 - single process, N - ingest + N workers')
+    parser.add_argument('--replay', help='JSONL file with recorded combined-stream frames')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--max-p99-ms', type=float)
+    parser.add_argument('--max-cpu-us-per-tick', type=float)
+    parser.add_argument('--max-rss-mb', type=float)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    report = json.dumps(result, indent=2, ensure_ascii=False)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    failures = check_thresholds(result, args)
+    for failure in failures:
+        print(f"!!! {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
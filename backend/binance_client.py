@@ -1,74 +1,647 @@
 import asyncio
+import itertools
 import json
+import logging
+import random
+import time
 import websockets
 
+import metrics
+from codec import create_ticker_decoder, loads
+from config import (
+    BINANCE_WS_BASE_URL, BINANCE_MAX_DEPTH_SYMBOLS, BINANCE_RECONNECT_MIN_SECONDS, BINANCE_RECONNECT_MAX_SECONDS,
+    BINANCE_IDLE_TIMEOUT_SECONDS, BINANCE_CONNECTION_MAX_AGE_SECONDS, BINANCE_BACKFILL_MAX_SYMBOLS
+)
+from order_book import OrderBookSync
+
+logger = logging.getLogger(__name__)
+
+MESSAGES = metrics.Counter('binance_messages_total', 'Raw frames received from Binance (or from the feed hub)')
+TICKS = metrics.Counter('binance_ticks_total', 'Ticker entries decoded from received frames')
+DECODE_SECONDS = metrics.Histogram('binance_decode_seconds', 'Time to decode one frame')
+PROCESS_SECONDS = metrics.Histogram('binance_process_seconds', 'Time to handle one frame: decode, candles, alerts, publish')
+CONNECTIONS = metrics.Gauge('binance_connections', 'Open Binance WebSocket connections')
+RECONNECTS = metrics.Counter('binance_reconnects_total', 'Binance WebSocket connection errors followed by a reconnect')
+IDLE_TIMEOUTS = metrics.Counter('binance_idle_timeouts_total', 'Binance connections dropped by the idle watchdog')
+HANDOVERS = metrics.Counter('binance_handovers_total', 'Planned switches to a standby Binance connection')
+HANDOVER_DUPLICATES = metrics.Counter(
+    'binance_handover_duplicates_total', 'Standby connection frames dropped as already delivered by the old connection'
+)
+BACKFILLS = metrics.Counter('binance_backfills_total', 'REST gap fills after a Binance reconnect')
+BACKFILL_ALERTS = metrics.Counter('binance_backfill_alerts_total', 'Price alerts triggered by REST gap fills')
+BACKFILL_SECONDS = metrics.Histogram('binance_backfill_seconds', 'Time of one REST gap fill')
+CONTROL_MESSAGES = metrics.Counter('binance_control_messages_total', 'SUBSCRIBE/UNSUBSCRIBE frames sent', ('method',))
+MARKET_EVENTS = metrics.Counter('binance_market_events_total', 'Depth and trade events received', ('event',))
+MARKET_PROCESS_SECONDS = metrics.Histogram(
+    'binance_market_process_seconds', 'Time to handle one depth or trade frame: parse, order book, alerts', ('event',)
+)
+MARKET_ERRORS = metrics.Counter('binance_market_errors_total', 'Depth and trade frames skipped because they could not be handled')
+MARKET_EVENT_DELAY_SECONDS = metrics.Histogram(
+    'binance_market_event_delay_seconds', 'Delay between the Binance event time and its handling', ('event',)
+)
+
+# Лимиты Binance: не более 1024 стримов на одно соединение и 5 входящих сообщений в секунду
+MAX_STREAMS_PER_CONNECTION = 1024
+MAX_CONTROL_MESSAGES_PER_SECOND = 5
+# Сколько стримов передаём в одном SUBSCRIBE/UNSUBSCRIBE
+MAX_PARAMS_PER_REQUEST = 200
+
+# Типы стримов: полный @ticker (~20 полей), облегчённый @miniTicker
+# или один общий !miniTicker@arr для всех пар рынка (фильтруется локально)
+STREAM_TYPES = ('ticker', 'miniTicker', 'allMiniTickers')
+ALL_MINI_TICKERS_STREAM = '!miniTicker@arr'
+# Сколько ждать первого сообщения от резервного соединения и сколько свечей klines догружать параллельно
+STANDBY_READY_TIMEOUT_SECONDS = 10
+BACKFILL_CONCURRENCY = 5
+MAX_KLINES_PER_REQUEST = 1000
+
+# Стримы для алертов по стакану и сделкам: изменения стакана раз в 100 мс и агрегированные сделки
+DEPTH_STREAM_TYPE = 'depth@100ms'
+TRADE_STREAM_TYPE = 'aggTrade'
+
+
+def stream_name(symbol: str, stream_type: str = 'ticker') -> str:
+    # По умолчанию используем @ticker для получения и цены, и процентов
+    return f"{symbol.lower()}usdt@{stream_type}"
+
+
+def event_sequence(message) -> tuple[str, int] | None:
+    """
+    (стрим, номер события) кадра комбинированного стрима: id сделки для @aggTrade, u для стакана,
+    время события E для тикеров. None - кадр без стрима (ответ на запрос) или непонятный.
+    """
+    try:
+        frame = loads(message)
+        data = frame['data']
+        if isinstance(data, list):
+            data = data[0]
+        event_type = data.get('e')
+        if event_type == 'aggTrade':
+            return frame['stream'], data['a']
+        if event_type == 'depthUpdate':
+            return frame['stream'], data['u']
+        return frame['stream'], data['E']
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+def reconnect_delay(failures: int) -> float:
+    """Экспоненциальная задержка со случайным разбросом, чтобы шарды не переподключались одной волной."""
+    delay = min(BINANCE_RECONNECT_MAX_SECONDS, BINANCE_RECONNECT_MIN_SECONDS * 2 ** min(failures, 16))
+    return random.uniform(delay / 2, delay)
+
+
+class _StreamConnection:
+    """
+    Одно долгоживущее соединение (шард) с набором стримов.
+    Изменения набора отправляются кадрами SUBSCRIBE/UNSUBSCRIBE без переподключения.
+
+    Соединение без сообщений дольше idle_timeout считается зависшим и переоткрывается.
+    Незадолго до плановых 24 часов открывается резервное соединение с теми же стримами:
+    старое закрывается только после первого сообщения из нового, поэтому пропуска нет.
+    Пока они открыты оба, новое копит кадры, которые старое уже доставило: по номерам событий
+    из старого соединения такие повторы после переключения отбрасываются.
+    """
+
+    def __init__(self, pool: str, index: int, on_message, idle_timeout: float | None = None, on_reconnect=None):
+        """
+        :param on_reconnect: on_reconnect(streams, gap_started) после переподключения с пропуском
+                             (gap_started - time.time() последнего кадра до обрыва). Синхронный, не должен блокировать.
+        """
+        self.pool = pool
+        self.index = index
+        self.streams: set[str] = set()   # желаемый набор
+        self._active: set[str] = set()   # то, на что подписано текущее соединение
+        self._on_message = on_message
+        self._idle_timeout = idle_timeout
+        self._on_reconnect = on_reconnect
+        self._websocket = None
+        self._frames = 0
+        self._last_frame_at = 0.0  # time.time() последнего кадра: с него начинается пропуск при обрыве
+        self._handover = None  # (websocket, streams, первое сообщение) резервного соединения
+        self._seen = None      # stream -> последний номер события старого соединения, пока открывается резервное
+        self._replayed = None  # то же, по чему резервное соединение отсеивает повторы после переключения
+        self._replay_deadline = 0.0
+        self._emptied = False  # соединение закрыто намеренно: из шарда убрали все стримы
+        self._changed = asyncio.Event()
+        self._request_ids = itertools.count(1)
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def mark_changed(self):
+        self._changed.set()
+
+    @staticmethod
+    def _build_ws_url(streams) -> str:
+        """Формирует URL для мульти-стрима Binance (используется только при (пере)подключении)."""
+        return f"{BINANCE_WS_BASE_URL}?streams={'/'.join(sorted(streams))}"
+
+    async def _run(self):
+        """Подключение с автоматическим переподключением."""
+        failures = 0
+        gap_started = None  # начало пропуска, после которого ещё не было соединения
+        session = None      # (websocket, streams, первое сообщение) - уже открытое резервное соединение
+        while True:
+            if session is None and not self.streams:
+                # Стримов нет - догружать нечего: алерты, подписанные позже, не должны срабатывать на старый пропуск
+                gap_started = None
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+
+            started = time.monotonic()
+            try:
+                if session is None:
+                    session = await self._connect()
+                    if gap_started is not None and self._on_reconnect is not None:
+                        self._on_reconnect(session[1], gap_started)
+                    gap_started = None
+                session = await self._serve(*session)
+            except asyncio.CancelledError:
+                logger.info("Binance shard task was cancelled", extra={'pool': self.pool, 'shard': self.index})
+                raise
+            except Exception as e:
+                session = None
+                if gap_started is None:
+                    # Пропуск начался с последнего кадра, а не с обрыва (сторож обрывает через idle_timeout тишины)
+                    gap_started = self._last_frame_at or time.time()
+                # Соединение, простоявшее дольше максимальной задержки, - не серия неудачных попыток
+                if time.monotonic() - started >= BINANCE_RECONNECT_MAX_SECONDS:
+                    failures = 0
+                delay = reconnect_delay(failures)
+                failures += 1
+                RECONNECTS.inc()
+                logger.warning("Binance WebSocket error, reconnecting in %.1f seconds: %s", delay, e,
+                               extra={'pool': self.pool, 'shard': self.index})
+                await asyncio.sleep(delay)
+
+    async def _connect(self):
+        streams = set(self.streams)
+        logger.info("Connecting to Binance WebSocket", extra={'pool': self.pool, 'shard': self.index, 'streams': len(streams)})
+        websocket = await websockets.connect(self._build_ws_url(streams))
+        return websocket, streams, None
+
+    async def _serve(self, websocket, streams: set, first_message):
+        """
+        Обслуживает соединение до обрыва (исключение) или передачи потока резервному соединению
+        (возвращает его как следующую сессию; None - соединение закрыто, потому что стримов не осталось).
+        """
+        logger.info("Connected to Binance WebSocket", extra={'pool': self.pool, 'shard': self.index})
+        CONNECTIONS.inc()
+        self._websocket = websocket
+        self._active = streams
+        self._last_frame_at = time.time()
+        if first_message is not None:
+            # Переключение на резервное соединение: повторы отсеиваются, пока по стриму не придёт новое
+            # событие, но не дольше STANDBY_READY_TIMEOUT_SECONDS (молчащие стримы)
+            self._replayed = self._seen or None
+            self._replay_deadline = time.monotonic() + STANDBY_READY_TIMEOUT_SECONDS
+        self._seen = None
+        self._emptied = False
+        if self._active != self.streams:
+            self._changed.set()
+        tasks = [asyncio.create_task(self._sync_loop(websocket))]
+        if self._idle_timeout:
+            tasks.append(asyncio.create_task(self._watchdog(websocket)))
+        if BINANCE_CONNECTION_MAX_AGE_SECONDS:
+            tasks.append(asyncio.create_task(self._open_standby(websocket)))
+        try:
+            if first_message is not None:
+                self._frames += 1
+                if not self._is_replayed(first_message):
+                    await self._on_message(first_message)
+            await self._listen(websocket)
+        except websockets.ConnectionClosed:
+            # Старое соединение закрыто при переключении (или оборвалось, когда резервное уже готово)
+            # либо закрыто, потому что в шарде не осталось стримов
+            if self._handover is None and not self._emptied:
+                raise
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._websocket = None
+            CONNECTIONS.dec()
+            await websocket.close()
+        handover, self._handover = self._handover, None
+        return handover
+
+    async def _listen(self, websocket):
+        """Бесконечно прослушивает сообщения из активного сокета. Декодирование - на стороне клиента."""
+        while True:
+            message = await websocket.recv()
+            self._frames += 1
+            self._last_frame_at = time.time()
+            if (self._seen is not None or self._replayed is not None) and self._is_replayed(message):
+                continue
+            await self._on_message(message)
+
+    def _is_replayed(self, message) -> bool:
+        """Запоминает номера событий старого соединения или отсеивает их повторы в резервном."""
+        if self._replayed is not None and time.monotonic() >= self._replay_deadline:
+            self._replayed = None
+        if self._seen is None and self._replayed is None:
+            return False
+        key = event_sequence(message)
+        if key is None:
+            return False
+        stream, sequence = key
+        if self._seen is not None:
+            self._seen[stream] = sequence
+            return False
+        last = self._replayed.get(stream)
+        if last is None:
+            return False
+        if sequence <= last:
+            HANDOVER_DUPLICATES.inc()
+            return True
+        del self._replayed[stream]
+        if not self._replayed:
+            self._replayed = None
+        return False
+
+    async def _watchdog(self, websocket):
+        """Обрывает соединение, из которого за idle_timeout не пришло ни одного сообщения."""
+        frames = self._frames
+        while True:
+            await asyncio.sleep(self._idle_timeout)
+            # Шард без подписок молчит намеренно (и закрывается в _sync_loop)
+            if self._frames == frames and self._active:
+                IDLE_TIMEOUTS.inc()
+                logger.warning("No messages from Binance for %.0f seconds, dropping the connection", self._idle_timeout,
+                               extra={'pool': self.pool, 'shard': self.index})
+                # Без закрывающего рукопожатия: зависшее соединение на него не ответит
+                websocket.transport.abort()
+                return
+            frames = self._frames
+
+    async def _open_standby(self, websocket):
+        """Перед плановым разрывом открывает резервное соединение и передаёт ему поток."""
+        await asyncio.sleep(BINANCE_CONNECTION_MAX_AGE_SECONDS)
+        while True:
+            if not self.streams:
+                await asyncio.sleep(BINANCE_RECONNECT_MAX_SECONDS)
+                continue
+            standby = None
+            # С этого момента резервное соединение может получить то же, что доставит старое
+            self._seen = {}
+            try:
+                standby, streams, _ = await self._connect()
+                # Ответ на запрос придёт, даже если стримы сейчас молчат: первое сообщение подтверждает,
+                # что соединение живое
+                await standby.send(json.dumps({'method': 'LIST_SUBSCRIPTIONS', 'id': next(self._request_ids)}))
+                first_message = await asyncio.wait_for(standby.recv(), timeout=STANDBY_READY_TIMEOUT_SECONDS)
+            except asyncio.CancelledError:
+                self._seen = None
+                if standby is not None:
+                    await standby.close()
+                raise
+            except Exception as e:
+                self._seen = None
+                if standby is not None:
+                    await standby.close()
+                logger.warning("Could not open standby Binance connection: %s", e, extra={'pool': self.pool, 'shard': self.index})
+                await asyncio.sleep(BINANCE_RECONNECT_MAX_SECONDS)
+                continue
+            self._handover = (standby, streams, first_message)
+            HANDOVERS.inc()
+            logger.info("Handing over to standby Binance connection", extra={'pool': self.pool, 'shard': self.index})
+            await websocket.close()
+            return
+
+    async def _sync_loop(self, websocket):
+        """Досылает в открытое соединение разницу между желаемым и активным набором стримов."""
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            to_subscribe = sorted(self.streams - self._active)
+            to_unsubscribe = sorted(self._active - self.streams)
+            for method, streams in (('UNSUBSCRIBE', to_unsubscribe), ('SUBSCRIBE', to_subscribe)):
+                for i in range(0, len(streams), MAX_PARAMS_PER_REQUEST):
+                    params = streams[i:i + MAX_PARAMS_PER_REQUEST]
+                    await websocket.send(json.dumps({
+                        'method': method, 'params': params, 'id': next(self._request_ids)
+                    }))
+                    if method == 'SUBSCRIBE':
+                        self._active.update(params)
+                    else:
+                        self._active.difference_update(params)
+                    CONTROL_MESSAGES.labels(method).inc()
+                    logger.info("Binance %s", method, extra={'pool': self.pool, 'shard': self.index, 'streams': len(params)})
+                    # Не превышаем лимит управляющих сообщений на соединение
+                    await asyncio.sleep(1 / MAX_CONTROL_MESSAGES_PER_SECOND)
+            if not self.streams and not self._active:
+                # Пустое соединение не держим: оно переоткроется, когда стримы появятся
+                logger.info("Closing Binance connection without streams", extra={'pool': self.pool, 'shard': self.index})
+                self._emptied = True
+                await websocket.close()
+                return
+
+
+class _StreamPool:
+    """
+    Шарды одного назначения. Новые стримы добавляются в шарды со свободным местом,
+    при переполнении открывается новый шард; изменения уходят только разницей.
+    """
+
+    def __init__(self, name: str, on_message, idle_timeout: float | None = None, on_reconnect=None):
+        self.name = name
+        self._on_message = on_message
+        self._idle_timeout = idle_timeout
+        self._on_reconnect = on_reconnect
+        self._connections: list[_StreamConnection] = []
+        self._stream_to_connection: dict[str, _StreamConnection] = {}
+
+    def __len__(self):
+        return len(self._stream_to_connection)
+
+    def sync(self, wanted: set):
+        current = set(self._stream_to_connection)
+        changed = set()
+
+        for stream in current - wanted:
+            connection = self._stream_to_connection.pop(stream)
+            connection.streams.discard(stream)
+            changed.add(connection)
+
+        for stream in sorted(wanted - current):
+            connection = self._connection_with_capacity()
+            connection.streams.add(stream)
+            self._stream_to_connection[stream] = connection
+            changed.add(connection)
+
+        for connection in changed:
+            connection.start()
+            connection.mark_changed()
+
+    def _connection_with_capacity(self) -> _StreamConnection:
+        for connection in self._connections:
+            if len(connection.streams) < MAX_STREAMS_PER_CONNECTION:
+                return connection
+        connection = _StreamConnection(self.name, len(self._connections), self._on_message,
+                                       self._idle_timeout, self._on_reconnect)
+        self._connections.append(connection)
+        return connection
+
+    async def stop(self):
+        for connection in self._connections:
+            await connection.stop()
+
+
 class BinanceWsClient:
-    def __init__(self, get_symbols_func, sio_server, latest_prices_ref: dict):
+    def __init__(self, get_symbols_func, publisher, latest_prices_ref: dict, alert_engine=None,
+                 stream_type: str = 'ticker', candle_store=None, upstream=None, forward=None,
+                 market_symbols_func=None, depth_snapshot=None, ticker_prices=None, klines=None):
         """
         Инициализирует клиент.
-        :param get_symbols_func: Функция, возвращающая актуальный список символов.
-        :param sio_server: Экземпляр сервера Socket.IO.
+        :param get_symbols_func: Функция, возвращающая актуальный набор символов (объединение списков клиентов).
+        :param publisher: PriceUpdatePublisher, через который обновления пачками уходят клиентам.
         :param latest_prices_ref: Ссылка на глобальный словарь с ценами для синхронизации.
+        :param alert_engine: Серверный движок алертов (AlertEngine), проверяется на каждом тике.
+        :param stream_type: Один из STREAM_TYPES.
+        :param candle_store: CandleStore для свечей и скользящих окон по символам.
+        :param upstream: Источник сырых кадров вместо собственных соединений с Binance
+                         (feed.FeedClient в режиме worker).
+        :param forward: Функция, получающая каждый сырой кадр до обработки
+                        (feed.FeedHub.broadcast_ticks в режиме ingest).
+        :param market_symbols_func: Функция, возвращающая (символы для стакана, символы для сделок),
+                                    обычно AlertEngine.market_symbols.
+        :param depth_snapshot: async depth_snapshot(symbol) -> снимок стакана /api/v3/depth.
+                               Без него стаканы не ведутся.
+        :param ticker_prices: async ticker_prices(symbols) -> {symbol: цена} (REST ticker/price).
+        :param klines: async klines(symbol, start_time_ms, limit) -> минутные свечи REST.
+                       С ticker_prices и klines после обрыва соединения пропущенный интервал
+                       догружается и проверяется по ценовым алертам.
         """
+        if stream_type not in STREAM_TYPES:
+            raise ValueError(f"Unknown Binance stream type: {stream_type}")
         self._get_symbols = get_symbols_func
-        self._sio = sio_server
+        self._publisher = publisher
         self._latest_prices = latest_prices_ref # Используем переданный словарь
+        self._alert_engine = alert_engine
+        self._tickers = _StreamPool('ticker', self._process_message, BINANCE_IDLE_TIMEOUT_SECONDS, self._on_ticker_reconnect)
+        # Стаканы и сделки идут отдельными соединениями: их поток не задерживает тикеры
+        # и не пересылается воркерам (алерты проверяет только этот процесс). Стримы редких символов
+        # могут подолгу молчать, поэтому без idle-таймаута: мёртвое соединение выявят пинги websockets
+        self._market = _StreamPool('market', self._process_market_message)
+        self._get_market_symbols = market_symbols_func
+        self._order_books = OrderBookSync(depth_snapshot) if depth_snapshot is not None else None
+        self._stream_type = stream_type
+        self._candle_store = candle_store
+        self._upstream = upstream
+        self._forward = forward
+        self._ticker_prices = ticker_prices
+        self._klines = klines
+        self._backfill_tasks: set[asyncio.Task] = set()
+        self._decoder = create_ticker_decoder()
+        # Снимок отслеживаемых пар {'BTCUSDT': 'BTC'}: O(1) фильтр без нарезки строк на каждом тике.
+        # Обновляется только в sync_subscriptions
+        self._tracked: dict[str, str] = {}
+        self._depth_symbols: list[str] = []
+        logger.info("Binance client configured", extra={'stream_type': stream_type, 'decoder': self._decoder.name})
 
-    def _build_ws_url(self) -> str | None:
-        """Формирует URL для мульти-стрима Binance."""
+    def sync_subscriptions(self):
+        """Приводит подписки к текущему списку символов, отправляя только разницу."""
         symbols = self._get_symbols()
-        if not symbols:
-            return None
-        # Используем @ticker для получения и цены, и процентов
-        streams = [f"{symbol.lower()}usdt@ticker" for symbol in symbols]
-        return f"wss://stream.binance.com:9443/stream?streams={'/'.join(streams)}"
+        self._tracked = {f"{symbol}USDT": symbol for symbol in symbols}
+        if self._candle_store is not None:
+            # Память свечей ограничена только отслеживаемыми символами
+            for symbol in [s for s in self._candle_store.symbols() if s not in symbols]:
+                self._candle_store.discard(symbol)
+        if self._upstream is not None:
+            return  # подписками на Binance управляет процесс ingest
+        if self._stream_type == 'allMiniTickers':
+            wanted = {ALL_MINI_TICKERS_STREAM} if symbols else set()
+        else:
+            wanted = {stream_name(symbol, self._stream_type) for symbol in symbols}
+        self._tickers.sync(wanted)
+        self.sync_market_streams()
+
+        if not wanted:
+            logger.info("Symbol list is empty, Binance client is paused")
+
+    def sync_market_streams(self):
+        """Подписки на стаканы и сделки - только для отслеживаемых символов с такими алертами."""
+        if self._upstream is not None or self._get_market_symbols is None:
+            return
+        depth_symbols, trade_symbols = self._get_market_symbols()
+        tracked = set(self._tracked.values())
+        trade_symbols = trade_symbols & tracked
+        depth_symbols = sorted(depth_symbols & tracked) if self._order_books is not None else []
+        if len(depth_symbols) > BINANCE_MAX_DEPTH_SYMBOLS:
+            if BINANCE_MAX_DEPTH_SYMBOLS:
+                logger.warning("Too many symbols need an order book, keeping the first %d of %d",
+                               BINANCE_MAX_DEPTH_SYMBOLS, len(depth_symbols))
+            depth_symbols = depth_symbols[:BINANCE_MAX_DEPTH_SYMBOLS]
+        if self._order_books is not None:
+            for symbol in set(self._depth_symbols) - set(depth_symbols):
+                self._order_books.discard(symbol)
+        self._depth_symbols = depth_symbols
+        wanted = {stream_name(symbol, DEPTH_STREAM_TYPE) for symbol in depth_symbols}
+        wanted |= {stream_name(symbol, TRADE_STREAM_TYPE) for symbol in trade_symbols}
+        self._market.sync(wanted)
 
     async def run(self):
-        """Основной метод для запуска и автоматического переподключения клиента."""
-        while True:
-            ws_url = self._build_ws_url()
-            if not ws_url:
-                print("Symbol list is empty, Binance client is paused.")
-                await asyncio.sleep(15)
+        """Основной метод: поднимает шарды и держит их до отмены задачи."""
+        self.sync_subscriptions()
+        if self._upstream is not None:
+            await self._upstream.run(self._process_message)
+            return
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            logger.info("Binance client task was cancelled")
+            await self._tickers.stop()
+            await self._market.stop()
+            for task in self._backfill_tasks:
+                task.cancel()
+            raise
+
+    def _on_ticker_reconnect(self, streams: set, gap_started: float):
+        """Шард тикеров переподключился после обрыва: догружаем пропущенное в фоне, не задерживая поток."""
+        if self._alert_engine is None or self._ticker_prices is None or self._klines is None:
+            return
+        if self._stream_type == 'allMiniTickers':
+            symbols = set(self._tracked.values())
+        else:
+            symbols = {symbol for symbol in self._tracked.values() if stream_name(symbol, self._stream_type) in streams}
+        symbols &= self._alert_engine.price_alert_symbols()
+        if symbols:
+            task = asyncio.create_task(self._backfill(symbols, gap_started))
+            self._backfill_tasks.add(task)
+            task.add_done_callback(self._backfill_tasks.discard)
+
+    async def _backfill(self, symbols: set, gap_started: float):
+        """
+        Диапазон цен за время обрыва по REST: текущая цена (ticker/price) и минимумы/максимумы
+        минутных свечей с минуты обрыва (klines). Алерты с уровнями внутри диапазона срабатывают,
+        как если бы тики не пропадали (с точностью до минуты). Последние цены не меняются.
+        """
+        started = time.perf_counter()
+        ranges: dict[str, list[float]] = {}
+        try:
+            for symbol, price in (await self._ticker_prices(symbols)).items():
+                ranges[symbol] = [price, price]
+        except Exception as e:
+            logger.warning("Gap fill: could not fetch ticker prices: %s", e)
+
+        start_time = int(gap_started // 60 * 60 * 1000)  # с начала минуты, в которой был обрыв
+        limit = min(int((time.time() - gap_started) // 60) + 2, MAX_KLINES_PER_REQUEST)
+        semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+        # Вес klines - 2 за символ, поэтому символы сверх лимита проверяются только по ticker/price
+        kline_symbols = sorted(symbols)[:BINANCE_BACKFILL_MAX_SYMBOLS]
+
+        async def fetch(symbol):
+            async with semaphore:
+                return await self._klines(symbol, start_time, limit)
+
+        results = await asyncio.gather(*(fetch(symbol) for symbol in kline_symbols), return_exceptions=True)
+        failed = 0
+        for symbol, candles in zip(kline_symbols, results):
+            if isinstance(candles, Exception):
+                failed += 1
                 continue
+            for candle in candles:
+                high, low = float(candle[2]), float(candle[3])
+                bounds = ranges.setdefault(symbol, [low, high])
+                bounds[0] = min(bounds[0], low)
+                bounds[1] = max(bounds[1], high)
 
-            print(f"Connecting to Binance WebSocket: {ws_url}")
-            try:
-                async with websockets.connect(ws_url) as websocket:
-                    print(">>> Successfully connected to Binance WebSocket (TICKER).")
-                    await self.listen_to_messages(websocket)
-            except asyncio.CancelledError:
-                print("Binance client task was cancelled.")
-                break
-            except Exception as e:
-                print(f"!!! Error with Binance WebSocket: {e}. Reconnecting in 10 seconds...")
-                await asyncio.sleep(10)
+        triggered = 0
+        for symbol, (low, high) in ranges.items():
+            triggered += len(self._alert_engine.process_range(symbol, low, high))
+        BACKFILLS.inc()
+        BACKFILL_ALERTS.inc(triggered)
+        BACKFILL_SECONDS.observe(time.perf_counter() - started)
+        logger.info("Gap fill done", extra={
+            'gap_seconds': round(time.time() - gap_started, 1), 'symbols': len(ranges),
+            'klines_failed': failed, 'alerts': triggered
+        })
 
-    async def listen_to_messages(self, websocket):
-        """Бесконечно прослушивает сообщения из активного сокета."""
-        while True:
-            message = json.loads(await websocket.recv())
-            await self._process_message(message)
-
-    async def _process_message(self, message: dict):
-        """Обрабатывает входящее сообщение и отправляет обновление на фронтенд."""
-        if 'data' in message and 's' in message['data'] and 'c' in message['data'] and 'P' in message['data']:
-            data = message['data']
-            full_symbol, price_str, percent_str = data['s'], data['c'], data['P']
-            base_symbol = full_symbol[:-4]
-            
-            if base_symbol in self._get_symbols():
-                try:
-                    price = float(price_str)
-                    price_change_percent = float(percent_str)
-                    previous_price = self._latest_prices.get(base_symbol)
-                    self._latest_prices[base_symbol] = price
-                    
-                    if price != previous_price:
-                        payload = {
-                            'symbol': base_symbol, 'price': price,
-                            'previousPrice': previous_price, 'priceChangePercent': price_change_percent
-                        }
-                        await self._sio.emit('price_update', payload)
-                except (ValueError, TypeError):
-                    pass
\ No newline at end of file
+    async def _process_message(self, raw):
+        """Декодирует входящее сообщение и передает обновления в рассылку на фронтенд."""
+        started = time.perf_counter()
+        MESSAGES.inc()
+        if self._forward is not None:
+            self._forward(raw)
+        tracked = self._tracked
+        candle_store = self._candle_store
+        tickers = self._decoder.decode(raw)
+        decoded = time.perf_counter()
+        DECODE_SECONDS.observe(decoded - started)
+        TICKS.inc(len(tickers))
+        for full_symbol, price, price_change_percent, quote_volume, event_time in tickers:
+            base_symbol = tracked.get(full_symbol)
+            if base_symbol is None:
+                continue
+            timestamp = event_time / 1000 if event_time else time.time()
+            if candle_store is not None:
+                candle_store.add_tick(base_symbol, timestamp, price, quote_volume)
+            previous_price = self._latest_prices.get(base_symbol)
+            self._latest_prices[base_symbol] = price
+
+            # Условные алерты (объём, окна) проверяются и на тиках без изменения цены
+            if self._alert_engine is not None:
+                self._alert_engine.process_tick(base_symbol, previous_price, price, now=timestamp)
+
+            if self._publisher is not None and price != previous_price:
+                payload = {
+                    'symbol': base_symbol, 'price': price,
+                    'previousPrice': previous_price, 'priceChangePercent': price_change_percent
+                }
+                self._publisher.publish(base_symbol, payload)
+        PROCESS_SECONDS.observe(time.perf_counter() - started)
+
+    async def _process_market_message(self, raw):
+        """Событие стакана или сделки: обновляет локальный стакан и проверяет алерты по нему."""
+        started = time.perf_counter()
+        now = time.time()
+        try:
+            event = self._handle_market_event(raw, now)
+        except Exception as e:
+            # Один битый кадр (или ошибка в обработке алерта) не должен переоткрывать соединение
+            MARKET_ERRORS.inc()
+            logger.exception("Could not handle Binance market frame: %s", e)
+            return
+        if event is None:
+            return
+        event_type = event['e']
+        MARKET_EVENTS.labels(event_type).inc()
+        MARKET_EVENT_DELAY_SECONDS.labels(event_type).observe(max(now - event.get('E', now * 1000) / 1000, 0.0))
+        MARKET_PROCESS_SECONDS.labels(event_type).observe(time.perf_counter() - started)
+
+    def _handle_market_event(self, raw, now: float) -> dict | None:
+        """Обработанное событие или None, если кадр не для нас (ответы на SUBSCRIBE, чужие символы)."""
+        event = loads(raw).get('data')
+        if not event:
+            return None
+        event_type = event.get('e')
+        base_symbol = self._tracked.get(event.get('s'))
+        if base_symbol is None:
+            return None
+        if event_type == 'aggTrade':
+            self._alert_engine.process_trade(base_symbol, float(event['p']), float(event['q']), event['m'], now)
+        elif event_type == 'depthUpdate' and self._order_books is not None:
+            book = self._order_books.on_event(base_symbol, event['U'], event['u'], event['b'], event['a'])
+            if book is not None:
+                self._alert_engine.process_book(base_symbol, book, now)
+        else:
+            return None
+        return event
+
+    def stats(self) -> dict:
+        return {
+            'ticker_streams': len(self._tickers),
+            'market_streams': len(self._market),
+            'order_books': self._order_books.stats() if self._order_books is not None else None,
+        }
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import random
+import time
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from multidict import CIMultiDict
+
+import metrics
+from codec import loads
+from config import BINANCE_API_BASE_URL, BINANCE_WEB_BASE_URL
+
+logger = logging.getLogger(__name__)
+
+REQUEST_SECONDS = metrics.Histogram('binance_rest_request_seconds', 'Binance REST request time including retries', ('path',))
+RETRIES = metrics.Counter('binance_rest_retries_total', 'Retried Binance REST requests', ('path',))
+ERRORS = metrics.Counter('binance_rest_errors_total', 'Binance REST requests that failed after all retries', ('path',))
+USED_WEIGHT = metrics.Gauge('binance_rest_used_weight', 'Request weight used in the current minute (X-MBX-USED-WEIGHT-1M)')
+
+EXCHANGE_INFO_URL = f'{BINANCE_API_BASE_URL}/api/v3/exchangeInfo'
+ASSETS_URL = f'{BINANCE_WEB_BASE_URL}/bapi/asset/v2/public/asset/asset/get-all-asset'
+TICKER_PRICE_URL = f'{BINANCE_API_BASE_URL}/api/v3/ticker/price'
+DEPTH_URL = f'{BINANCE_API_BASE_URL}/api/v3/depth'
+KLINES_URL = f'{BINANCE_API_BASE_URL}/api/v3/klines'
+
+# Статусы, после которых имеет смысл повторить запрос
+RETRY_STATUSES = {418, 429, 500, 502, 503, 504}
+
+
+class RestResponse(NamedTuple):
+    status: int
+    headers: CIMultiDict
+    body: bytes
+
+
+def used_weight() -> int:
+    """Вес запросов к api.binance.com за текущую минуту по последнему ответу (лимит - 6000)."""
+    return int(USED_WEIGHT.value)
+
+
+def create_session() -> aiohttp.ClientSession:
+    """Общая сессия с пулом соединений для всех REST-запросов к Binance."""
+    connector = aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector, raise_for_status=False)
+
+
+async def fetch_json(session: aiohttp.ClientSession, url: str, params: dict | None = None,
+                     timeout: float = 10, retries: int = 3, backoff: float = 0.5):
+    """GET-запрос, возвращающий разобранный JSON (см. fetch)."""
+    response = await fetch(session, url, params, timeout=timeout, retries=retries, backoff=backoff)
+    return loads(response.body)
+
+
+async def fetch(session: aiohttp.ClientSession, url: str, params: dict | None = None, headers: dict | None = None,
+                timeout: float = 10, retries: int = 3, backoff: float = 0.5) -> RestResponse:
+    """
+    GET-запрос с таймаутом и повторами с экспоненциальной задержкой.
+    Для 429/418 учитывается заголовок Retry-After. Ответ 304 на условный запрос
+    (If-None-Match/If-Modified-Since в headers) возвращается как есть, с пустым телом.
+    """
+    path = urlsplit(url).path
+    started = time.perf_counter()
+    try:
+        return await _fetch_with_retries(session, url, params, headers, timeout, retries, backoff)
+    except Exception:
+        ERRORS.labels(path).inc()
+        raise
+    finally:
+        REQUEST_SECONDS.labels(path).observe(time.perf_counter() - started)
+
+
+async def _fetch_with_retries(session, url, params, headers, timeout, retries, backoff):
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    for attempt in range(retries + 1):
+        retry_after = None
+        try:
+            async with session.get(url, params=params, headers=headers, timeout=client_timeout) as response:
+                weight = response.headers.get('X-MBX-USED-WEIGHT-1M')
+                if weight and weight.isdigit():
+                    USED_WEIGHT.set(int(weight))
+                if response.status in RETRY_STATUSES and attempt < retries:
+                    retry_after = response.headers.get('Retry-After')
+                    raise aiohttp.ClientResponseError(
+                        response.request_info, response.history,
+                        status=response.status, message=response.reason or ''
+                    )
+                response.raise_for_status()
+                return RestResponse(response.status, response.headers.copy(), await response.read())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if isinstance(e, aiohttp.ClientResponseError) and e.status not in RETRY_STATUSES:
+                raise
+            if attempt >= retries:
+                raise
+            delay = backoff * (2 ** attempt) + random.uniform(0, backoff)
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            RETRIES.labels(urlsplit(url).path).inc()
+            logger.warning("Request to %s failed (%r), retry %d/%d in %.1fs", url, e, attempt + 1, retries, delay)
+            await asyncio.sleep(delay)
+
+
+async def fetch_ticker_prices(session: aiohttp.ClientSession, symbols=None) -> dict:
+    """
+    Последние цены USDT-пар: {'BTC': 65000.0, ...}.
+    :param symbols: Если задан, возвращаются только эти базовые активы.
+    """
+    prices_data = await fetch_json(session, TICKER_PRICE_URL)
+    wanted = set(symbols) if symbols is not None else None
+    prices = {}
+    for item in prices_data:
+        full_symbol = item['symbol']
+        if not full_symbol.endswith('USDT'):
+            continue
+        base_symbol = full_symbol[:-4]
+        if wanted is None or base_symbol in wanted:
+            prices[base_symbol] = float(item['price'])
+    return prices
+
+
+async def fetch_depth_snapshot(session: aiohttp.ClientSession, symbol: str, limit: int = 100) -> dict:
+    """
+    Снимок стакана пары к USDT: {'lastUpdateId', 'bids', 'asks'} (уровни - пары строк [цена, объём]).
+    Вес запроса растёт с limit: 5 до 100 уровней, 25 до 500.
+    """
+    return await fetch_json(session, DEPTH_URL, {'symbol': f"{symbol}USDT", 'limit': limit})
+
+
+async def fetch_klines(session: aiohttp.ClientSession, symbol: str, interval: str = '1m',
+                       start_time: int | None = None, limit: int = 500) -> list[list]:
+    """
+    Свечи пары к USDT: [[время открытия, open, high, low, close, объём, ...], ...] (цены - строки).
+    :param start_time: Время открытия первой свечи, мс.
+    :param limit: До 1000 свечей, вес запроса 2.
+    """
+    params = {'symbol': f"{symbol}USDT", 'interval': interval, 'limit': limit}
+    if start_time is not None:
+        params['startTime'] = start_time
+    return await fetch_json(session, KLINES_URL, params)
@@ -0,0 +1,134 @@
+from array import array
+
+# Поддерживаемые интервалы свечей (секунды) и сколько свечей каждого храним на символ
+INTERVALS = {'1s': 1, '1m': 60, '5m': 300}
+DEFAULT_CAPACITY = {'1s': 600, '1m': 720, '5m': 576}  # 10 минут, 12 часов, 48 часов
+
+_COLUMNS = ('time', 'open', 'high', 'low', 'close', 'volume')
+
+
+class CandleRing:
+    """
+    Кольцевой буфер свечей одного интервала.
+    Колонки - array('d') фиксированной длины, память не растёт со временем:
+    capacity * 6 * 8 байт на интервал.
+    """
+    __slots__ = ('seconds', 'capacity', 'count', 'head') + _COLUMNS
+
+    def __init__(self, seconds: int, capacity: int):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.count = 0   # сколько свечей заполнено
+        self.head = -1   # индекс последней (текущей) свечи
+        for column in _COLUMNS:
+            setattr(self, column, array('d', bytes(8 * capacity)))
+
+    def add(self, timestamp: float, price: float, volume: float):
+        bucket = timestamp - timestamp % self.seconds
+        head = self.head
+        if head >= 0 and self.time[head] == bucket:
+            if price > self.high[head]:
+                self.high[head] = price
+            if price < self.low[head]:
+                self.low[head] = price
+            self.close[head] = price
+            self.volume[head] += volume
+            return
+        if head >= 0 and bucket < self.time[head]:
+            return  # запоздавший тик из уже закрытой свечи
+
+        head = (head + 1) % self.capacity
+        self.head = head
+        self.count = min(self.count + 1, self.capacity)
+        self.time[head] = bucket
+        self.open[head] = self.high[head] = self.low[head] = self.close[head] = price
+        self.volume[head] = volume
+
+    def _indexes(self, limit: int | None = None):
+        """Индексы свечей от старой к новой (не более limit последних)."""
+        count = self.count if limit is None else min(limit, self.count)
+        start = self.head - count + 1
+        return [(start + i) % self.capacity for i in range(count)]
+
+    def query(self, start: float | None = None, end: float | None = None, limit: int | None = None) -> list[list]:
+        """Свечи [time, open, high, low, close, volume] в диапазоне времени, от старых к новым."""
+        rows = []
+        for i in self._indexes():
+            t = self.time[i]
+            if (start is not None and t < start) or (end is not None and t > end):
+                continue
+            rows.append([t, self.open[i], self.high[i], self.low[i], self.close[i], self.volume[i]])
+        if limit is not None:
+            rows = rows[-limit:]
+        return rows
+
+    def closes(self, limit: int | None = None) -> list[float]:
+        return [self.close[i] for i in self._indexes(limit)]
+
+    def volumes(self, limit: int | None = None) -> list[float]:
+        return [self.volume[i] for i in self._indexes(limit)]
+
+    def price_at(self, timestamp: float) -> float | None:
+        """Цена закрытия последней свечи, начавшейся не позже timestamp (бинарный поиск, O(log n))."""
+        low, high = 0, self.count  # логические позиции от самой старой свечи
+        oldest = self.head - self.count + 1
+        while low < high:
+            mid = (low + high) // 2
+            if self.time[(oldest + mid) % self.capacity] <= timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        if low == 0:
+            return None
+        return self.close[(oldest + low - 1) % self.capacity]
+
+
+class CandleStore:
+    """
+    Хранилище свечей 1s/1m/5m по символам, наполняется тиками из BinanceWsClient.
+    Объём свечи считается по приросту 24ч оборота в USDT (поле q тикера): это приближение,
+    точный объём даёт только поток сделок.
+    """
+
+    def __init__(self, capacity: dict | None = None):
+        self._capacity = {**DEFAULT_CAPACITY, **(capacity or {})}
+        self._series: dict[str, dict[str, CandleRing]] = {}
+        self._last_quote_volume: dict[str, float] = {}
+
+    def add_tick(self, symbol: str, timestamp: float, price: float, quote_volume: float = 0.0):
+        """
+        :param timestamp: Время события в секундах.
+        :param quote_volume: Накопленный 24ч оборот в USDT.
+        """
+        series = self._series.get(symbol)
+        if series is None:
+            series = self._series[symbol] = {
+                name: CandleRing(seconds, self._capacity[name]) for name, seconds in INTERVALS.items()
+            }
+        previous_volume = self._last_quote_volume.get(symbol)
+        self._last_quote_volume[symbol] = quote_volume
+        # Окно 24ч скользит, поэтому оборот может и уменьшаться - такие приращения не учитываем
+        volume = max(quote_volume - previous_volume, 0.0) if previous_volume is not None else 0.0
+        for ring in series.values():
+            ring.add(timestamp, price, volume)
+
+    def get(self, symbol: str, interval: str) -> CandleRing | None:
+        series = self._series.get(symbol)
+        return series.get(interval) if series else None
+
+    def query(self, symbol: str, interval: str, start: float | None = None,
+              end: float | None = None, limit: int | None = None) -> list[list]:
+        ring = self.get(symbol, interval)
+        return ring.query(start, end, limit) if ring else []
+
+    def discard(self, symbol: str):
+        self._series.pop(symbol, None)
+        self._last_quote_volume.pop(symbol, None)
+
+    def symbols(self):
+        return self._series.keys()
+
+    @staticmethod
+    def bytes_per_symbol(capacity: dict | None = None) -> int:
+        capacity = {**DEFAULT_CAPACITY, **(capacity or {})}
+        return sum(capacity[name] * len(_COLUMNS) * 8 for name in INTERVALS)
@@ -0,0 +1,129 @@
+"""
+Декодирование сообщений Binance WebSocket и кодирование исходящих пакетов Socket.IO.
+
+Декодер выбирается по доступным библиотекам: msgspec (типизированная структура тикера),
+затем orjson, затем стандартный json. Все варианты возвращают одинаковый результат -
+список кортежей (full_symbol, price, price_change_percent, quote_volume, event_time_ms).
+"""
+import json
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Разбор прочих ответов Binance (exchangeInfo - несколько МБ, стаканы и сделки - на горячем пути)
+loads = orjson.loads if orjson is not None else json.loads
+
+
+def _percent(close: float, open_price: float) -> float:
+    # В miniTicker нет поля P - считаем процент изменения от цены открытия окна 24ч
+    return (close - open_price) / open_price * 100 if open_price else 0.0
+
+
+if msgspec is not None:
+    class Ticker(msgspec.Struct):
+        """Общие поля @ticker и @miniTicker. Числа приходят строками, их разбирает msgspec."""
+        s: str
+        c: float
+        o: float = 0.0
+        q: float = 0.0
+        E: int = 0
+        P: float | None = None
+
+    class Envelope(msgspec.Struct):
+        """Сообщение комбинированного стрима; ответы на SUBSCRIBE приходят без data."""
+        data: list[Ticker] | Ticker | None = None
+
+
+class MsgspecTickerDecoder:
+    name = 'msgspec'
+
+    def __init__(self):
+        self._decoder = msgspec.json.Decoder(Envelope, strict=False)
+
+    def decode(self, raw) -> list[tuple]:
+        try:
+            data = self._decoder.decode(raw).data
+        except (msgspec.ValidationError, msgspec.DecodeError):
+            return []  # битый или не тот кадр не должен обрывать соединение
+        if data is None:
+            return []
+        if not isinstance(data, list):
+            data = (data,)
+        return [
+            (t.s, t.c, t.P if t.P is not None else _percent(t.c, t.o), t.q, t.E)
+            for t in data
+        ]
+
+
+class JsonTickerDecoder:
+    def __init__(self):
+        if orjson is not None:
+            self.name, self._loads = 'orjson', orjson.loads
+        else:
+            self.name, self._loads = 'json', json.loads
+
+    def decode(self, raw) -> list[tuple]:
+        try:
+            message = self._loads(raw)
+        except ValueError:  # json.JSONDecodeError и orjson.JSONDecodeError - подклассы ValueError
+            return []
+        data = message.get('data') if isinstance(message, dict) else None
+        if data is None:
+            return []
+        if not isinstance(data, list):
+            data = (data,)
+        ticks = []
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            try:
+                price = float(item['c'])
+                percent = item.get('P')
+                percent = float(percent) if percent is not None else _percent(price, float(item.get('o', 0)))
+                ticks.append((item['s'], price, percent, float(item.get('q', 0)), int(item.get('E', 0))))
+            except (KeyError, ValueError, TypeError):
+                continue
+        return ticks
+
+
+def create_ticker_decoder():
+    """Самый быстрый из доступных декодеров."""
+    if msgspec is not None:
+        return MsgspecTickerDecoder()
+    return JsonTickerDecoder()
+
+
+class PreEncoded(str):
+    """Аргумент события, уже закодированный в JSON: SocketJson вставляет его в пакет как есть."""
+    __slots__ = ()
+
+    @classmethod
+    def encode(cls, data) -> 'PreEncoded':
+        return cls(json.dumps(data, separators=(',', ':')))
+
+
+class SocketJson:
+    """
+    JSON-модуль для python-socketio (параметр json= у AsyncServer).
+    Пакет события - это список [имя, аргументы...]; PreEncoded-аргументы не кодируются повторно,
+    поэтому один раз закодированный снимок можно разослать любому числу клиентов.
+    """
+
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        if isinstance(obj, list) and any(isinstance(item, PreEncoded) for item in obj):
+            return '[' + ','.join(
+                item if isinstance(item, PreEncoded) else json.dumps(item, **kwargs) for item in obj
+            ) + ']'
+        return json.dumps(obj, **kwargs)
+
+    @staticmethod
+    def loads(data, **kwargs):
+        return json.loads(data, **kwargs)
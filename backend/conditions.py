@@ -0,0 +1,352 @@
+import itertools
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from candles import DEFAULT_CAPACITY, INTERVALS
+
+# Типы условий. Пересечение уровня цены ("выше"/"ниже") обслуживает индекс в AlertEngine
+PCT_CHANGE, MA_CROSS, VOLUME_SPIKE, TRADE_SIZE, SPREAD, DEPTH_IMBALANCE = 0, 1, 2, 3, 4, 5
+CONDITION_KINDS = {
+    'pct_change': PCT_CHANGE, 'ma_cross': MA_CROSS, 'volume_spike': VOLUME_SPIKE,
+    'trade_size': TRADE_SIZE, 'spread': SPREAD, 'depth_imbalance': DEPTH_IMBALANCE,
+}
+# Условия по стакану и сделкам проверяются не на тиках, а на событиях @depth и @aggTrade
+BOOK_KINDS = ('spread', 'depth_imbalance')
+TRADE_KINDS = ('trade_size',)
+DIRECTIONS = {'up': 1, 'down': -1, 'any': 0}
+
+# Повторное срабатывание возможно только после того, как условие "отпустит" с запасом:
+# для процентов и объёма - доля порога, для MA - фиксированное отклонение в процентах
+HYSTERESIS_RATIO = 0.25
+MA_REARM_MARGIN_PCT = 0.05
+# Перекос стакана считается не глубже этого числа уровней (столько приходит в снимке)
+MAX_IMBALANCE_LEVELS = 100
+# Окна до этой длины считаются по секундным свечам, длиннее - по минутным, а сверх истории
+# минутных свечей (12 часов) - по пятиминутным. Длиннее истории пятиминутных (48 часов) окно не бывает:
+# одна свеча в кольце - текущая, окно должно уложиться в остальные
+SECOND_CANDLES_MAX_WINDOW = 600
+MINUTE_CANDLES_MAX_WINDOW = (DEFAULT_CAPACITY['1m'] - 1) * INTERVALS['1m']
+FIVE_MINUTE_CANDLES_MAX_WINDOW = (DEFAULT_CAPACITY['5m'] - 1) * INTERVALS['5m']
+
+
+@dataclass
+class ConditionAlert:
+    """
+    Алерт по условию.
+    pct_change:   изменение цены за window секунд не меньше threshold процентов.
+    ma_cross:     пересечение скользящей средней по window секунд (минутные свечи), threshold - запас в %.
+    volume_spike: объём текущей минуты в threshold раз больше среднего за window секунд.
+    trade_size:   сделка на threshold USDT и больше; up - покупка по рынку, down - продажа (window не нужен).
+    spread:       спред лучших цен не меньше threshold процентов (window и direction не нужны).
+    depth_imbalance: перекос объёмов (bid - ask) / (bid + ask) лучших window уровней не меньше threshold (0..1).
+    """
+    id: int
+    owner: str
+    symbol: str
+    kind: str
+    threshold: float
+    window: int
+    direction: str
+    cooldown: float
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def key(self) -> tuple:
+        return (self.owner, self.symbol, self.kind, self.threshold, self.window, self.direction)
+
+    def to_dict(self) -> dict:
+        return {
+            'pair': f"{self.symbol}/USDT", 'kind': self.kind, 'threshold': self.threshold,
+            'window': self.window, 'direction': self.direction, 'cooldown': self.cooldown,
+        }
+
+
+def validate_condition(kind: str, threshold: float, window: int, direction: str) -> str | None:
+    """Возвращает текст ошибки или None, если параметры корректны."""
+    if kind not in CONDITION_KINDS:
+        return f"Unknown condition kind: {kind}"
+    if direction not in DIRECTIONS:
+        return f"Direction must be one of: {', '.join(DIRECTIONS)}"
+    if kind in BOOK_KINDS or kind in TRADE_KINDS:
+        if kind == 'depth_imbalance' and not 0 < threshold <= 1:
+            return "Threshold for depth_imbalance is between 0 and 1"
+        if kind == 'depth_imbalance' and not 1 <= window <= MAX_IMBALANCE_LEVELS:
+            return f"Window for depth_imbalance is the number of levels, 1 to {MAX_IMBALANCE_LEVELS}"
+        if kind != 'depth_imbalance' and window < 0:
+            return "Window must not be negative"
+    elif window <= 0:
+        return "Window must be positive"
+    if kind == 'ma_cross' and direction == 'any':
+        return "ma_cross needs direction 'up' or 'down'"
+    if kind == 'ma_cross' and threshold < 0:
+        return "Threshold must not be negative"
+    if kind != 'ma_cross' and threshold <= 0:
+        return "Threshold must be positive"
+    if kind in ('ma_cross', 'volume_spike') and window < 60:
+        return "Window for ma_cross and volume_spike is at least 60 seconds"
+    # ma_cross и volume_spike считаются по минутным свечам, pct_change - до пятиминутных
+    if kind in ('ma_cross', 'volume_spike') and window > MINUTE_CANDLES_MAX_WINDOW:
+        return f"Window for ma_cross and volume_spike is at most {MINUTE_CANDLES_MAX_WINDOW} seconds"
+    if kind == 'pct_change' and window > FIVE_MINUTE_CANDLES_MAX_WINDOW:
+        return f"Window for pct_change is at most {FIVE_MINUTE_CANDLES_MAX_WINDOW} seconds"
+    return None
+
+
+class _SymbolConditions:
+    """
+    Условия одного символа в колоночном виде (NumPy), чтобы проверять их все за один проход.
+    Колонки - срезы буферов, которые растут вдвое при заполнении: восстановление N условий
+    из хранилища стоит O(N), а не O(N^2). Удаление сдвигает оставшиеся строки в начало буферов.
+    """
+    _FIELDS = {
+        'ids': np.int64, 'kind': np.int8, 'threshold': np.float64, 'window': np.float64,
+        'direction': np.int8, 'cooldown': np.float64, 'rearm': np.float64,
+        'last_fired': np.float64, 'armed': np.bool_, 'fresh': np.bool_,
+    }
+    _INITIAL_CAPACITY = 4
+
+    def __init__(self):
+        self._count = 0
+        self._buffers = {name: np.empty(self._INITIAL_CAPACITY, dtype=dtype) for name, dtype in self._FIELDS.items()}
+        self._refresh_views()
+
+    def __len__(self):
+        return self._count
+
+    def _refresh_views(self):
+        # Срезы - представления буферов: изменения last_fired/armed/fresh в _fire пишутся прямо в буфер
+        for name, buffer in self._buffers.items():
+            setattr(self, name, buffer[:self._count])
+
+    def add(self, alert: ConditionAlert):
+        kind = CONDITION_KINDS[alert.kind]
+        if kind == MA_CROSS:
+            rearm = MA_REARM_MARGIN_PCT + alert.threshold * HYSTERESIS_RATIO
+        elif kind == TRADE_SIZE:
+            rearm = -np.inf  # каждая сделка - отдельное событие, сдерживает только cooldown
+        else:
+            rearm = alert.threshold * HYSTERESIS_RATIO
+        row = {
+            'ids': alert.id, 'kind': kind, 'threshold': alert.threshold, 'window': alert.window,
+            'direction': DIRECTIONS[alert.direction], 'cooldown': alert.cooldown, 'rearm': rearm,
+            'last_fired': -np.inf, 'armed': True, 'fresh': True,
+        }
+        if self._count == len(self._buffers['ids']):
+            for name, buffer in self._buffers.items():
+                grown = np.empty(len(buffer) * 2, dtype=buffer.dtype)
+                grown[:self._count] = buffer[:self._count]
+                self._buffers[name] = grown
+        for name, value in row.items():
+            self._buffers[name][self._count] = value
+        self._count += 1
+        self._refresh_views()
+
+    def remove(self, alert_id: int):
+        keep = self.ids != alert_id
+        count = int(keep.sum())
+        for name, buffer in self._buffers.items():
+            buffer[:count] = buffer[:self._count][keep]
+        self._count = count
+        self._refresh_views()
+
+
+class ConditionIndex:
+    """Условные алерты по символам, проверяются векторно на каждом тике по данным CandleStore."""
+
+    def __init__(self, candle_store):
+        self._candles = candle_store
+        self._alerts: dict[int, ConditionAlert] = {}
+        self._by_key: dict[tuple, int] = {}
+        self._symbols: dict[str, _SymbolConditions] = {}
+        self._ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def add(self, owner: str, symbol: str, kind: str, threshold: float, window: int,
+            direction: str, cooldown: float) -> ConditionAlert | None:
+        alert = ConditionAlert(next(self._ids), owner, symbol, kind, threshold, int(window), direction, cooldown)
+        if alert.key in self._by_key:
+            return None
+        self._alerts[alert.id] = alert
+        self._by_key[alert.key] = alert.id
+        self._symbols.setdefault(symbol, _SymbolConditions()).add(alert)
+        return alert
+
+    def remove(self, key: tuple) -> ConditionAlert | None:
+        alert_id = self._by_key.pop(key, None)
+        if alert_id is None:
+            return None
+        alert = self._alerts.pop(alert_id)
+        book = self._symbols.get(alert.symbol)
+        if book is not None:
+            book.remove(alert_id)
+            if not len(book):
+                del self._symbols[alert.symbol]
+        return alert
+
+    def get_alerts(self, owner: str | None = None, symbol: str | None = None) -> list[ConditionAlert]:
+        return [
+            a for a in self._alerts.values()
+            if (owner is None or a.owner == owner) and (symbol is None or a.symbol == symbol)
+        ]
+
+    def symbols(self) -> set:
+        return set(self._symbols)
+
+    def market_symbols(self) -> tuple[set, set]:
+        """Символы, которым нужен стакан, и символы, которым нужны сделки."""
+        depth, trades = set(), set()
+        for alert in self._alerts.values():
+            if alert.kind in BOOK_KINDS:
+                depth.add(alert.symbol)
+            elif alert.kind in TRADE_KINDS:
+                trades.add(alert.symbol)
+        return depth, trades
+
+    def evaluate(self, symbol: str, price: float, now: float) -> list[tuple[ConditionAlert, float]]:
+        """
+        Проверяет все условия символа одним векторным проходом.
+        :return: [(alert, value)], value - процент изменения, отклонение от MA в % или кратность объёма.
+        """
+        book = self._symbols.get(symbol)
+        if book is None:
+            return []
+
+        count = len(book)
+        score = np.full(count, np.nan)  # условие выполнено при score >= 0
+        value = np.full(count, np.nan)
+
+        mask = book.kind == PCT_CHANGE
+        if mask.any():
+            pct = self._by_window(book.window[mask], lambda w: self._pct_change(symbol, price, now, w))
+            score[mask] = self._directed(pct, book.direction[mask]) - book.threshold[mask]
+            value[mask] = pct
+
+        mask = book.kind == MA_CROSS
+        if mask.any():
+            deviation = self._by_window(book.window[mask], lambda w: self._ma_deviation(symbol, price, w))
+            score[mask] = deviation * book.direction[mask] - book.threshold[mask]
+            value[mask] = deviation
+
+        mask = book.kind == VOLUME_SPIKE
+        if mask.any():
+            ratio = self._by_window(book.window[mask], lambda w: self._volume_ratio(symbol, w))
+            score[mask] = ratio - book.threshold[mask]
+            value[mask] = ratio
+
+        # Условия по стакану и сделкам здесь остаются NaN - их проверяют evaluate_book и evaluate_trade
+        return self._fire(book, score, value, now)
+
+    def evaluate_trade(self, symbol: str, price: float, quantity: float, buyer_maker: bool,
+                       now: float) -> list[tuple[ConditionAlert, float]]:
+        """
+        Проверяет условия trade_size на одной агрегированной сделке.
+        :return: [(alert, value)], value - объём сделки в USDT со знаком (минус - продажа по рынку).
+        """
+        book = self._symbols.get(symbol)
+        if book is None:
+            return []
+        mask = book.kind == TRADE_SIZE
+        if not mask.any():
+            return []
+        # buyer_maker: покупатель стоял в стакане, значит по рынку продавали
+        notional = price * quantity * (-1 if buyer_maker else 1)
+        score = np.full(len(book), np.nan)
+        value = np.full(len(book), np.nan)
+        score[mask] = self._directed(np.full(mask.sum(), notional), book.direction[mask]) - book.threshold[mask]
+        value[mask] = notional
+        return self._fire(book, score, value, now)
+
+    def evaluate_book(self, symbol: str, order_book, now: float) -> list[tuple[ConditionAlert, float]]:
+        """
+        Проверяет условия по стакану (order_book.OrderBook) после очередного обновления.
+        :return: [(alert, value)], value - спред в % или перекос стакана от -1 до 1.
+        """
+        book = self._symbols.get(symbol)
+        if book is None:
+            return []
+        spread_mask = book.kind == SPREAD
+        imbalance_mask = book.kind == DEPTH_IMBALANCE
+        if not (spread_mask.any() or imbalance_mask.any()):
+            return []
+        score = np.full(len(book), np.nan)
+        value = np.full(len(book), np.nan)
+
+        if spread_mask.any():
+            spread = order_book.spread_percent()
+            score[spread_mask] = spread - book.threshold[spread_mask]
+            value[spread_mask] = spread
+
+        if imbalance_mask.any():
+            imbalance = self._by_window(book.window[imbalance_mask], lambda w: order_book.imbalance(int(w)))
+            score[imbalance_mask] = (self._directed(imbalance, book.direction[imbalance_mask])
+                                     - book.threshold[imbalance_mask])
+            value[imbalance_mask] = imbalance
+        return self._fire(book, score, value, now)
+
+    def _fire(self, book: _SymbolConditions, score: np.ndarray, value: np.ndarray,
+              now: float) -> list[tuple[ConditionAlert, float]]:
+        """Общая логика срабатывания: условие выполнено при score >= 0, NaN - нет данных."""
+        valid = ~np.isnan(score)
+        # Пересечение MA засчитывается только как переход: новое условие, уже выполненное, не взводится
+        fresh = book.fresh & valid
+        fresh_ma = fresh & (book.kind == MA_CROSS)
+        book.armed[fresh_ma] = score[fresh_ma] < 0
+        book.fresh[fresh] = False
+
+        # Гистерезис: повторный взвод только после отката за порог с запасом
+        book.armed |= valid & (score < -book.rearm)
+        # Для MA нужен строгий переход через среднюю: цена, лишь сравнявшаяся с MA, не считается
+        met = np.where(book.kind == MA_CROSS, score > 0, score >= 0)
+        fire = valid & met & book.armed & (now - book.last_fired >= book.cooldown)
+        indexes = np.flatnonzero(fire)
+        if not len(indexes):
+            return []
+        book.armed[indexes] = False
+        book.last_fired[indexes] = now
+        return [(self._alerts[int(book.ids[i])], float(value[i])) for i in indexes]
+
+    @staticmethod
+    def _directed(values: np.ndarray, direction: np.ndarray) -> np.ndarray:
+        """Значение в сторону алерта: up - как есть, down - с обратным знаком, any - по модулю."""
+        return np.where(direction > 0, values, np.where(direction < 0, -values, np.abs(values)))
+
+    @staticmethod
+    def _by_window(windows: np.ndarray, metric) -> np.ndarray:
+        """Считает метрику один раз на уникальное окно и раскладывает по алертам."""
+        unique, inverse = np.unique(windows, return_inverse=True)
+        return np.array([metric(float(w)) for w in unique], dtype=np.float64)[inverse]
+
+    def _pct_change(self, symbol: str, price: float, now: float, window: float) -> float:
+        if window <= SECOND_CANDLES_MAX_WINDOW:
+            interval = '1s'
+        elif window <= MINUTE_CANDLES_MAX_WINDOW:
+            interval = '1m'
+        else:
+            interval = '5m'
+        ring = self._candles.get(symbol, interval)
+        reference = ring.price_at(now - window) if ring else None
+        if not reference:
+            return np.nan  # истории на всё окно ещё нет
+        return (price - reference) / reference * 100
+
+    def _ma_deviation(self, symbol: str, price: float, window: float) -> float:
+        period = int(window // 60)
+        ring = self._candles.get(symbol, '1m')
+        closes = ring.closes(period) if ring else []
+        if len(closes) < period:
+            return np.nan
+        moving_average = float(np.mean(closes))
+        return (price - moving_average) / moving_average * 100
+
+    def _volume_ratio(self, symbol: str, window: float) -> float:
+        period = int(window // 60)
+        ring = self._candles.get(symbol, '1m')
+        volumes = ring.volumes(period + 1) if ring else []
+        if len(volumes) < period + 1:
+            return np.nan
+        average = float(np.mean(volumes[:-1]))
+        return volumes[-1] / average if average > 0 else np.nan
@@ -10,16 +10,100 @@ load_dotenv()
 HOST = os.getenv('HOST', '0.0.0.0')
 PORT = int(os.getenv('PORT', 5001))
 
+# Режим процесса: 'all' - всё в одном процессе; 'ingest' - единственное соединение с Binance,
+# алерты, SQLite и Telegram; 'worker' - клиенты Socket.IO (можно запустить несколько на одном PORT)
+APP_ROLE = os.getenv('APP_ROLE', 'all')
+# Unix-сокет, через который ingest раздаёт тики воркерам
+FEED_SOCKET_PATH = os.getenv('FEED_SOCKET_PATH', '/tmp/crypton-feed.sock')
+# HTTP-порт процесса ingest (/api/stats), чтобы не конфликтовать с воркерами на PORT
+INGEST_PORT = int(os.getenv('INGEST_PORT', PORT + 1))
+
+# Логирование: уровень, формат ('text' - key=value, 'json') и ограничение частоты -
+# не больше LOG_RATE_LIMIT_BURST одинаковых записей за LOG_RATE_LIMIT_PERIOD_SECONDS
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_RATE_LIMIT_BURST = int(os.getenv('LOG_RATE_LIMIT_BURST', 10))
+LOG_RATE_LIMIT_PERIOD_SECONDS = float(os.getenv('LOG_RATE_LIMIT_PERIOD_SECONDS', 60))
+
 # Настройки Telegram
 # Здесь мы не задаем значения по умолчанию, т.к. без них бот бессмысленен
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+# Общий чат для алертов, созданных в браузере. У пользователей бота свои чаты, списки и алерты
+# (/watch, /alert, /list, /remove), для них этот параметр не нужен
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
+# Лимиты доставки в Telegram: общий (сообщений в секунду) и на один чат
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 25))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', 1))
+# Сообщения в один чат в пределах этого окна (сек) склеиваются в одно
+TELEGRAM_COALESCE_WINDOW_SECONDS = float(os.getenv('TELEGRAM_COALESCE_WINDOW_SECONDS', 1.0))
+TELEGRAM_QUEUE_SIZE = int(os.getenv('TELEGRAM_QUEUE_SIZE', 5000))
+
 # Настройки CORS
 # Для продакшена НИКОГДА не используйте '*'.
 # Переменная должна содержать URL вашего фронтенда, например: 'https://your-app-domain.com'
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', '*')
 
+# Локальное хранилище алертов и списков символов (SQLite)
+DB_PATH = os.getenv('DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crypto_alerts.db'))
+# Как часто (в секундах) накопленные изменения сбрасываются на диск
+DB_FLUSH_INTERVAL_SECONDS = float(os.getenv('DB_FLUSH_INTERVAL_SECONDS', 1.0))
+
+# Интервал пакетной рассылки обновлений цен клиентам (мс). Тики внутри интервала схлопываются
+PRICE_FLUSH_INTERVAL_MS = int(os.getenv('PRICE_FLUSH_INTERVAL_MS', 200))
+
+# Сколько последних пакетов price_updates помнит сервер, чтобы переподключившийся клиент
+# получил только пропущенные изменения (при 200 мс - около минуты)
+PRICE_DELTA_HISTORY = int(os.getenv('PRICE_DELTA_HISTORY', 300))
+
+# Медленные клиенты: если в очереди отправки клиента больше CLIENT_BACKLOG_HIGH пакетов, price_updates
+# ему копятся (последняя цена на символ, не больше CLIENT_MAX_PENDING_SYMBOLS символов) и уходят одним
+# сообщением, когда очередь опустится до CLIENT_BACKLOG_LOW. Клиент отключается, если очередь длиннее
+# CLIENT_BACKLOG_MAX или он медленный дольше CLIENT_SLOW_TIMEOUT_SECONDS
+CLIENT_BACKLOG_HIGH = int(os.getenv('CLIENT_BACKLOG_HIGH', 32))
+CLIENT_BACKLOG_LOW = int(os.getenv('CLIENT_BACKLOG_LOW', 4))
+CLIENT_BACKLOG_MAX = int(os.getenv('CLIENT_BACKLOG_MAX', 500))
+CLIENT_SLOW_TIMEOUT_SECONDS = float(os.getenv('CLIENT_SLOW_TIMEOUT_SECONDS', 30))
+CLIENT_MAX_PENDING_SYMBOLS = int(os.getenv('CLIENT_MAX_PENDING_SYMBOLS', 500))
+
+# Адреса Binance. Переопределяются для бенчмарка (bench/fake_binance.py) или тестовой сети
+BINANCE_WS_BASE_URL = os.getenv('BINANCE_WS_BASE_URL', 'wss://stream.binance.com:9443/stream')
+BINANCE_API_BASE_URL = os.getenv('BINANCE_API_BASE_URL', 'https://api.binance.com')
+BINANCE_WEB_BASE_URL = os.getenv('BINANCE_WEB_BASE_URL', 'https://www.binance.com')
+
+# Локальный кэш метаданных рынка (торгуемые пары, названия активов): сервер стартует без
+# ожидания exchangeInfo, а обновление идёт в фоне условными запросами раз в MARKET_REFRESH_INTERVAL_SECONDS
+MARKET_CACHE_PATH = os.getenv(
+    'MARKET_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'market_cache.json.gz')
+)
+MARKET_REFRESH_INTERVAL_SECONDS = float(os.getenv('MARKET_REFRESH_INTERVAL_SECONDS', 3600))
+
+# Тип стримов Binance: 'ticker' (полный), 'miniTicker' (облегчённый)
+# или 'allMiniTickers' (один стрим !miniTicker@arr на все пары - удобно, когда отслеживается весь рынок)
+BINANCE_STREAM_TYPE = os.getenv('BINANCE_STREAM_TYPE', 'ticker')
+
+# Переподключение к Binance: экспоненциальная задержка от BINANCE_RECONNECT_MIN_SECONDS до
+# BINANCE_RECONNECT_MAX_SECONDS со случайным разбросом. Соединение тикеров, молчащее дольше
+# BINANCE_IDLE_TIMEOUT_SECONDS, считается зависшим и переоткрывается (0 - не проверять)
+BINANCE_RECONNECT_MIN_SECONDS = float(os.getenv('BINANCE_RECONNECT_MIN_SECONDS', 1))
+BINANCE_RECONNECT_MAX_SECONDS = float(os.getenv('BINANCE_RECONNECT_MAX_SECONDS', 60))
+BINANCE_IDLE_TIMEOUT_SECONDS = float(os.getenv('BINANCE_IDLE_TIMEOUT_SECONDS', 60))
+# Binance закрывает соединение через 24 часа. За это время до разрыва открывается резервное
+# соединение с теми же стримами и принимает поток без пропуска (0 - не переключать заранее)
+BINANCE_CONNECTION_MAX_AGE_SECONDS = float(os.getenv('BINANCE_CONNECTION_MAX_AGE_SECONDS', 23.5 * 3600))
+# После обрыва цены за пропущенный интервал догружаются по REST (ticker/price и минутные klines)
+# и проверяются по ценовым алертам; klines запрашиваются не больше чем для стольких символов
+BINANCE_BACKFILL_MAX_SYMBOLS = int(os.getenv('BINANCE_BACKFILL_MAX_SYMBOLS', 100))
+
+# Стаканы (@depth@100ms) и сделки (@aggTrade) подписываются только для символов с алертами
+# по спреду, перекосу стакана или крупным сделкам. Сколько символов со стаканом держать не больше
+# (0 - отключить) и сколько уровней брать в снимке /api/v3/depth
+BINANCE_MAX_DEPTH_SYMBOLS = int(os.getenv('BINANCE_MAX_DEPTH_SYMBOLS', 50))
+BINANCE_DEPTH_SNAPSHOT_LIMIT = int(os.getenv('BINANCE_DEPTH_SNAPSHOT_LIMIT', 100))
+
+# Пауза (в секундах) между повторными срабатываниями одного условного алерта
+ALERT_COOLDOWN_SECONDS = float(os.getenv('ALERT_COOLDOWN_SECONDS', 300))
+
 # Стартовый список символов (можно тоже вынести в .env, если нужно)
 # INITIAL_SYMBOLS_STR = os.getenv('INITIAL_SYMBOLS', 'BTC,ETH,ADA,LINK,LTC,SOL,XRP,DOT,DOGE,TON,TRUMP')
 # INITIAL_SYMBOLS = [symbol.strip() for symbol in INITIAL_SYMBOLS_STR.split(',')]
\ No newline at end of file
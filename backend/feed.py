@@ -0,0 +1,285 @@
+"""
+Локальная шина между процессом ingest и процессами worker (режим горизонтального масштабирования).
+
+ingest держит единственное соединение с Binance и раздаёт сырые кадры тикеров воркерам
+через Unix-сокет; воркеры обслуживают клиентов Socket.IO. По той же шине ходят:
+- наборы символов воркеров (ingest подписывается на их объединение),
+- сообщения pub/sub менеджера Socket.IO (emit из любого процесса доходит до клиента на любом воркере),
+- вызовы воркер -> ingest для операций с общим состоянием (алерты, SQLite, Telegram).
+
+Кадр: 4 байта длины + 1 байт типа + полезная нагрузка.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import struct
+
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+FRAME_HEADER = struct.Struct('>IB')
+FRAME_TICKS, FRAME_SYMBOLS, FRAME_PUBSUB, FRAME_CALL, FRAME_REPLY = b'TSPCR'
+# Если воркер не успевает читать, тики для него отбрасываются (они всё равно устаревают),
+# служебные кадры - никогда
+MAX_WORKER_BUFFER_BYTES = 4 * 1024 * 1024
+PUBSUB_QUEUE_SIZE = 10000
+RECONNECT_DELAY_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def _frame(kind: int, payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(len(payload), kind) + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> tuple[int, bytes]:
+    length, kind = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    return kind, await reader.readexactly(length)
+
+
+class _PubSubQueue:
+    """Входящие сообщения pub/sub для FeedPubSubManager; при переполнении старые отбрасываются."""
+
+    def __init__(self):
+        self._queue = asyncio.Queue(maxsize=PUBSUB_QUEUE_SIZE)
+        self.dropped = 0
+
+    def put(self, message: dict):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(message)
+
+    async def listen(self):
+        while True:
+            yield await self._queue.get()
+
+
+class FeedHub:
+    """Сторона ingest: Unix-сервер, к которому подключаются воркеры."""
+
+    def __init__(self, path: str, on_worker_symbols, call_handler):
+        """
+        :param on_worker_symbols: on_worker_symbols(worker_id, symbols) - воркер сменил набор символов
+                                  (пустой набор - воркер отключился).
+        :param call_handler: async call_handler(name, client_id, data) -> результат вызова воркера.
+        """
+        self._path = path
+        self._on_worker_symbols = on_worker_symbols
+        self._call_handler = call_handler
+        self._workers: dict[int, asyncio.StreamWriter] = {}
+        self._ids = itertools.count(1)
+        self._symbols_frame = _frame(FRAME_SYMBOLS, b'[]')
+        self._server = None
+        self._call_tasks: set[asyncio.Task] = set()
+        self.ticks_dropped = 0
+
+    async def start(self):
+        if os.path.exists(self._path):
+            os.unlink(self._path)  # сокет, оставшийся от прошлого запуска
+        self._server = await asyncio.start_unix_server(self._handle_worker, path=self._path)
+        logger.info("Feed hub is listening on %s", self._path)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._workers.values()):
+            writer.close()
+
+    def broadcast_ticks(self, raw):
+        """Рассылает сырой кадр Binance всем воркерам. Не блокирует."""
+        if not self._workers:
+            return
+        frame = _frame(FRAME_TICKS, raw.encode() if isinstance(raw, str) else raw)
+        for writer in self._workers.values():
+            if writer.transport.get_write_buffer_size() > MAX_WORKER_BUFFER_BYTES:
+                self.ticks_dropped += 1
+                continue
+            writer.write(frame)
+
+    def broadcast_symbols(self, symbols):
+        """Объединённый набор символов: по нему воркеры фильтруют тики и ведут свечи."""
+        frame = _frame(FRAME_SYMBOLS, json.dumps(sorted(symbols)).encode())
+        if frame == self._symbols_frame:
+            return
+        self._symbols_frame = frame
+        for writer in self._workers.values():
+            writer.write(frame)
+
+    async def publish(self, message: dict):
+        """emit из процесса ingest (у него нет своих клиентов, поэтому менеджер только пишет)."""
+        self._relay(_frame(FRAME_PUBSUB, json.dumps(message).encode()))
+
+    def _relay(self, frame: bytes, skip_worker: int | None = None):
+        for worker_id, writer in self._workers.items():
+            if worker_id != skip_worker:
+                writer.write(frame)
+
+    async def _handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker_id = next(self._ids)
+        self._workers[worker_id] = writer
+        writer.write(self._symbols_frame)
+        logger.info("Feed worker connected", extra={'worker': worker_id, 'workers': len(self._workers)})
+        try:
+            while True:
+                kind, payload = await _read_frame(reader)
+                if kind == FRAME_SYMBOLS:
+                    self._on_worker_symbols(worker_id, set(json.loads(payload)))
+                elif kind == FRAME_PUBSUB:
+                    # Пересылаем остальным воркерам как есть, без разбора
+                    self._relay(_frame(FRAME_PUBSUB, payload), skip_worker=worker_id)
+                elif kind == FRAME_CALL:
+                    task = asyncio.create_task(self._answer_call(writer, json.loads(payload)))
+                    self._call_tasks.add(task)
+                    task.add_done_callback(self._call_tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # CancelledError - остановка ingest; задача соединения на этом просто завершается
+            pass
+        finally:
+            del self._workers[worker_id]
+            self._on_worker_symbols(worker_id, set())
+            writer.close()
+            logger.info("Feed worker disconnected", extra={'worker': worker_id, 'workers': len(self._workers)})
+
+    async def _answer_call(self, writer: asyncio.StreamWriter, call: dict):
+        try:
+            result = await self._call_handler(call['name'], call['client_id'], call.get('data'))
+        except Exception as e:
+            logger.exception("Feed call %s failed: %s", call.get('name'), e)
+            result = None
+        if not writer.is_closing():
+            writer.write(_frame(FRAME_REPLY, json.dumps({'id': call['id'], 'result': result}).encode()))
+
+    def stats(self) -> dict:
+        return {
+            'role': 'ingest', 'workers': len(self._workers),
+            'ticks_dropped': self.ticks_dropped,
+        }
+
+
+class FeedClient:
+    """Сторона воркера: подключение к FeedHub с автоматическим переподключением."""
+
+    def __init__(self, path: str, on_symbols=None, on_connect=None, call_timeout: float = 10.0):
+        """
+        :param on_symbols: Вызывается, когда ingest прислал новый объединённый набор символов.
+        :param on_connect: Вызывается после каждого (пере)подключения к ingest.
+        """
+        self._path = path
+        self._on_symbols = on_symbols
+        self._on_connect = on_connect
+        self._call_timeout = call_timeout
+        self._writer: asyncio.StreamWriter | None = None
+        self._local_symbols: frozenset = frozenset()
+        self._union: set = set()
+        self._calls: dict[int, asyncio.Future] = {}
+        self._call_ids = itertools.count(1)
+        self._pubsub = _PubSubQueue()
+        self.ticks_received = 0
+        self.reconnects = 0
+
+    def symbols(self) -> set:
+        return self._union
+
+    def set_symbols(self, symbols):
+        """Набор символов клиентов этого воркера; ingest получает только изменения."""
+        symbols = frozenset(symbols)
+        if symbols == self._local_symbols:
+            return
+        self._local_symbols = symbols
+        self._send(FRAME_SYMBOLS, json.dumps(sorted(symbols)).encode())
+
+    async def call(self, name: str, client_id: str, data=None):
+        """Выполняет операцию с общим состоянием в процессе ingest. None - ingest недоступен."""
+        if self._writer is None:
+            return None
+        call_id = next(self._call_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._calls[call_id] = future
+        self._send(FRAME_CALL, json.dumps({'id': call_id, 'name': name, 'client_id': client_id, 'data': data}).encode())
+        try:
+            return await asyncio.wait_for(future, self._call_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Feed call %s timed out", name)
+            return None
+        finally:
+            self._calls.pop(call_id, None)
+
+    async def publish(self, message: dict):
+        self._send(FRAME_PUBSUB, json.dumps(message).encode())
+
+    def listen(self):
+        return self._pubsub.listen()
+
+    def _send(self, kind: int, payload: bytes):
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(_frame(kind, payload))
+
+    async def run(self, on_ticks):
+        """
+        Бесконечный цикл чтения шины.
+        :param on_ticks: async on_ticks(raw) - обработчик сырого кадра Binance.
+        """
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self._path)
+                logger.info("Connected to feed hub at %s", self._path)
+                if self._local_symbols:
+                    self._send(FRAME_SYMBOLS, json.dumps(sorted(self._local_symbols)).encode())
+                if self._on_connect is not None:
+                    self._on_connect()
+                while True:
+                    kind, payload = await _read_frame(reader)
+                    if kind == FRAME_TICKS:
+                        self.ticks_received += 1
+                        await on_ticks(payload)
+                    elif kind == FRAME_SYMBOLS:
+                        self._union = set(json.loads(payload))
+                        if self._on_symbols is not None:
+                            self._on_symbols()
+                    elif kind == FRAME_PUBSUB:
+                        self._pubsub.put(json.loads(payload))
+                    elif kind == FRAME_REPLY:
+                        reply = json.loads(payload)
+                        future = self._calls.get(reply['id'])
+                        if future is not None and not future.done():
+                            future.set_result(reply['result'])
+            except asyncio.CancelledError:
+                if self._writer is not None:
+                    self._writer.close()
+                raise
+            except (OSError, asyncio.IncompleteReadError) as e:
+                logger.warning("Feed hub connection lost: %s. Reconnecting in %ss", e, RECONNECT_DELAY_SECONDS)
+            self._writer = None
+            self.reconnects += 1
+            for future in self._calls.values():
+                if not future.done():
+                    future.set_result(None)
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    def stats(self) -> dict:
+        return {
+            'role': 'worker', 'connected': self._writer is not None, 'symbols': len(self._union),
+            'ticks_received': self.ticks_received, 'reconnects': self.reconnects,
+            'pubsub_dropped': self._pubsub.dropped,
+        }
+
+
+class FeedPubSubManager(AsyncPubSubManager):
+    """
+    Менеджер клиентов Socket.IO поверх шины FeedHub/FeedClient - замена Redis для
+    нескольких процессов на одной машине: emit в комнату доходит до клиентов всех воркеров.
+    """
+    name = 'feed'
+
+    def __init__(self, bus, write_only: bool = False):
+        super().__init__(channel='feed', write_only=write_only)
+        self._bus = bus
+
+    async def _publish(self, data):
+        await self._bus.publish(data)
+
+    async def _listen(self):
+        async for message in self._bus.listen():
+            yield message
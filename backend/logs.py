@@ -0,0 +1,85 @@
+"""
+Структурированное логирование с ограничением частоты.
+
+Каждая запись - одна строка: пары key=value (LOG_FORMAT=text) или JSON-объект (LOG_FORMAT=json).
+Поля, переданные через extra={...}, выводятся отдельными ключами.
+
+Одинаковые записи (логгер + шаблон сообщения) сверх burst за period секунд подавляются,
+число подавленных добавляется полем suppressed к первой записи следующего окна. Поэтому
+сообщения пишутся с %-аргументами, а не f-строками: шаблон и есть ключ ограничения.
+"""
+import json
+import logging
+import time
+
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+# Защита от неограниченного роста, если шаблоны всё-таки собираются динамически
+MAX_RATE_LIMIT_KEYS = 10000
+
+
+def _text_value(value) -> str:
+    value = str(value)
+    if not value or any(c in value for c in ' ="\n'):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class RateLimitFilter(logging.Filter):
+    """Пропускает не больше burst записей одного шаблона за period секунд."""
+
+    def __init__(self, burst: int = 10, period: float = 60.0):
+        super().__init__()
+        self._burst = burst
+        self._period = period
+        self._windows: dict[tuple, list] = {}  # ключ -> [начало окна, записано, подавлено]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, record.msg if isinstance(record.msg, str) else type(record.msg))
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self._period:
+            if len(self._windows) >= MAX_RATE_LIMIT_KEYS:
+                self._windows.clear()
+            if window is not None and window[2]:
+                record.suppressed = window[2]
+            self._windows[key] = [now, 1, 0]
+            return True
+        if window[1] < self._burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, json_output: bool = False):
+        super().__init__()
+        self._json = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            'ts': f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                fields[key] = value
+        if record.exc_info:
+            fields['exc'] = self.formatException(record.exc_info)
+        if self._json:
+            return json.dumps(fields, ensure_ascii=False, default=str)
+        return ' '.join(f"{key}={_text_value(value)}" for key, value in fields.items())
+
+
+def setup_logging(level: str = 'INFO', log_format: str = 'text', burst: int = 10, period: float = 60.0):
+    """Настраивает корневой логгер: один обработчик stderr с форматом и ограничением частоты."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_output=log_format == 'json'))
+    handler.addFilter(RateLimitFilter(burst, period))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    logging.getLogger('aiohttp.access').setLevel(logging.WARNING)
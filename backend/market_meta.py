@@ -0,0 +1,227 @@
+"""
+Метаданные рынка Binance (торгуемые USDT-пары и названия активов) с локальным кэшем.
+
+При старте метаданные читаются из компактного файла (JSON в gzip), поэтому сервер не ждёт
+многомегабайтный exchangeInfo. Обновление идёт в фоне условными запросами: ETag/Last-Modified,
+а если сервер их не поддерживает - сравнением хэша тела, так что неизменившийся ответ не разбирается.
+Наборы обновляются на месте, вызывающий получает разницу (листинги и делистинги).
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+import metrics
+from binance_rest import EXCHANGE_INFO_URL, ASSETS_URL, fetch, loads, used_weight
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = metrics.Histogram(
+    'binance_data_refresh_seconds', 'Time to refresh exchange info and asset names',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+REFRESH_ERRORS = metrics.Counter('binance_data_refresh_errors_total', 'Failed parts of the Binance data refresh', ('part',))
+NOT_MODIFIED = metrics.Counter('binance_data_not_modified_total', 'Metadata responses skipped as unchanged', ('part',))
+
+CACHE_VERSION = 1
+# Только торгуемые пары и без наборов разрешений - ответ в разы меньше полного
+EXCHANGE_INFO_PARAMS = {'symbolStatus': 'TRADING', 'showPermissionSets': 'false'}
+# exchangeInfo весит 20 из 6000 в минуту; если вес уже почти выбран другими запросами, откладываем
+MAX_USED_WEIGHT_FOR_REFRESH = 4000
+# Если из ответа пропала больше чем половина пар, это скорее сбой ответа, чем делистинг
+MAX_DELISTED_SHARE = 0.5
+
+
+@dataclass
+class MarketChange:
+    listed: set = field(default_factory=set)
+    delisted: set = field(default_factory=set)
+    names_changed: bool = False
+    symbols_rejected: bool = False  # новый набор пар отброшен как сбой ответа (см. MAX_DELISTED_SHARE)
+
+    def __bool__(self):
+        return bool(self.listed or self.delisted or self.names_changed)
+
+
+class MarketMetadata:
+    def __init__(self, cache_path: str):
+        self._path = cache_path
+        self.symbols: set[str] = set()    # базовые активы торгуемых USDT-пар
+        self.names: dict[str, str] = {}   # {'BTC': 'Bitcoin', ...}
+        self.updated_at = 0.0             # время последней успешной проверки (unix)
+        self._validators: dict[str, dict] = {}  # url -> {'etag', 'last_modified', 'digest'}
+        self._cache_mtime = None
+        self.refreshes = 0
+
+    # --- Кэш-файл ---
+    def load(self) -> MarketChange | None:
+        """Читает кэш-файл. None - файла нет или он непригоден."""
+        try:
+            mtime = os.stat(self._path).st_mtime
+            with gzip.open(self._path, 'rb') as f:
+                data = loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Недописанный или битый файл (обрыв gzip - EOFError) - как будто кэша нет
+            logger.warning("Could not read market cache %s: %s", self._path, e)
+            return None
+        if not isinstance(data, dict) or data.get('version') != CACHE_VERSION:
+            return None
+        self._cache_mtime = mtime
+        self._validators = data.get('validators', {})
+        self.updated_at = data.get('updated_at', 0.0)
+        change = self._apply(set(data.get('symbols', ())), data.get('names', {}))
+        logger.info("Loaded market metadata from cache", extra={'symbols': len(self.symbols), 'names': len(self.names)})
+        return change
+
+    def reload_if_changed(self) -> MarketChange | None:
+        """Для процессов, которые сами не ходят в Binance (worker): перечитывает кэш, если его обновили."""
+        try:
+            mtime = os.stat(self._path).st_mtime
+        except OSError:
+            return None
+        if mtime == self._cache_mtime:
+            return None
+        return self.load()
+
+    def update(self, symbols, names: dict) -> MarketChange:
+        """Применяет наборы, полученные не из Binance (воркер получает их от ingest)."""
+        return self._apply(set(symbols), names)
+
+    def _write(self, data: dict):
+        # Свой временный файл в том же каталоге: процессы не пишут в один файл, а os.replace атомарен
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self._path) + '.', suffix='.tmp',
+                                        dir=os.path.dirname(self._path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as f:
+                f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode())
+            os.chmod(tmp_path, 0o644)  # mkstemp создаёт файл 0600, а кэш читают и другие процессы
+            os.replace(tmp_path, self._path)  # читатели никогда не видят недописанный файл
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._cache_mtime = os.stat(self._path).st_mtime
+
+    async def save(self):
+        # Снимок берём в event loop, сжатие и запись - в потоке
+        data = {
+            'version': CACHE_VERSION, 'updated_at': self.updated_at, 'validators': self._validators,
+            'symbols': sorted(self.symbols), 'names': dict(self.names),
+        }
+        try:
+            await asyncio.to_thread(self._write, data)
+        except OSError as e:
+            logger.warning("Could not write market cache %s: %s", self._path, e)
+
+    # --- Обновление из Binance ---
+    async def refresh(self, session) -> MarketChange:
+        """Условно перезапрашивает exchangeInfo и названия; при ошибке часть остаётся прежней."""
+        started = time.perf_counter()
+        symbols_result, names_result = await asyncio.gather(
+            self._fetch_symbols(session), self._fetch_names(session), return_exceptions=True
+        )
+        # Валидаторы (ETag, хэш) запоминаются только для ответов, которые проверены без ошибок
+        # и применены: отброшенный ответ при следующей проверке разбирается заново
+        checked = {}
+        symbols = names = symbols_validators = None
+        if isinstance(symbols_result, BaseException):
+            REFRESH_ERRORS.labels('exchange_info').inc()
+            logger.error("Could not fetch exchange info from Binance: %s", symbols_result)
+        else:
+            symbols, symbols_validators = symbols_result
+        if isinstance(names_result, BaseException):
+            REFRESH_ERRORS.labels('asset_names').inc()
+            logger.error("Could not fetch asset names: %s", names_result)
+        else:
+            names, checked[ASSETS_URL] = names_result
+
+        change = self._apply(symbols, names)
+        if symbols_validators is not None and not change.symbols_rejected:
+            checked[EXCHANGE_INFO_URL] = symbols_validators
+        if checked:
+            # Успешная проверка, даже без изменений (304 или тот же хэш): следующий срок отсчитывается от неё
+            self._validators.update(checked)
+            self.updated_at = time.time()
+            self.refreshes += 1
+            await self.save()
+        REFRESH_SECONDS.observe(time.perf_counter() - started)
+        return change
+
+    async def _fetch_if_changed(self, session, url: str, part: str, params: dict | None = None) -> tuple:
+        """(разобранный ответ или None, если с прошлой проверки он не изменился; валидаторы ответа)."""
+        known = self._validators.get(url, {})
+        headers = {}
+        if known.get('etag'):
+            headers['If-None-Match'] = known['etag']
+        if known.get('last_modified'):
+            headers['If-Modified-Since'] = known['last_modified']
+        response = await fetch(session, url, params, headers=headers, timeout=30)
+        validators = {
+            'etag': response.headers.get('ETag') or known.get('etag'),
+            'last_modified': response.headers.get('Last-Modified') or known.get('last_modified'),
+            'digest': known.get('digest'),
+        }
+        if response.status == 304:
+            NOT_MODIFIED.labels(part).inc()
+            return None, validators
+        validators['digest'] = hashlib.blake2b(response.body, digest_size=16).hexdigest()
+        if validators['digest'] == known.get('digest'):
+            NOT_MODIFIED.labels(part).inc()
+            return None, validators
+        return loads(response.body), validators
+
+    async def _fetch_symbols(self, session) -> tuple:
+        if used_weight() > MAX_USED_WEIGHT_FOR_REFRESH:
+            logger.warning("Binance request weight is almost exhausted, exchange info refresh postponed",
+                           extra={'used_weight': used_weight()})
+            return None, None
+        info, validators = await self._fetch_if_changed(session, EXCHANGE_INFO_URL, 'exchange_info', EXCHANGE_INFO_PARAMS)
+        if info is None:
+            return None, validators
+        # Только спот к USDT со статусом TRADING (фильтр параметром запроса поддерживают не все зеркала)
+        return {
+            item['baseAsset']
+            for item in info['symbols']
+            if item.get('quoteAsset') == 'USDT' and item.get('status') == 'TRADING'
+        }, validators
+
+    async def _fetch_names(self, session) -> tuple:
+        assets, validators = await self._fetch_if_changed(session, ASSETS_URL, 'asset_names')
+        if assets is None:
+            return None, validators
+        return {asset['assetCode']: asset['assetName'] for asset in assets.get('data', [])}, validators
+
+    def _apply(self, symbols: set | None, names: dict | None) -> MarketChange:
+        """Применяет новые наборы на месте и возвращает разницу. None - часть не менялась."""
+        change = MarketChange()
+        if symbols:
+            delisted = self.symbols - symbols
+            if self.symbols and len(delisted) > len(self.symbols) * MAX_DELISTED_SHARE:
+                logger.warning("Ignoring exchange info that drops %d of %d pairs", len(delisted), len(self.symbols))
+                change.symbols_rejected = True
+            else:
+                change.listed = symbols - self.symbols
+                change.delisted = delisted
+                self.symbols -= change.delisted
+                self.symbols |= change.listed
+        if names and names != self.names:
+            for code in self.names.keys() - names.keys():
+                del self.names[code]
+            self.names.update(names)
+            change.names_changed = True
+        return change
+
+    def stats(self) -> dict:
+        return {
+            'symbols': len(self.symbols),
+            'names': len(self.names),
+            'updated_at': self.updated_at,
+            'refreshes': self.refreshes,
+            'used_weight': used_weight(),
+        }
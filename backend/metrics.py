@@ -0,0 +1,189 @@
+"""
+Минимальные метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Рассчитаны на горячий путь одного event loop: без блокировок, наблюдение в гистограмму -
+бинарный поиск по границам корзин. Значения, которые и так хранятся в объектах
+(глубины очередей, счётчики статистики), не дублируются - их читает set_function при опросе.
+"""
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+
+# Границы корзин по умолчанию (секунды): от 10 мкс до 10 с
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_REGISTRY: list['_Metric'] = []
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label_value(value: str) -> str:
+    # Текстовый формат Prometheus: в значении метки экранируются обратная косая черта, кавычка и перевод строки
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{n}="{_escape_label_value(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric(ABC):
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        self._function = None
+        _REGISTRY.append(self)
+
+    def labels(self, *values):
+        """Дочерняя метрика для набора значений меток (кэшируется - берите её один раз вне цикла)."""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def set_function(self, function):
+        """Значение вычисляется при каждом опросе /metrics."""
+        self._function = function
+
+    @abstractmethod
+    def _new_child(self):
+        """Объект значения для одного набора меток."""
+
+    def _samples(self):
+        if self._function is not None:
+            yield self.name, '', self._function()
+            return
+        for values, child in self._children.items():
+            yield from child.samples(self.name, _format_labels(self.labelnames, values))
+
+    def render(self) -> list[str]:
+        # В HELP экранируются только обратная косая черта и перевод строки
+        documentation = self.documentation.replace('\\', '\\\\').replace('\n', '\\n')
+        lines = [f'# HELP {self.name} {documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(f'{name}{labels} {_format_value(value)}' for name, labels, value in self._samples())
+        return lines
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self, name: str, labels: str):
+        yield name, labels, self.value
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._default = None if labelnames else self.labels()
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default.value += amount
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    @property
+    def value(self) -> float:
+        return self._default.value
+
+    def dec(self, amount: float = 1):
+        self._default.value -= amount
+
+    def set(self, value: float):
+        self._default.value = value
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def samples(self, name: str, labels: str):
+        base = labels[1:-1] if labels else ''
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            yield f'{name}_bucket', '{' + (f'{base},{le}' if base else le) + '}', cumulative
+        yield f'{name}_sum', labels, self.sum
+        yield f'{name}_count', labels, cumulative
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self._bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+        self._default = None if labelnames else self.labels()
+
+    def _new_child(self):
+        return _HistogramValue(self._bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+
+LOOP_LAG = Histogram('event_loop_lag_seconds', 'Delay of event loop wakeups beyond the scheduled time')
+LOOP_LAG_LAST = Gauge('event_loop_lag_last_seconds', 'Most recent event loop lag measurement')
+
+
+async def monitor_loop_lag(interval: float = 0.5):
+    """Измеряет, насколько позже запланированного просыпается корутина - мера загрузки event loop."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+
+
+def render() -> str:
+    """Все зарегистрированные метрики в текстовом формате Prometheus (version 0.0.4)."""
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
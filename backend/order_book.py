@@ -0,0 +1,203 @@
+"""
+Локальные стаканы по diff-depth стримам Binance (снимок + изменения).
+
+Синхронизация по правилам Binance ("How to manage a local order book correctly"):
+1. Пока загружается снимок GET /api/v3/depth, события стрима буферизуются.
+2. События с u <= lastUpdateId снимка отбрасываются.
+3. Первое применённое событие должно покрывать lastUpdateId + 1 (U <= lastUpdateId + 1 <= u).
+4. Дальше каждое событие начинается с u предыдущего + 1; иначе это разрыв - стакан
+   выбрасывается и синхронизируется заново.
+"""
+import asyncio
+import logging
+import math
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+GAPS = metrics.Counter('order_book_gaps_total', 'Depth update sequence gaps that forced a resync')
+RESYNCS = metrics.Counter('order_book_resyncs_total', 'Order book snapshot loads')
+
+# Уровни дальше этого от вершины отбрасываются: снимок их всё равно не содержал
+MAX_LEVELS_PER_SIDE = 1000
+# Сколько последних событий держать, пока загружается снимок (при @100ms - почти две минуты)
+MAX_BUFFERED_EVENTS = 1000
+# Пауза перед повторной загрузкой снимка после ошибки
+RESYNC_RETRY_SECONDS = 5.0
+# Пауза перед новым снимком, если полученный старее буферизованных событий
+STALE_SNAPSHOT_RETRY_SECONDS = 1.0
+
+
+class _BookSide:
+    """
+    Одна сторона стакана в двух параллельных array('d'): ключи по возрастанию и объёмы.
+    Ключ - цена для bid и минус цена для ask, поэтому лучшая цена всегда в конце массива
+    и частые изменения у вершины стакана почти ничего не сдвигают.
+    """
+    __slots__ = ('keys', 'quantities', 'sign')
+
+    def __init__(self, sign: int):
+        self.keys = array('d')
+        self.quantities = array('d')
+        self.sign = sign
+
+    def __len__(self):
+        return len(self.keys)
+
+    def update(self, levels):
+        """levels - пары [цена, объём] строками, как их присылает Binance; объём 0 удаляет уровень."""
+        keys, quantities, sign = self.keys, self.quantities, self.sign
+        for price, quantity in levels:
+            key = float(price) * sign
+            quantity = float(quantity)
+            index = bisect_left(keys, key)
+            found = index < len(keys) and keys[index] == key
+            if quantity == 0:
+                if found:
+                    del keys[index]
+                    del quantities[index]
+            elif found:
+                quantities[index] = quantity
+            else:
+                keys.insert(index, key)
+                quantities.insert(index, quantity)
+        excess = len(keys) - MAX_LEVELS_PER_SIDE
+        if excess > 0:
+            del keys[:excess]
+            del quantities[:excess]
+
+    def best(self) -> float | None:
+        return self.keys[-1] * self.sign if self.keys else None
+
+    def volume(self, levels: int) -> float:
+        """Суммарный объём (в базовом активе) лучших levels уровней."""
+        return sum(self.quantities[-levels:])
+
+
+class OrderBook:
+    __slots__ = ('symbol', 'bids', 'asks', 'last_update_id')
+
+    def __init__(self, symbol: str, snapshot: dict):
+        self.symbol = symbol
+        self.bids = _BookSide(1)
+        self.asks = _BookSide(-1)
+        self.bids.update(snapshot.get('bids', ()))
+        self.asks.update(snapshot.get('asks', ()))
+        self.last_update_id = snapshot['lastUpdateId']
+
+    def apply(self, bids, asks, last_update_id: int):
+        self.bids.update(bids)
+        self.asks.update(asks)
+        self.last_update_id = last_update_id
+
+    def mid_price(self) -> float | None:
+        bid, ask = self.bids.best(), self.asks.best()
+        return (bid + ask) / 2 if bid is not None and ask is not None else None
+
+    def spread_percent(self) -> float:
+        """Спред в процентах от средней цены (NaN, если одна из сторон пуста)."""
+        bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return math.nan
+        return (ask - bid) / ((ask + bid) / 2) * 100
+
+    def imbalance(self, levels: int) -> float:
+        """(bid - ask) / (bid + ask) по объёму лучших levels уровней: +1 - только покупатели, -1 - только продавцы."""
+        bid, ask = self.bids.volume(levels), self.asks.volume(levels)
+        total = bid + ask
+        return (bid - ask) / total if total > 0 else math.nan
+
+
+class OrderBookSync:
+    """Стаканы по символам: загрузка снимков, буфер событий на время загрузки, контроль последовательности."""
+
+    def __init__(self, fetch_snapshot):
+        """
+        :param fetch_snapshot: async fetch_snapshot(symbol) -> ответ /api/v3/depth ({'lastUpdateId', 'bids', 'asks'}).
+        """
+        self._fetch_snapshot = fetch_snapshot
+        self._books: dict[str, OrderBook] = {}
+        self._buffers: dict[str, deque] = {}
+        self._retry_at: dict[str, float] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self):
+        return len(self._books)
+
+    def get(self, symbol: str) -> OrderBook | None:
+        return self._books.get(symbol)
+
+    def on_event(self, symbol: str, first_id: int, last_id: int, bids, asks) -> OrderBook | None:
+        """Применяет событие diff-depth. Возвращает стакан, если он синхронизирован и изменился."""
+        buffer = self._buffers.get(symbol)
+        if buffer is not None:
+            buffer.append((first_id, last_id, bids, asks))
+            return None
+        book = self._books.get(symbol)
+        if book is None:
+            if time.monotonic() >= self._retry_at.get(symbol, 0.0):
+                self._resync(symbol, (first_id, last_id, bids, asks))
+            return None
+        if last_id <= book.last_update_id:
+            return None
+        if first_id > book.last_update_id + 1:
+            GAPS.inc()
+            logger.warning("Order book gap, resyncing", extra={
+                'symbol': symbol, 'expected': book.last_update_id + 1, 'got': first_id
+            })
+            del self._books[symbol]
+            self._resync(symbol, (first_id, last_id, bids, asks))
+            return None
+        book.apply(bids, asks, last_id)
+        return book
+
+    def discard(self, symbol: str):
+        """Символ больше не отслеживается: стакан и буфер не нужны."""
+        self._books.pop(symbol, None)
+        self._buffers.pop(symbol, None)
+        self._retry_at.pop(symbol, None)
+
+    def _resync(self, symbol: str, event: tuple):
+        self._buffers[symbol] = deque([event], maxlen=MAX_BUFFERED_EVENTS)
+        task = asyncio.create_task(self._load(symbol))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load(self, symbol: str):
+        while True:
+            RESYNCS.inc()
+            try:
+                snapshot = await self._fetch_snapshot(symbol)
+            except Exception as e:
+                logger.warning("Could not load order book snapshot: %s", e, extra={'symbol': symbol})
+                self._buffers.pop(symbol, None)
+                self._retry_at[symbol] = time.monotonic() + RESYNC_RETRY_SECONDS
+                return
+            buffer = self._buffers.get(symbol)
+            if buffer is None:
+                return  # символ успели убрать, пока грузился снимок
+            book = OrderBook(symbol, snapshot)
+            if self._replay(book, buffer):
+                del self._buffers[symbol]
+                self._books[symbol] = book
+                return
+            # Снимок старее буферизованных событий: берём новый, события продолжают копиться
+            await asyncio.sleep(STALE_SNAPSHOT_RETRY_SECONDS)
+
+    @staticmethod
+    def _replay(book: OrderBook, buffer) -> bool:
+        for first_id, last_id, bids, asks in buffer:
+            if last_id <= book.last_update_id:
+                continue
+            if first_id > book.last_update_id + 1:
+                return False
+            book.apply(bids, asks, last_id)
+        return True
+
+    def stats(self) -> dict:
+        return {'books': len(self._books), 'loading': len(self._buffers)}
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import secrets
+import time
+from collections import deque
+from itertools import islice
+
+import metrics
+from subscriptions import watchlist_room
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = metrics.Histogram('price_flush_seconds', 'Time to emit one batch of price_updates to all watchlist rooms')
+EMIT_SECONDS = metrics.Histogram('price_emit_seconds', 'Time of a single price_updates emit to one room')
+
+
+class PriceUpdatePublisher:
+    """
+    Накопитель обновлений цен с пакетной рассылкой.
+
+    Тики не отправляются клиентам сразу: по каждому символу хранится только последнее
+    состояние, а раз в flush_interval секунд каждому уникальному списку символов
+    уходит одно сообщение 'price_updates' со всеми изменившимися символами из него.
+    Промежуточные тики одного символа внутри интервала отбрасываются.
+
+    Каждый пакет получает номер seq (сквозной для всех комнат, в пределах epoch - запуска
+    сервера). Последние history_size пакетов хранятся, чтобы переподключившемуся клиенту
+    можно было отдать только пропущенные изменения вместо полного снимка.
+
+    Если передан guard (backpressure.SlowClientGuard), медленным клиентам пакеты не
+    отправляются, а копятся в guard и уходят одним сообщением, когда клиент догонит.
+    """
+
+    def __init__(self, sio_server, subscriptions, flush_interval: float = 0.2, history_size: int = 300, guard=None):
+        self._sio = sio_server
+        self._subscriptions = subscriptions
+        self._guard = guard
+        self._flush_interval = flush_interval
+        self._dirty: dict[str, dict] = {}
+        self._history: deque[tuple[int, dict]] = deque(maxlen=history_size)  # (seq, {symbol: payload})
+        self.epoch = secrets.token_hex(4)
+        self.seq = 0
+        self.ticks_received = 0
+        self.ticks_superseded = 0
+        self.updates_emitted = 0
+        self.messages_emitted = 0
+
+    def publish(self, symbol: str, payload: dict):
+        """Регистрирует новое состояние символа. Не блокирует и ничего не отправляет."""
+        self.ticks_received += 1
+        pending = self._dirty.get(symbol)
+        if pending is not None:
+            self.ticks_superseded += 1
+            # Клиенту важна цена до начала интервала, а не предпоследний тик
+            payload['previousPrice'] = pending['previousPrice']
+        self._dirty[symbol] = payload
+
+    async def run(self):
+        """Бесконечный цикл периодической рассылки."""
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                if self._guard is not None:
+                    await self._release(await self._guard.check())
+                await self.flush()
+            except Exception as e:
+                logger.exception("Error while flushing price updates: %s", e)
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        started = time.perf_counter()
+        dirty, self._dirty = self._dirty, {}
+        self.seq += 1
+        seq = self.seq
+        self._history.append((seq, dirty))
+
+        for watchlist in list(self._subscriptions.client_watchlists()):
+            updates = self._select(dirty, watchlist)
+            if not updates:
+                continue
+            # Каждый процесс рассылает тики своим клиентам сам, через шину между процессами пакеты не идут
+            held = self._guard.held(watchlist) if self._guard is not None else None
+            if held:
+                for sid in held:
+                    self._guard.defer(sid, updates)
+            emit_started = time.perf_counter()
+            await self._sio.emit('price_updates', {'updates': updates, 'seq': seq},
+                                 room=watchlist_room(watchlist), skip_sid=held, ignore_queue=True)
+            EMIT_SECONDS.observe(time.perf_counter() - emit_started)
+            self.messages_emitted += 1
+            self.updates_emitted += len(updates)
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+    async def _release(self, released: list[tuple[str, list[dict]]]):
+        # Всё, что клиент пропустил, пока был медленным, уже в отложенном - помечаем текущим seq
+        for sid, updates in released:
+            await self._sio.emit('price_updates', {'updates': updates, 'seq': self.seq}, to=sid, ignore_queue=True)
+            self.messages_emitted += 1
+            self.updates_emitted += len(updates)
+
+    @staticmethod
+    def _select(dirty: dict, watchlist) -> list[dict]:
+        # Идём по меньшему из двух наборов
+        if len(dirty) < len(watchlist):
+            return [payload for symbol, payload in dirty.items() if symbol in watchlist]
+        return [dirty[symbol] for symbol in watchlist if symbol in dirty]
+
+    def changes_since(self, epoch: str, seq: int, watchlist) -> list[dict] | None:
+        """
+        Изменения символов watchlist во всех пакетах после seq, схлопнутые до последнего
+        состояния символа (previousPrice - из первого пропущенного пакета).
+        :return: Список обновлений или None, если истории не хватает и нужен полный снимок.
+        """
+        if epoch != self.epoch or seq > self.seq or seq < 0:
+            return None
+        if seq == self.seq:
+            return []
+        # seq пакетов в истории идут подряд, поэтому начало находится арифметикой
+        if not self._history or self._history[0][0] > seq + 1:
+            return None
+        start = seq + 1 - self._history[0][0]
+        merged: dict[str, dict] = {}
+        for _, dirty in islice(self._history, start, None):
+            for payload in self._select(dirty, watchlist):
+                previous = merged.get(payload['symbol'])
+                if previous is not None:
+                    payload = {**payload, 'previousPrice': previous['previousPrice']}
+                merged[payload['symbol']] = payload
+        return list(merged.values())
+
+    def stats(self) -> dict:
+        return {
+            'ticks_received': self.ticks_received,
+            'ticks_superseded': self.ticks_superseded,
+            'updates_emitted': self.updates_emitted,
+            'messages_emitted': self.messages_emitted,
+            'pending_symbols': len(self._dirty),
+            'seq': self.seq,
+            'history_size': len(self._history),
+            'flush_interval_ms': int(self._flush_interval * 1000),
+        }
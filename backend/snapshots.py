@@ -0,0 +1,60 @@
+from codec import PreEncoded
+
+
+class SnapshotCache:
+    """
+    Снимки цен для initial_prices, закодированные заранее и общие для всех клиентов.
+
+    Снимок зависит только от списка символов и версии данных (seq последнего пакета
+    price_updates плюс явные сбросы после REST-обновлений), поэтому при массовом
+    переподключении клиенты с одинаковыми списками получают одну и ту же готовую строку.
+    Кэш хранит снимки только текущей версии - при её смене он просто очищается.
+    """
+
+    def __init__(self, latest_prices: dict, coin_names_func, publisher):
+        """
+        :param latest_prices: Общий словарь последних цен {'BTC': 65000.0}.
+        :param coin_names_func: Функция, возвращающая актуальный словарь полных названий.
+        :param publisher: PriceUpdatePublisher - источник seq и epoch рассылки.
+        """
+        self._latest_prices = latest_prices
+        self._coin_names = coin_names_func
+        self._publisher = publisher
+        self._generation = 0
+        self._key = None
+        self._entries: dict[frozenset, PreEncoded] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        """Цены или названия поменялись в обход рассылки (REST-загрузка)."""
+        self._generation += 1
+
+    def get(self, watchlist) -> PreEncoded | None:
+        """Готовый payload initial_prices для списка символов или None, если цен ещё нет."""
+        seq = self._publisher.seq
+        key = (seq, self._generation)
+        if key != self._key:
+            self._key = key
+            self._entries.clear()
+
+        watchlist = frozenset(watchlist)
+        cached = self._entries.get(watchlist)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        coin_names = self._coin_names()
+        cryptos = [
+            {'symbol': s, 'price': self._latest_prices[s], 'name': coin_names.get(s, s)}
+            for s in sorted(watchlist) if s in self._latest_prices
+        ]
+        if not cryptos:
+            return None
+        encoded = PreEncoded.encode({'cryptos': cryptos, 'seq': seq, 'epoch': self._publisher.epoch})
+        self._entries[watchlist] = encoded
+        return encoded
+
+    def stats(self) -> dict:
+        return {'cached_snapshots': len(self._entries), 'hits': self.hits, 'misses': self.misses}
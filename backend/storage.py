@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    owner      TEXT NOT NULL,
+    symbol     TEXT NOT NULL,
+    price      REAL NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (owner, symbol, price)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_alerts_symbol ON alerts (symbol);
+
+CREATE TABLE IF NOT EXISTS condition_alerts (
+    owner      TEXT NOT NULL,
+    symbol     TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    threshold  REAL NOT NULL,
+    window_seconds INTEGER NOT NULL,
+    direction  TEXT NOT NULL,
+    cooldown   REAL NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (owner, symbol, kind, threshold, window_seconds, direction)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS client_symbols (
+    client_id  TEXT PRIMARY KEY,
+    symbols    TEXT NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS telegram_chats (
+    chat_id    TEXT PRIMARY KEY,
+    symbols    TEXT NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS last_triggered (
+    owner        TEXT NOT NULL,
+    symbol       TEXT NOT NULL,
+    price        REAL NOT NULL,
+    triggered_at REAL NOT NULL,
+    PRIMARY KEY (owner, symbol)
+) WITHOUT ROWID;
+"""
+
+
+class AlertStore:
+    """
+    Локальное хранилище алертов, списков символов клиентов и чатов Telegram
+    и последних сработавших цен (SQLite).
+
+    Запись идёт по схеме write-behind: методы save_*/delete_* только кладут операцию в очередь
+    и сразу возвращают управление, а фоновая задача run() раз в flush_interval секунд
+    пишет накопленное одной транзакцией в отдельном потоке. Повторные операции над одним
+    ключом схлопываются - на диск попадает только последнее состояние.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self._path = path
+        self._flush_interval = flush_interval
+        self._conn: sqlite3.Connection | None = None
+        # Один поток: sqlite3-соединение не стоит делить между потоками
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='alert-store')
+        self._pending: dict[tuple, tuple | None] = {}
+        self._wakeup = asyncio.Event()
+
+    def open(self):
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def load(self) -> dict:
+        """
+        Читает всё состояние при старте.
+        :return: {'alerts': [(owner, symbol, price)],
+                  'condition_alerts': [(owner, symbol, kind, threshold, window, direction, cooldown)],
+                  'client_symbols': {client_id: [..]}, 'telegram_chats': {chat_id: [..]},
+                  'last_triggered': {owner: {symbol: price}}}
+                 client_symbols упорядочен по времени обновления (последний - самый свежий).
+        """
+        conn = self._conn
+        alerts = conn.execute('SELECT owner, symbol, price FROM alerts ORDER BY symbol, price').fetchall()
+        condition_alerts = conn.execute(
+            'SELECT owner, symbol, kind, threshold, window_seconds, direction, cooldown FROM condition_alerts'
+        ).fetchall()
+
+        client_symbols = {}
+        for client_id, symbols in conn.execute(
+                'SELECT client_id, symbols FROM client_symbols ORDER BY updated_at'):
+            try:
+                client_symbols[client_id] = json.loads(symbols)
+            except ValueError:
+                continue
+
+        telegram_chats = {}
+        for chat_id, symbols in conn.execute('SELECT chat_id, symbols FROM telegram_chats'):
+            try:
+                telegram_chats[chat_id] = json.loads(symbols)
+            except ValueError:
+                continue
+
+        last_triggered = {}
+        for owner, symbol, price in conn.execute('SELECT owner, symbol, price FROM last_triggered'):
+            last_triggered.setdefault(owner, {})[symbol] = price
+
+        return {
+            'alerts': alerts,
+            'condition_alerts': condition_alerts,
+            'client_symbols': client_symbols,
+            'telegram_chats': telegram_chats,
+            'last_triggered': last_triggered,
+        }
+
+    # --- Неблокирующие операции записи (горячий путь) ---
+    def save_alert(self, owner: str, symbol: str, price: float):
+        self._enqueue(('alert', owner, symbol, price), (time.time(),))
+
+    def delete_alert(self, owner: str, symbol: str, price: float):
+        self._enqueue(('alert', owner, symbol, price), None)
+
+    def save_condition_alert(self, alert):
+        """:param alert: conditions.ConditionAlert"""
+        self._enqueue(('condition', *alert.key), (alert.cooldown, time.time()))
+
+    def delete_condition_alert(self, alert):
+        self._enqueue(('condition', *alert.key), None)
+
+    def save_client_symbols(self, client_id: str, symbols: list):
+        self._enqueue(('client_symbols', client_id), (json.dumps(list(symbols)), time.time()))
+
+    def save_chat_symbols(self, chat_id: str, symbols):
+        """Список символов чата Telegram; пустой список удаляет чат."""
+        value = (json.dumps(sorted(symbols)), time.time()) if symbols else None
+        self._enqueue(('telegram_chat', chat_id), value)
+
+    def save_last_triggered(self, owner: str, symbol: str, price: float):
+        self._enqueue(('last_triggered', owner, symbol), (price, time.time()))
+
+    def _enqueue(self, key: tuple, value: tuple | None):
+        self._pending[key] = value
+        self._wakeup.set()
+
+    def __len__(self):
+        """Число операций, ожидающих записи на диск."""
+        return len(self._pending)
+
+    # --- Фоновая запись ---
+    async def run(self):
+        """Бесконечный цикл сброса очереди на диск."""
+        try:
+            while True:
+                await self._wakeup.wait()
+                await asyncio.sleep(self._flush_interval)
+                await self.flush()
+        except asyncio.CancelledError:
+            await self.flush()
+            raise
+
+    async def flush(self):
+        if not self._pending:
+            self._wakeup.clear()
+            return
+        batch, self._pending = self._pending, {}
+        self._wakeup.clear()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._write_batch, batch)
+        except Exception as e:
+            logger.error("Could not persist %d pending writes: %s", len(batch), e)
+            # Возвращаем операции в очередь, не затирая более свежие
+            for key, value in batch.items():
+                self._pending.setdefault(key, value)
+            self._wakeup.set()
+
+    def _write_batch(self, batch: dict):
+        with self._conn:
+            for key, value in batch.items():
+                kind = key[0]
+                if kind == 'alert':
+                    _, owner, symbol, price = key
+                    if value is None:
+                        self._conn.execute(
+                            'DELETE FROM alerts WHERE owner = ? AND symbol = ? AND price = ?',
+                            (owner, symbol, price))
+                    else:
+                        self._conn.execute(
+                            'INSERT OR IGNORE INTO alerts (owner, symbol, price, created_at) VALUES (?, ?, ?, ?)',
+                            (owner, symbol, price, value[0]))
+                elif kind == 'condition':
+                    if value is None:
+                        self._conn.execute(
+                            'DELETE FROM condition_alerts WHERE owner = ? AND symbol = ? AND kind = ?'
+                            ' AND threshold = ? AND window_seconds = ? AND direction = ?', key[1:])
+                    else:
+                        self._conn.execute(
+                            'INSERT OR REPLACE INTO condition_alerts'
+                            ' (owner, symbol, kind, threshold, window_seconds, direction, cooldown, created_at)'
+                            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (*key[1:], *value))
+                elif kind == 'client_symbols':
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO client_symbols (client_id, symbols, updated_at) VALUES (?, ?, ?)',
+                        (key[1], *value))
+                elif kind == 'telegram_chat':
+                    if value is None:
+                        self._conn.execute('DELETE FROM telegram_chats WHERE chat_id = ?', (key[1],))
+                    else:
+                        self._conn.execute(
+                            'INSERT OR REPLACE INTO telegram_chats (chat_id, symbols, updated_at) VALUES (?, ?, ?)',
+                            (key[1], *value))
+                elif kind == 'last_triggered':
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO last_triggered (owner, symbol, price, triggered_at) VALUES (?, ?, ?, ?)',
+                        (key[1], key[2], *value))
+
+    def close(self):
+        if self._conn is not None:
+            if self._pending:
+                batch, self._pending = self._pending, {}
+                self._write_batch(batch)
+            self._conn.close()
+            self._conn = None
+        self._executor.shutdown(wait=True)
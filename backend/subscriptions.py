@@ -0,0 +1,85 @@
+import hashlib
+from collections import Counter
+
+
+def symbol_room(symbol: str) -> str:
+    """Комната Socket.IO со всеми клиентами, следящими за символом."""
+    return f"symbol:{symbol}"
+
+
+def watchlist_room(watchlist) -> str:
+    """
+    Комната Socket.IO для клиентов с одинаковым списком символов:
+    пакет обновлений для них кодируется и отправляется один раз.
+    """
+    digest = hashlib.blake2s(','.join(sorted(watchlist)).encode(), digest_size=8).hexdigest()
+    return f"watchlist:{digest}"
+
+
+class SubscriptionRegistry:
+    """
+    Списки отслеживаемых символов по подписчикам (sid клиента или служебный ключ).
+    Набор стримов Binance - объединение всех списков, каждый символ учитывается со счётчиком ссылок.
+    """
+
+    def __init__(self):
+        self._watchlists: dict[str, frozenset] = {}
+        self._refcounts: Counter = Counter()
+        self._symbols: set[str] = set()
+        # Сколько клиентов (не служебных подписчиков) имеют каждый конкретный список
+        self._client_groups: Counter = Counter()
+        self._service_keys: set[str] = set()
+
+    def set_watchlist(self, key: str, symbols, service: bool = False) -> tuple[set, set]:
+        """
+        Заменяет список подписчика.
+        :param service: Служебный подписчик (не сокет-клиент) - учитывается в наборе стримов,
+                        но не получает рассылку.
+        :return: (joined, left) - символы, добавленные в список подписчика и удалённые из него.
+        """
+        new = frozenset(symbols)
+        old = self._watchlists.get(key, frozenset())
+        joined, left = set(new - old), set(old - new)
+        if service:
+            self._service_keys.add(key)
+        is_client = key not in self._service_keys
+        if is_client and old:
+            self._client_groups[old] -= 1
+            if self._client_groups[old] <= 0:
+                del self._client_groups[old]
+        if new:
+            self._watchlists[key] = new
+            if is_client:
+                self._client_groups[new] += 1
+        else:
+            self._watchlists.pop(key, None)
+
+        for symbol in joined:
+            self._refcounts[symbol] += 1
+            self._symbols.add(symbol)
+        for symbol in left:
+            self._refcounts[symbol] -= 1
+            if self._refcounts[symbol] <= 0:
+                del self._refcounts[symbol]
+                self._symbols.discard(symbol)
+        return joined, left
+
+    def remove(self, key: str) -> set:
+        """Удаляет подписчика, возвращает символы, из которых он вышел."""
+        _, left = self.set_watchlist(key, ())
+        self._service_keys.discard(key)
+        return left
+
+    def client_watchlists(self):
+        """Различные списки символов подключённых клиентов."""
+        return self._client_groups.keys()
+
+    def watchlist(self, key: str) -> frozenset:
+        return self._watchlists.get(key, frozenset())
+
+    def symbols(self) -> set:
+        """Объединение всех списков. Возвращается живой набор - не изменять снаружи."""
+        return self._symbols
+
+    def subscriber_count(self, symbol: str) -> int:
+        return self._refcounts.get(symbol, 0)
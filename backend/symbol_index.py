@@ -0,0 +1,140 @@
+import hashlib
+from bisect import bisect_left
+from collections import OrderedDict
+
+# Чем меньше ранг, тем выше результат
+RANK_EXACT, RANK_TICKER_PREFIX, RANK_NAME_PREFIX, RANK_WORD_PREFIX, RANK_FUZZY = range(5)
+MATCH_NAMES = {
+    RANK_EXACT: 'exact', RANK_TICKER_PREFIX: 'prefix', RANK_NAME_PREFIX: 'name',
+    RANK_WORD_PREFIX: 'name', RANK_FUZZY: 'fuzzy',
+}
+QUERY_CACHE_SIZE = 2048
+MAX_FUZZY_DISTANCE = 2
+# Длиннее не бывает ни тикер, ни осмысленный префикс названия; число вариантов удалений для
+# нечёткого поиска растёт как квадрат длины запроса
+MAX_QUERY_LENGTH = 32
+
+
+def _deletes(word: str, depth: int) -> set:
+    """Все строки, получаемые из word удалением до depth символов (схема SymSpell)."""
+    result = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - result
+        result |= frontier
+    return result
+
+
+def _bounded_distance(a: str, b: str, limit: int) -> int:
+    """Расстояние Левенштейна с ранним выходом: результат > limit означает "слишком далеко"."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            current.append(value)
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class SymbolSearchIndex:
+    """
+    Поисковый индекс по тикерам и полным названиям активов.
+    Строится один раз при обновлении данных с Binance: отсортированные массивы ключей,
+    префиксный поиск - бинарным поиском, нечёткий - через словарь удалений (SymSpell),
+    так что кандидаты находятся поиском по словарю, а не перебором всех тикеров.
+    Результаты запросов кэшируются до следующей пересборки индекса.
+    """
+
+    def __init__(self, symbols, coin_names: dict):
+        self._names = {symbol: coin_names.get(symbol, symbol) for symbol in symbols}
+        self._tickers = sorted(self._names)
+        self._max_ticker_length = max(map(len, self._tickers), default=0)
+        # (ключ, символ) - полное название и отдельные слова названия в нижнем регистре
+        name_keys, word_keys = [], []
+        for symbol, name in self._names.items():
+            lowered = name.lower()
+            name_keys.append((lowered, symbol))
+            for word in lowered.split()[1:]:
+                word_keys.append((word, symbol))
+        name_keys.sort()
+        word_keys.sort()
+        self._name_keys = [key for key, _ in name_keys]
+        self._name_symbols = [symbol for _, symbol in name_keys]
+        self._word_keys = [key for key, _ in word_keys]
+        self._word_symbols = [symbol for _, symbol in word_keys]
+        self._deletes: dict[str, list[str]] = {}
+        for ticker in self._tickers:
+            for variant in _deletes(ticker, MAX_FUZZY_DISTANCE):
+                self._deletes.setdefault(variant, []).append(ticker)
+
+        content = '\n'.join(f"{s}\t{self._names[s]}" for s in self._tickers)
+        self.version = hashlib.blake2s(content.encode(), digest_size=8).hexdigest()
+        self._cache: OrderedDict = OrderedDict()
+
+    def __len__(self):
+        return len(self._tickers)
+
+    @staticmethod
+    def _prefix_range(keys: list, prefix: str) -> range:
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + '\uffff', start)
+        return range(start, end)
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        query = query.strip()[:MAX_QUERY_LENGTH]
+        if not query:
+            return []
+        cache_key = (query.upper(), limit)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self._cache.move_to_end(cache_key)
+            return cached
+
+        results = self._search(query, limit)
+        self._cache[cache_key] = results
+        if len(self._cache) > QUERY_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return results
+
+    def _search(self, query: str, limit: int) -> list[dict]:
+        ticker_query, name_query = query.upper(), query.lower()
+        best: dict[str, tuple] = {}  # symbol -> (rank, sort_key)
+
+        def offer(symbol, rank, sort_key):
+            current = best.get(symbol)
+            if current is None or (rank, sort_key) < current:
+                best[symbol] = (rank, sort_key)
+
+        if ticker_query in self._names:
+            offer(ticker_query, RANK_EXACT, 0)
+        for i in self._prefix_range(self._tickers, ticker_query):
+            offer(self._tickers[i], RANK_TICKER_PREFIX, len(self._tickers[i]))
+        for i in self._prefix_range(self._name_keys, name_query):
+            offer(self._name_symbols[i], RANK_NAME_PREFIX, len(self._name_keys[i]))
+        for i in self._prefix_range(self._word_keys, name_query):
+            offer(self._word_symbols[i], RANK_WORD_PREFIX, len(self._word_keys[i]))
+
+        # Нечёткий поиск нужен, только если точных совпадений мало (опечатка в тикере)
+        # Запрос длиннее любого тикера больше чем на MAX_FUZZY_DISTANCE ни с одним не совпадёт
+        if len(best) < limit and 2 <= len(ticker_query) <= self._max_ticker_length + MAX_FUZZY_DISTANCE:
+            max_distance = 1 if len(ticker_query) <= 4 else MAX_FUZZY_DISTANCE
+            candidates = set()
+            for variant in _deletes(ticker_query, max_distance):
+                candidates.update(self._deletes.get(variant, ()))
+            for ticker in candidates - best.keys():
+                distance = _bounded_distance(ticker_query, ticker, max_distance)
+                if distance <= max_distance:
+                    offer(ticker, RANK_FUZZY, distance)
+
+        ranked = sorted(best.items(), key=lambda item: (item[1], item[0]))[:limit]
+        return [
+            {'symbol': symbol, 'name': self._names[symbol], 'match': MATCH_NAMES[rank]}
+            for symbol, (rank, _) in ranked
+        ]
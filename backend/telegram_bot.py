@@ -1,36 +1,132 @@
-import socketio
+import logging
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes, ConversationHandler
 
+from telegram_users import MAX_ALERTS_PER_CHAT, MAX_WATCHLIST_SYMBOLS
+
+logger = logging.getLogger(__name__)
+
 # Состояния для диалога
 SELECTING_COIN, TYPING_PRICE = range(2)
 
+BOT_COMMANDS = [
+    BotCommand('watch', 'Добавить монеты в список: /watch BTC ETH'),
+    BotCommand('unwatch', 'Убрать монеты из списка'),
+    BotCommand('alert', 'Установить алерт на цену'),
+    BotCommand('list', 'Мой список и алерты'),
+    BotCommand('remove', 'Удалить алерт'),
+    BotCommand('cancel', 'Отменить текущее действие'),
+]
+
+
+def _chat_id(update: Update) -> str:
+    return str(update.effective_chat.id)
+
+def _parse_symbol(text: str) -> str:
+    return text.strip().upper().removesuffix('/USDT')
+
+def _parse_price(text: str) -> float | None:
+    try:
+        price = float(text.replace(',', '.'))
+    except ValueError:
+        return None
+    return price if price > 0 else None
+
+def _format_price(price: float) -> str:
+    return f"{price:.8g}"
+
+def _symbol_keyboard(symbols, prefix: str) -> InlineKeyboardMarkup:
+    keyboard = []
+    row = []
+    for symbol in symbols:
+        row.append(InlineKeyboardButton(symbol, callback_data=f"{prefix}{symbol}"))
+        if len(row) == 3:
+            keyboard.append(row)
+            row = []
+    if row: keyboard.append(row)
+    keyboard.append([InlineKeyboardButton("Отмена", callback_data="cancel_dialog")])
+    return InlineKeyboardMarkup(keyboard)
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     await update.message.reply_html(
         f"Привет, {user.mention_html()}! Я бот для отслеживания цен.\n\n"
-        f"Используй меню команд (кнопка / слева), чтобы управлять алертами."
+        f"Добавь монеты командой /watch BTC ETH, потом ставь алерты через /alert. "
+        f"Остальные команды - в меню (кнопка / слева)."
     )
 
+async def watch_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    users = context.bot_data['users']
+    symbols = [_parse_symbol(arg) for arg in context.args]
+    if not symbols:
+        await update.message.reply_text("Укажите монеты: /watch BTC ETH")
+        return
+    unknown = [s for s in symbols if not users.is_known(s)]
+    added = users.watch(_chat_id(update), [s for s in symbols if users.is_known(s)])
+    lines = []
+    if added:
+        lines.append(f"✅ Добавлено: {', '.join(added)}")
+    if unknown:
+        lines.append(f"Нет такой пары к USDT: {', '.join(unknown)}")
+    if not added and not unknown:
+        lines.append(f"Уже в списке (или список заполнен, максимум {MAX_WATCHLIST_SYMBOLS}).")
+    await update.message.reply_text('\n'.join(lines))
+
+async def unwatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    users = context.bot_data['users']
+    removed = users.unwatch(_chat_id(update), [_parse_symbol(arg) for arg in context.args])
+    if removed:
+        await update.message.reply_text(f"Убрано из списка: {', '.join(removed)}")
+    else:
+        await update.message.reply_text("Укажите монеты из своего списка: /unwatch BTC")
+
+async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    users = context.bot_data['users']
+    prices = context.bot_data['latest_prices']
+    chat_id = _chat_id(update)
+    watchlist = users.watchlist(chat_id)
+    alerts = users.alerts(chat_id)
+    if not watchlist and not alerts:
+        await update.message.reply_text("Список пуст. Добавьте монеты: /watch BTC ETH")
+        return
+    lines = ["Ваш список:"]
+    for symbol in watchlist:
+        price = prices.get(symbol)
+        lines.append(f"{symbol}/USDT: {_format_price(price)} USDT" if price is not None else f"{symbol}/USDT: нет данных")
+    if alerts:
+        lines += ["", "Алерты:"]
+        lines += [f"{alert.symbol}/USDT → {_format_price(alert.price)} USDT" for alert in alerts]
+    await update.message.reply_text('\n'.join(lines))
+
+async def _add_alert(update: Update, context: ContextTypes.DEFAULT_TYPE, symbol: str, price: float) -> None:
+    users = context.bot_data['users']
+    chat_id = _chat_id(update)
+    if not users.can_add_alert(chat_id):
+        text = f"Слишком много алертов (максимум {MAX_ALERTS_PER_CHAT}). Удалите лишние через /remove."
+    elif users.add_alert(chat_id, symbol, price) is None:
+        text = f"Алерт для {symbol}/USDT на {price} USDT уже есть."
+    else:
+        text = f"✅ Установлен алерт для {symbol}/USDT на цену {price} USDT."
+    await update.effective_message.reply_text(text)
+
 async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    get_symbols_func = context.bot_data.get('get_symbols_func')
-    symbol_list = get_symbols_func() if get_symbols_func else []
-    
+    users = context.bot_data['users']
+    # Быстрый вариант без диалога: /alert BTC 65000
+    if len(context.args) == 2:
+        symbol, price = _parse_symbol(context.args[0]), _parse_price(context.args[1])
+        if not users.is_known(symbol) or price is None:
+            await update.message.reply_text("Формат: /alert BTC 65000")
+        else:
+            await _add_alert(update, context, symbol, price)
+        return ConversationHandler.END
+
+    symbol_list = users.watchlist(_chat_id(update))
     if not symbol_list:
-        await update.message.reply_text("Список отслеживаемых криптовалют в данный момент пуст.")
+        await update.message.reply_text("Ваш список пуст. Добавьте монеты: /watch BTC ETH (или /alert BTC 65000).")
         return ConversationHandler.END
 
-    keyboard = []
-    row = []
-    for symbol in symbol_list:
-        row.append(InlineKeyboardButton(symbol, callback_data=f"set_alert_coin_{symbol}"))
-        if len(row) == 3:
-            keyboard.append(row)
-            row = []
-    if row: keyboard.append(row)
-    keyboard.append([InlineKeyboardButton("Отмена", callback_data="cancel_dialog")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    reply_markup = _symbol_keyboard(symbol_list, 'set_alert_coin_')
     await update.message.reply_text('Выберите криптовалюту для установки алерта:', reply_markup=reply_markup)
     return SELECTING_COIN
 
@@ -47,23 +143,49 @@ async def select_coin_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     return TYPING_PRICE
 
 async def receive_price_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    user_input = update.message.text
     selected_coin = context.user_data.get('selected_coin')
-    sio_server = context.bot_data.get('socketio_server')
-    if not selected_coin or not sio_server:
+    if not selected_coin:
         await update.message.reply_text("Что-то пошло не так. Начните снова с /alert.")
         return ConversationHandler.END
-    try:
-        target_price = float(user_input.replace(',', '.'))
-        if target_price <= 0: raise ValueError("Price must be positive")
-        pair = f"{selected_coin}/USDT"
-        await sio_server.emit('add_alert_from_bot', {'pair': pair, 'price': target_price})
-        await update.message.reply_text(f"✅ Установлен алерт для {pair} на цену {target_price} USDT.")
-        context.user_data.clear()
-        return ConversationHandler.END
-    except ValueError:
+    target_price = _parse_price(update.message.text)
+    if target_price is None:
         await update.message.reply_text("Неверный формат. Введите цену в виде числа (или /cancel).")
         return TYPING_PRICE
+    await _add_alert(update, context, selected_coin, target_price)
+    context.user_data.clear()
+    return ConversationHandler.END
+
+async def remove_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    users = context.bot_data['users']
+    chat_id = _chat_id(update)
+    # /remove BTC 65000 - сразу, без аргументов - выбор из списка алертов чата
+    if len(context.args) == 2:
+        symbol, price = _parse_symbol(context.args[0]), _parse_price(context.args[1])
+        removed = price is not None and users.remove_alert(chat_id, symbol, price)
+        await update.message.reply_text(f"🗑 Алерт {symbol}/USDT {context.args[1]} удалён." if removed else "Такого алерта нет.")
+        return
+    alerts = users.alerts(chat_id)
+    if not alerts:
+        await update.message.reply_text("Активных алертов нет.")
+        return
+    keyboard = [
+        [InlineKeyboardButton(f"{alert.symbol}/USDT → {_format_price(alert.price)}",
+                              callback_data=f"remove_alert:{alert.symbol}:{alert.price!r}")]
+        for alert in alerts
+    ]
+    keyboard.append([InlineKeyboardButton("Отмена", callback_data="cancel_dialog")])
+    await update.message.reply_text('Какой алерт удалить?', reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def remove_alert_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    if query.data == 'cancel_dialog':
+        await query.edit_message_text(text='Действие отменено.')
+        return
+    _, symbol, price = query.data.split(':')
+    removed = context.bot_data['users'].remove_alert(_chat_id(update), symbol, float(price))
+    await query.edit_message_text(text=f"🗑 Алерт {symbol}/USDT {_format_price(float(price))} удалён." if removed
+                                  else "Алерт уже сработал или удалён.")
 
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
@@ -75,17 +197,21 @@ async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     context.user_data.clear()
     return ConversationHandler.END
 
-def setup_telegram_bot(token: str, get_symbols_func, socketio_instance: socketio.AsyncServer) -> Application:
-    """Создает, настраивает и возвращает экземпляр Telegram Application."""
+def setup_telegram_bot(token: str, users, latest_prices: dict) -> Application:
+    """
+    Создает, настраивает и возвращает экземпляр Telegram Application.
+    :param users: telegram_users.TelegramUsers - списки и алерты чатов.
+    :param latest_prices: Словарь последних цен для /list.
+    """
     if not token:
-        print("!!! TELEGRAM_BOT_TOKEN is not set. Bot will not work. !!!")
+        logger.error("TELEGRAM_BOT_TOKEN is not set. Bot will not work.")
         return None
 
     application = Application.builder().token(token).build()
-    
-    application.bot_data['get_symbols_func'] = get_symbols_func
-    application.bot_data['socketio_server'] = socketio_instance
-    
+
+    application.bot_data['users'] = users
+    application.bot_data['latest_prices'] = latest_prices
+
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler('alert', alert_command)],
         states={
@@ -99,6 +225,11 @@ def setup_telegram_bot(token: str, get_symbols_func, socketio_instance: socketio
         per_message=False
     )
     application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("watch", watch_command))
+    application.add_handler(CommandHandler("unwatch", unwatch_command))
+    application.add_handler(CommandHandler("list", list_command))
+    application.add_handler(CommandHandler("remove", remove_command))
     application.add_handler(conv_handler)
-    
-    return application
\ No newline at end of file
+    application.add_handler(CallbackQueryHandler(remove_alert_callback, pattern='^(remove_alert:|cancel_dialog$)'))
+
+    return application
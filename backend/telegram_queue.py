@@ -0,0 +1,273 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+import metrics
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+logger = logging.getLogger(__name__)
+
+SEND_SECONDS = metrics.Histogram('telegram_send_seconds', 'Time of one Telegram sendMessage request')
+SEND_ERRORS = metrics.Counter('telegram_send_errors_total', 'Failed Telegram sendMessage requests', ('reason',))
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity в запасе."""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'paused_until')
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько секунд ждать до появления токена (0 - можно отправлять)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until: float):
+        self.paused_until = max(self.paused_until, until)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+
+class _ChatBatch:
+    __slots__ = ('messages', 'attempts')
+
+    def __init__(self):
+        self.messages: list[tuple[str, float]] = []  # (текст, время постановки в очередь)
+        self.attempts = 0
+
+
+class TelegramDeliveryQueue:
+    """
+    Ограниченная очередь доставки сообщений в Telegram.
+
+    - Лимиты Telegram соблюдаются token bucket'ами: общий (~30 сообщений/с) и на каждый чат (~1/с).
+    - Сообщения в один чат, пришедшие в пределах coalesce_window, склеиваются в одно.
+    - На 429 чат ставится на паузу на retry_after и сообщение возвращается в очередь;
+      сетевые ошибки повторяются до max_retries раз.
+    - При переполнении новые сообщения отбрасываются (счётчик dropped).
+    """
+
+    def __init__(self, get_bot, max_size: int = 5000, global_rate: float = 25, per_chat_rate: float = 1,
+                 coalesce_window: float = 1.0, max_retries: int = 3, max_in_flight: int = 10):
+        """
+        :param get_bot: Функция, возвращающая telegram.Bot (или None, пока бот не запущен).
+        """
+        self._get_bot = get_bot
+        self._max_size = max_size
+        self._per_chat_rate = per_chat_rate
+        self._coalesce_window = coalesce_window
+        self._max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate)
+        self._chat_buckets: dict[str, TokenBucket] = {}
+        self._batches: dict[str, _ChatBatch] = {}
+        self._schedule: list[tuple[float, int, str]] = []  # куча (когда отправлять, seq, chat_id)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._tasks: set[asyncio.Task] = set()
+        self._depth = 0
+        self._latencies = deque(maxlen=1000)
+        self.enqueued = 0
+        self.sent_messages = 0
+        self.sent_requests = 0
+        self.dropped = 0
+        self.retries = 0
+        self.failed = 0
+
+    def __len__(self):
+        return self._depth
+
+    def enqueue(self, chat_id, text: str) -> bool:
+        """Ставит сообщение в очередь. Не блокирует; False - очередь переполнена."""
+        if self._depth >= self._max_size:
+            self.dropped += 1
+            return False
+        chat_id = str(chat_id)
+        batch = self._batches.get(chat_id)
+        if batch is None:
+            batch = self._batches[chat_id] = _ChatBatch()
+            self._schedule_chat(chat_id, time.monotonic() + self._coalesce_window)
+        batch.messages.append((text, time.monotonic()))
+        self._depth += 1
+        self.enqueued += 1
+        return True
+
+    def _schedule_chat(self, chat_id: str, when: float):
+        heapq.heappush(self._schedule, (when, next(self._seq), chat_id))
+        self._wakeup.set()
+
+    async def run(self):
+        """Бесконечный цикл отправки."""
+        try:
+            while True:
+                if not self._schedule:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                due, _, chat_id = self._schedule[0]
+                now = time.monotonic()
+                if due > now:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=due - now)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                heapq.heappop(self._schedule)
+
+                batch = self._batches.get(chat_id)
+                if batch is None or not batch.messages:
+                    self._batches.pop(chat_id, None)
+                    continue
+
+                bot = self._get_bot()
+                chat_bucket = self._chat_bucket(chat_id)
+                delay = max(chat_bucket.delay(now), self._global_bucket.delay(now), 0 if bot else 1.0)
+                if delay > 0:
+                    # Пока ждём лимит, в этот же пакет продолжают склеиваться новые сообщения
+                    self._schedule_chat(chat_id, now + delay)
+                    continue
+
+                chat_bucket.take(now)
+                self._global_bucket.take(now)
+                del self._batches[chat_id]
+                await self._in_flight.acquire()
+                task = asyncio.create_task(self._send(bot, chat_id, batch))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            for task in self._tasks:
+                task.cancel()
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                now = time.monotonic()
+                self._chat_buckets = {c: b for c, b in self._chat_buckets.items() if not b.is_idle(now)}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self._per_chat_rate)
+        return bucket
+
+    @staticmethod
+    def _split(messages: list) -> tuple[list, list]:
+        """Берёт столько сообщений, сколько помещается в одно сообщение Telegram."""
+        taken, length = [], 0
+        for item in messages:
+            added = len(item[0]) + (1 if taken else 0)
+            if taken and length + added > TELEGRAM_MESSAGE_LIMIT:
+                break
+            taken.append(item)
+            length += added
+        return taken, messages[len(taken):]
+
+    async def _send(self, bot, chat_id: str, batch: _ChatBatch):
+        messages = batch.messages
+        try:
+            messages, rest = self._split(batch.messages)
+            if rest:
+                self._requeue(chat_id, rest, batch.attempts, time.monotonic())
+            text = '\n'.join(m[0] for m in messages)[:TELEGRAM_MESSAGE_LIMIT]
+            started = time.perf_counter()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text)
+            except RetryAfter as e:
+                SEND_ERRORS.labels('rate_limited').inc()
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                logger.warning("Telegram rate limit, retry after %ss", retry_after, extra={'chat_id': chat_id})
+                until = time.monotonic() + float(retry_after)
+                self._chat_bucket(chat_id).pause(until)
+                self.retries += 1
+                self._requeue(chat_id, messages, batch.attempts, until)
+                return
+            except (BadRequest, Forbidden) as e:
+                SEND_ERRORS.labels('rejected').inc()
+                logger.warning("Telegram rejected message: %s", e, extra={'chat_id': chat_id})
+                self._finish(messages, failed=True)
+                return
+            except TelegramError as e:
+                SEND_ERRORS.labels('error').inc()
+                if batch.attempts >= self._max_retries:
+                    logger.error("Could not deliver Telegram message: %s", e, extra={'chat_id': chat_id})
+                    self._finish(messages, failed=True)
+                    return
+                self.retries += 1
+                self._requeue(chat_id, messages, batch.attempts + 1, time.monotonic() + 2 ** batch.attempts)
+                return
+            finally:
+                SEND_SECONDS.observe(time.perf_counter() - started)
+
+            self.sent_requests += 1
+            self._finish(messages)
+        except Exception as e:
+            # Ошибка не из Telegram (сеть в другой обёртке, баг в разбиении): пакет не теряется молча,
+            # а учитывается как недоставленный, иначе глубина очереди не вернётся к нулю
+            SEND_ERRORS.labels('unexpected').inc()
+            logger.exception("Unexpected error while delivering Telegram message: %s", e, extra={'chat_id': chat_id})
+            self._finish(messages, failed=True)
+        finally:
+            self._in_flight.release()
+
+    def _requeue(self, chat_id: str, messages: list, attempts: int, when: float):
+        """Возвращает сообщения в начало пакета чата (перед пришедшими позже)."""
+        batch = self._batches.get(chat_id)
+        if batch is None:
+            batch = self._batches[chat_id] = _ChatBatch()
+        batch.messages[:0] = messages
+        batch.attempts = max(batch.attempts, attempts)
+        self._schedule_chat(chat_id, when)
+
+    def _finish(self, messages: list, failed: bool = False):
+        self._depth -= len(messages)
+        if failed:
+            self.failed += len(messages)
+            return
+        now = time.monotonic()
+        self.sent_messages += len(messages)
+        self._latencies.extend(now - enqueued_at for _, enqueued_at in messages)
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) if latencies else None
+
+        return {
+            'queue_depth': self._depth,
+            'chats_pending': len(self._batches),
+            'in_flight': len(self._tasks),
+            'enqueued': self.enqueued,
+            'sent_messages': self.sent_messages,
+            'sent_requests': self.sent_requests,
+            'dropped': self.dropped,
+            'retries': self.retries,
+            'failed': self.failed,
+            'latency_p50_seconds': percentile(0.5),
+            'latency_p99_seconds': percentile(0.99),
+        }
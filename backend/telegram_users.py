@@ -0,0 +1,131 @@
+"""
+Пользователи Telegram-бота: у каждого чата свой список символов и свои алерты.
+
+Алерты чата живут в общем AlertEngine с владельцем 'tg:<chat_id>', поэтому проверяются тем же
+индексом по символам, что и алерты браузеров, а сработавший алерт сам указывает свой чат.
+Списки символов хранятся вместе с обратным индексом символ -> чаты: события по символу
+рассылаются только подписанным на него чатам, без перебора всех пользователей.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+OWNER_PREFIX = 'tg:'
+MAX_WATCHLIST_SYMBOLS = 50
+MAX_ALERTS_PER_CHAT = 50
+
+
+def chat_owner(chat_id) -> str:
+    """Владелец алертов чата в AlertEngine и хранилище."""
+    return f"{OWNER_PREFIX}{chat_id}"
+
+
+def owner_chat(owner: str) -> str | None:
+    """chat_id, если алерт создан из Telegram, иначе None (алерт браузера)."""
+    return owner[len(OWNER_PREFIX):] if owner.startswith(OWNER_PREFIX) else None
+
+
+class TelegramUsers:
+    def __init__(self, alert_engine, alert_store, valid_symbols: set, on_change=None):
+        """
+        :param valid_symbols: Живой набор торгуемых символов (пустой - метаданных ещё нет, принимаем всё).
+        :param on_change: Колбэк без аргументов после изменения списков или алертов чатов
+                          (пересчёт подписок на Binance).
+        """
+        self._alert_engine = alert_engine
+        self._store = alert_store
+        self._valid_symbols = valid_symbols
+        self._on_change = on_change
+        self._watchlists: dict[str, set[str]] = {}
+        self._watchers: dict[str, set[str]] = {}  # symbol -> chat_id
+
+    def __len__(self):
+        return len(self._watchlists)
+
+    def load(self, saved: dict):
+        """Восстанавливает списки чатов из AlertStore.load()['telegram_chats'] (без записи обратно)."""
+        for chat_id, symbols in saved.items():
+            self._set_watchlist(chat_id, set(symbols))
+
+    def is_known(self, symbol: str) -> bool:
+        return not self._valid_symbols or symbol in self._valid_symbols
+
+    # --- Списки символов ---
+    def watchlist(self, chat_id: str) -> list[str]:
+        return sorted(self._watchlists.get(chat_id, ()))
+
+    def chats_watching(self, symbol: str) -> set[str]:
+        return self._watchers.get(symbol, set())
+
+    def symbols(self) -> set:
+        """Объединение списков всех чатов."""
+        return set(self._watchers)
+
+    def watch(self, chat_id: str, symbols) -> list[str]:
+        """Добавляет символы в список чата (сверх MAX_WATCHLIST_SYMBOLS не добавляет). Возвращает добавленные."""
+        current = self._watchlists.get(chat_id, set())
+        added = [s for s in dict.fromkeys(symbols) if s not in current]
+        added = added[:max(MAX_WATCHLIST_SYMBOLS - len(current), 0)]
+        if added:
+            self._update(chat_id, current | set(added))
+        return added
+
+    def unwatch(self, chat_id: str, symbols) -> list[str]:
+        current = self._watchlists.get(chat_id, set())
+        removed = [s for s in dict.fromkeys(symbols) if s in current]
+        if removed:
+            self._update(chat_id, current - set(removed))
+        return removed
+
+    def _update(self, chat_id: str, symbols: set):
+        self._set_watchlist(chat_id, symbols)
+        self._store.save_chat_symbols(chat_id, symbols)
+        self._changed()
+
+    def _set_watchlist(self, chat_id: str, symbols: set):
+        old = self._watchlists.get(chat_id, set())
+        for symbol in old - symbols:
+            chats = self._watchers[symbol]
+            chats.discard(chat_id)
+            if not chats:
+                del self._watchers[symbol]
+        for symbol in symbols - old:
+            self._watchers.setdefault(symbol, set()).add(chat_id)
+        if symbols:
+            self._watchlists[chat_id] = symbols
+        else:
+            self._watchlists.pop(chat_id, None)
+
+    # --- Алерты (в общем AlertEngine) ---
+    def alerts(self, chat_id: str) -> list:
+        return sorted(self._alert_engine.get_alerts(owner=chat_owner(chat_id)), key=lambda a: (a.symbol, a.price))
+
+    def can_add_alert(self, chat_id: str) -> bool:
+        return len(self._alert_engine.get_alerts(owner=chat_owner(chat_id))) < MAX_ALERTS_PER_CHAT
+
+    def add_alert(self, chat_id: str, symbol: str, price: float):
+        """Ценовой алерт чата; символ заодно попадает в список чата. None - такой алерт уже есть."""
+        alert = self._alert_engine.add_alert(chat_owner(chat_id), symbol, price)
+        if alert is None:
+            return None
+        self._store.save_alert(alert.owner, symbol, price)
+        added = symbol not in self._watchlists.get(chat_id, ()) and self.watch(chat_id, [symbol])
+        if not added:
+            # Символ уже в списке или список полон - подписки на символы алертов всё равно пересчитываем
+            self._changed()
+        return alert
+
+    def remove_alert(self, chat_id: str, symbol: str, price: float) -> bool:
+        owner = chat_owner(chat_id)
+        if self._alert_engine.remove_alert(owner, symbol, price) is None:
+            return False
+        self._store.delete_alert(owner, symbol, price)
+        self._changed()
+        return True
+
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change()
+
+    def stats(self) -> dict:
+        return {'chats': len(self._watchlists), 'watched_symbols': len(self._watchers)}
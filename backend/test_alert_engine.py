@@ -0,0 +1,60 @@
+from alert_engine import AlertEngine
+
+
+def make_engine(prices=None):
+    fired = []
+    engine = AlertEngine(on_trigger=lambda alerts, price, previous: fired.append(
+        (sorted(a.price for a in alerts), price, previous)), last_prices_ref=prices if prices is not None else {})
+    return engine, fired
+
+
+def test_crossing_up_fires_only_levels_between_prices():
+    engine, fired = make_engine({'BTC': 100.0})
+    for level in (101, 103, 105, 95):
+        engine.add_alert('a', 'BTC', level)
+
+    triggered = engine.process_tick('BTC', 100.0, 103.0)
+
+    assert sorted(a.price for a in triggered) == [101, 103]
+    assert fired == [([101, 103], 103.0, 100.0)]
+    assert {a.price for a in engine.get_alerts()} == {105, 95}
+
+
+def test_crossing_down_and_no_fire_on_same_side():
+    engine, fired = make_engine({'BTC': 100.0})
+    engine.add_alert('a', 'BTC', 98)
+    engine.add_alert('a', 'BTC', 110)
+
+    assert engine.process_tick('BTC', 100.0, 99.0) == []
+    assert [a.price for a in engine.process_tick('BTC', 99.0, 97.0)] == [98]
+    assert engine.process_tick('BTC', 97.0, 97.0) == []
+    assert [a.price for a in engine.get_alerts()] == [110]
+
+
+def test_level_below_is_not_fired_by_rise():
+    # Уровень ниже текущей цены срабатывает только при падении, а не при росте через старую цену
+    engine, _ = make_engine({'BTC': 100.0})
+    engine.add_alert('a', 'BTC', 99)
+    assert engine.process_tick('BTC', 100.0, 120.0) == []
+
+
+def test_duplicates_rejected_and_remove():
+    engine, _ = make_engine({'BTC': 100.0})
+    assert engine.add_alert('a', 'BTC', 105) is not None
+    assert engine.add_alert('a', 'BTC', 105) is None
+    assert engine.add_alert('b', 'BTC', 105) is not None
+
+    assert engine.remove_alert('a', 'BTC', 105) is not None
+    assert engine.remove_alert('a', 'BTC', 105) is None
+    assert [a.owner for a in engine.process_tick('BTC', 100.0, 106.0)] == ['b']
+    assert 'BTC' not in engine.symbols()
+
+
+def test_alert_without_price_is_classified_on_first_tick():
+    prices = {}
+    engine, _ = make_engine(prices)
+    engine.add_alert('a', 'ETH', 2000)
+
+    assert engine.process_tick('ETH', None, 1900.0) == []
+    assert prices['ETH'] == 1900.0
+    assert [a.price for a in engine.process_tick('ETH', 1900.0, 2001.0)] == [2000]
@@ -0,0 +1,95 @@
+import asyncio
+
+from backpressure import SlowClientGuard
+from subscriptions import SubscriptionRegistry
+
+
+class StalledTransport:
+    """TCP-транспорт клиента, который перестал читать: запись ждёт drain, пока соединение не оборвут."""
+
+    def __init__(self):
+        self.drain = asyncio.get_running_loop().create_future()
+
+    def abort(self):
+        if not self.drain.done():
+            self.drain.set_exception(ConnectionResetError('aborted'))
+
+
+class FakeRequest:
+    def __init__(self, transport):
+        self.transport = transport
+
+
+class FakeEioSocket:
+    def __init__(self, backlog):
+        self.queue = asyncio.Queue()
+        for i in range(backlog):
+            self.queue.put_nowait(i)
+        self.closed = False
+
+    async def close(self, wait=True, abort=False):
+        self.closed = True
+
+
+class FakeManager:
+    def __init__(self, participants):
+        self._participants = participants
+
+    def get_participants(self, namespace, room):
+        return list(self._participants.items())
+
+    def is_connected(self, sid, namespace):
+        return sid in self._participants
+
+
+class FakeServer:
+    def __init__(self, sockets, environ):
+        self.eio = type('Eio', (), {'sockets': sockets})()
+        self.manager = FakeManager({sid: sid for sid in sockets})
+        self._environ = environ
+
+    def get_environ(self, sid, namespace=None):
+        return self._environ.get(sid)
+
+
+def test_backlog_disconnect_unblocks_a_writer_stuck_in_send():
+    async def scenario():
+        transport = StalledTransport()
+        socket = FakeEioSocket(backlog=10)
+        sio = FakeServer({'slow': socket}, {'slow': {'aiohttp.request': FakeRequest(transport)}})
+        guard = SlowClientGuard(sio, SubscriptionRegistry(), high_watermark=2, low_watermark=1, max_backlog=5)
+
+        async def writer():
+            # Как writer Engine.IO: ws.send ждёт, пока клиент прочитает буфер
+            await transport.drain
+
+        writer_task = asyncio.create_task(writer())
+        await asyncio.sleep(0)
+
+        await guard.check()
+        await asyncio.wait_for(asyncio.gather(writer_task, return_exceptions=True), timeout=1)
+
+        assert isinstance(writer_task.exception(), ConnectionResetError)
+        assert socket.closed
+        assert socket.queue.get_nowait() is None  # накопленное выброшено, writer получает сигнал остановки
+        assert guard.stats()['disconnected'] == 1
+    asyncio.run(scenario())
+
+
+def test_slow_client_is_held_and_released():
+    async def scenario():
+        socket = FakeEioSocket(backlog=3)
+        subscriptions = SubscriptionRegistry()
+        subscriptions.set_watchlist('a', ['BTC'])
+        guard = SlowClientGuard(FakeServer({'a': socket}, {}), subscriptions, high_watermark=2, low_watermark=1)
+
+        assert await guard.check() == []
+        assert guard.held(frozenset({'BTC'})) == ['a']
+        guard.defer('a', [{'symbol': 'BTC', 'price': 2, 'previousPrice': 1}])
+        guard.defer('a', [{'symbol': 'BTC', 'price': 3, 'previousPrice': 2}])
+
+        while socket.queue.qsize() > 1:
+            socket.queue.get_nowait()
+        assert await guard.check() == [('a', [{'symbol': 'BTC', 'price': 3, 'previousPrice': 1}])]
+        assert len(guard) == 0
+    asyncio.run(scenario())
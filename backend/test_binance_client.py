@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import pytest
+import websockets
+
+import binance_client
+
+from binance_client import _StreamConnection, event_sequence
+
+
+def ticker(symbol, event_time, price):
+    return json.dumps({'stream': f'{symbol}usdt@ticker', 'data': {'e': '24hrTicker', 'E': event_time, 's': f'{symbol.upper()}USDT', 'c': price}})
+
+
+def trade(symbol, trade_id, event_time):
+    return json.dumps({'stream': f'{symbol}usdt@aggTrade', 'data': {'e': 'aggTrade', 'E': event_time, 'a': trade_id}})
+
+
+class FakeWebSocket:
+    def __init__(self, messages):
+        self._messages = list(messages)
+
+    async def recv(self):
+        if not self._messages:
+            raise RuntimeError('closed')
+        return self._messages.pop(0)
+
+    async def send(self, message):
+        pass
+
+    async def close(self):
+        pass
+
+
+def test_event_sequence():
+    assert event_sequence(ticker('btc', 5, '1')) == ('btcusdt@ticker', 5)
+    assert event_sequence(trade('btc', 42, 5)) == ('btcusdt@aggTrade', 42)
+    assert event_sequence(json.dumps({'result': None, 'id': 1})) is None
+    assert event_sequence(b'not json') is None
+
+
+def test_standby_drops_frames_the_old_connection_already_delivered():
+    async def scenario():
+        delivered = []
+
+        async def on_message(message):
+            delivered.append(message)
+
+        connection = _StreamConnection('ticker', 0, on_message)
+        streams = {'btcusdt@ticker', 'ethusdt@ticker', 'btcusdt@aggTrade'}
+        connection.streams = set(streams)
+
+        # Старое соединение, пока открывается резервное
+        connection._seen = {}
+        with pytest.raises(RuntimeError):
+            await connection._listen(FakeWebSocket([ticker('btc', 1, '100'), ticker('btc', 2, '101'), trade('btc', 7, 2)]))
+
+        reply = json.dumps({'result': list(streams), 'id': 1})
+        standby = FakeWebSocket([
+            ticker('btc', 2, '101'), trade('btc', 7, 2),   # уже доставлены
+            ticker('eth', 2, '10'),                        # стрима не было в старом потоке
+            ticker('btc', 3, '102'), trade('btc', 8, 3),
+        ])
+        delivered.clear()
+        with pytest.raises(RuntimeError):
+            await connection._serve(standby, streams, reply)
+
+        assert delivered == [reply, ticker('eth', 2, '10'), ticker('btc', 3, '102'), trade('btc', 8, 3)]
+        assert connection._replayed is None  # по всем стримам пришли новые события - проверка снята
+        assert connection._last_frame_at > 0
+    asyncio.run(scenario())
+
+
+class ClosableWebSocket:
+    """Соединение без кадров: recv ждёт, пока его не закроют."""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = asyncio.Event()
+
+    async def recv(self):
+        await self.closed.wait()
+        raise websockets.exceptions.ConnectionClosedOK(None, None)
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+    async def close(self):
+        self.closed.set()
+
+
+def test_emptied_shard_closes_without_a_gap(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(binance_client, 'BINANCE_CONNECTION_MAX_AGE_SECONDS', 0)
+        monkeypatch.setattr(binance_client, 'MAX_CONTROL_MESSAGES_PER_SECOND', 1000)
+        reconnects = []
+        sockets = []
+
+        async def connect():
+            sockets.append(ClosableWebSocket())
+            return sockets[-1], set(connection.streams), None
+
+        async def on_message(message):
+            pass
+
+        connection = _StreamConnection('ticker', 0, on_message, idle_timeout=0.05,
+                                       on_reconnect=lambda streams, gap_started: reconnects.append(streams))
+        monkeypatch.setattr(connection, '_connect', connect)
+        errors = binance_client.RECONNECTS._default.value
+        connection.streams = {'btcusdt@ticker'}
+        connection.start()
+        while not connection._active:
+            await asyncio.sleep(0.01)
+
+        # Убрали все стримы: соединение закрывается, а не обрывается сторожем спустя idle_timeout
+        connection.streams = set()
+        connection.mark_changed()
+        await asyncio.sleep(0.2)
+        assert sockets[0].closed.is_set()
+        assert sockets[0].sent[-1]['method'] == 'UNSUBSCRIBE'
+        assert len(sockets) == 1
+
+        # Новая подписка - новое соединение без догрузки старого пропуска
+        connection.streams = {'ethusdt@ticker'}
+        connection.mark_changed()
+        await asyncio.sleep(0.1)
+        await connection.stop()
+        assert len(sockets) == 2
+        assert reconnects == []
+        assert binance_client.RECONNECTS._default.value == errors
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+from candles import CandleRing, CandleStore
+
+
+def test_ticks_in_one_bucket_update_the_candle():
+    ring = CandleRing(60, capacity=3)
+    ring.add(120.0, 10.0, 1.0)
+    ring.add(150.0, 12.0, 2.0)
+    ring.add(179.0, 9.0, 0.5)
+    ring.add(100.0, 50.0, 9.0)  # запоздавший тик из закрытой свечи
+
+    assert ring.query() == [[120.0, 10.0, 12.0, 9.0, 9.0, 3.5]]
+
+
+def test_ring_rolls_over_oldest_candles():
+    ring = CandleRing(60, capacity=3)
+    for minute, price in enumerate((1.0, 2.0, 3.0, 4.0, 5.0)):
+        ring.add(minute * 60.0, price, 1.0)
+
+    assert ring.count == 3
+    assert ring.closes() == [3.0, 4.0, 5.0]
+    assert ring.closes(limit=2) == [4.0, 5.0]
+    assert [row[0] for row in ring.query(start=150.0)] == [180.0, 240.0]
+    assert ring.query(limit=1) == [[240.0, 5.0, 5.0, 5.0, 5.0, 1.0]]
+
+
+def test_price_at_searches_across_the_wrap():
+    ring = CandleRing(60, capacity=3)
+    for minute, price in enumerate((1.0, 2.0, 3.0, 4.0)):
+        ring.add(minute * 60.0, price, 0.0)
+
+    assert ring.price_at(59.0) is None  # свеча 0 уже вытеснена
+    assert ring.price_at(60.0) == 2.0
+    assert ring.price_at(179.0) == 3.0
+    assert ring.price_at(10_000.0) == 4.0
+
+
+def test_store_volume_from_quote_volume_increments():
+    store = CandleStore(capacity={'1s': 10, '1m': 10, '5m': 10})
+    store.add_tick('BTC', 0.0, 100.0, quote_volume=1000.0)
+    store.add_tick('BTC', 1.0, 101.0, quote_volume=1500.0)
+    store.add_tick('BTC', 2.0, 102.0, quote_volume=1200.0)  # окно 24ч сдвинулось - не отрицательный объём
+
+    assert store.get('BTC', '1m').volumes() == [500.0]
+    assert [row[5] for row in store.query('BTC', '1s')] == [0.0, 500.0, 0.0]
+    store.discard('BTC')
+    assert store.query('BTC', '1m') == []
@@ -0,0 +1,32 @@
+import pytest
+
+import codec
+
+DECODERS = [codec.JsonTickerDecoder]
+if codec.msgspec is not None:
+    DECODERS.append(codec.MsgspecTickerDecoder)
+
+
+@pytest.fixture(params=DECODERS, ids=lambda cls: cls.__name__)
+def decoder(request):
+    return request.param()
+
+
+def test_decodes_single_and_array_streams(decoder):
+    single = b'{"stream":"btcusdt@ticker","data":{"s":"BTCUSDT","c":"100.5","P":"1.5","q":"10","E":1}}'
+    array = b'{"stream":"!miniTicker@arr","data":[{"s":"ETHUSDT","c":"110","o":"100","q":"5","E":2}]}'
+
+    assert decoder.decode(single) == [('BTCUSDT', 100.5, 1.5, 10.0, 1)]
+    assert decoder.decode(array) == [('ETHUSDT', 110.0, pytest.approx(10.0), 5.0, 2)]
+
+
+@pytest.mark.parametrize('raw', [
+    b'{"result":null,"id":1}',
+    b'{"data":',
+    b'not json',
+    b'[1, 2, 3]',
+    b'"text"',
+    b'{"data":[1, "x", null]}',
+])
+def test_malformed_frames_are_skipped(decoder, raw):
+    assert decoder.decode(raw) == []
@@ -0,0 +1,53 @@
+from candles import CandleStore
+from conditions import ConditionIndex, validate_condition
+
+
+def test_columns_survive_growth_and_removal():
+    index = ConditionIndex(candle_store=None)
+    alerts = [index.add('a', 'BTC', 'trade_size', 1000 * (i + 1), 0, 'any', 0) for i in range(10)]
+    for alert in alerts[::2]:
+        index.remove(alert.key)
+
+    fired = index.evaluate_trade('BTC', 100.0, 55.0, False, now=1.0)  # сделка на 5500 USDT
+
+    assert sorted(alert.threshold for alert, _ in fired) == [2000, 4000]
+    assert all(value == 5500 for _, value in fired)
+
+
+def test_fire_state_is_kept_between_evaluations():
+    index = ConditionIndex(candle_store=None)
+    index.add('a', 'BTC', 'trade_size', 1000, 0, 'up', 60)
+
+    assert len(index.evaluate_trade('BTC', 100.0, 20.0, False, now=1.0)) == 1
+    assert index.evaluate_trade('BTC', 100.0, 20.0, False, now=2.0) == []  # cooldown
+    assert index.evaluate_trade('BTC', 100.0, 20.0, True, now=100.0) == []  # продажа, алерт на покупки
+    assert len(index.evaluate_trade('BTC', 100.0, 20.0, False, now=100.0)) == 1
+
+
+def test_validation():
+    assert validate_condition('pct_change', 5, 300, 'up') is None
+    assert validate_condition('pct_change', 5, 0, 'up') is not None
+    assert validate_condition('depth_imbalance', 1.5, 10, 'up') is not None
+    assert validate_condition('ma_cross', 0, 300, 'any') is not None
+
+
+def test_window_is_limited_by_candle_history():
+    assert validate_condition('pct_change', 5, 24 * 3600, 'up') is None
+    assert validate_condition('pct_change', 5, 72 * 3600, 'up') is not None
+    assert validate_condition('ma_cross', 0, 6 * 3600, 'up') is None
+    assert validate_condition('ma_cross', 0, 24 * 3600, 'up') is not None
+    assert validate_condition('volume_spike', 3, 24 * 3600, 'any') is not None
+
+
+def test_long_pct_change_window_uses_five_minute_candles():
+    store = CandleStore()
+    index = ConditionIndex(store)
+    index.add('a', 'BTC', 'pct_change', 5, 24 * 3600, 'up', 0)
+    start = 1_000_000 * 300
+    for minute in range(48 * 60):
+        store.add_tick('BTC', start + minute * 60, 100.0)
+
+    now = start + 48 * 3600
+    fired = index.evaluate('BTC', 110.0, now)
+
+    assert [round(value) for _, value in fired] == [10]
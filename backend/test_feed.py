@@ -0,0 +1,89 @@
+import asyncio
+
+import feed
+from feed import FeedHub, FeedClient
+
+
+async def until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+def test_worker_symbols_ticks_and_calls(tmp_path):
+    async def scenario():
+        worker_symbols = {}
+
+        async def call_handler(name, client_id, data):
+            return {'name': name, 'client_id': client_id, 'data': data}
+
+        hub = FeedHub(str(tmp_path / 'feed.sock'), lambda worker_id, symbols: worker_symbols.update({worker_id: symbols}),
+                      call_handler)
+        await hub.start()
+        ticks, connects = [], []
+        client = FeedClient(str(tmp_path / 'feed.sock'), on_connect=lambda: connects.append(1))
+
+        async def on_ticks(raw):
+            ticks.append(raw)
+
+        task = asyncio.create_task(client.run(on_ticks))
+        await until(lambda: connects)
+        client.set_symbols({'BTC', 'ETH'})
+        await until(lambda: worker_symbols.get(1) == {'BTC', 'ETH'})
+
+        hub.broadcast_symbols({'BTC', 'ETH', 'SOL'})
+        hub.broadcast_ticks('{"data": []}')
+        await until(lambda: ticks)
+        assert ticks == [b'{"data": []}']
+        assert client.symbols() == {'BTC', 'ETH', 'SOL'}
+
+        assert await client.call('prices', 'c1', ['BTC']) == {'name': 'prices', 'client_id': 'c1', 'data': ['BTC']}
+
+        task.cancel()
+        await until(lambda: 1 not in hub._workers)
+        assert worker_symbols[1] == set()  # отключившийся воркер больше ничего не держит
+        await hub.stop()
+    asyncio.run(scenario())
+
+
+def test_client_reconnects_and_resends_symbols(tmp_path, monkeypatch):
+    monkeypatch.setattr(feed, 'RECONNECT_DELAY_SECONDS', 0.01)
+
+    async def scenario():
+        path = str(tmp_path / 'feed.sock')
+        worker_symbols = {}
+        answer = asyncio.Event()
+
+        async def call_handler(name, client_id, data):
+            await answer.wait()  # ingest не успевает ответить до обрыва
+
+        hub = FeedHub(path, lambda worker_id, symbols: worker_symbols.update({worker_id: symbols}), call_handler)
+        await hub.start()
+        connects = []
+        client = FeedClient(path, on_connect=lambda: connects.append(1))
+
+        async def on_ticks(raw):
+            pass
+
+        task = asyncio.create_task(client.run(on_ticks))
+        await until(lambda: connects)
+        client.set_symbols({'BTC'})
+        await until(lambda: worker_symbols.get(1) == {'BTC'})
+        pending = asyncio.create_task(client.call('client_state', 'c1'))
+        await asyncio.sleep(0.05)
+
+        await hub.stop()
+        assert await pending is None  # незавершённый вызов не висит до таймаута
+
+        restarted_symbols = {}
+        hub = FeedHub(path, lambda worker_id, symbols: restarted_symbols.update({worker_id: symbols}), call_handler)
+        await hub.start()
+        await until(lambda: len(connects) == 2)
+        await until(lambda: restarted_symbols.get(1) == {'BTC'})  # набор символов переотправлен
+        assert client.stats()['reconnects'] >= 1
+
+        task.cancel()
+        answer.set()
+        await hub.stop()
+    asyncio.run(scenario())
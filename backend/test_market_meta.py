@@ -0,0 +1,107 @@
+import asyncio
+import gzip
+import json
+
+import market_meta
+from binance_rest import RestResponse, EXCHANGE_INFO_URL, ASSETS_URL
+from market_meta import MarketMetadata
+
+
+def exchange_info(*bases):
+    return json.dumps({'symbols': [
+        {'baseAsset': base, 'quoteAsset': 'USDT', 'status': 'TRADING'} for base in bases
+    ]}).encode()
+
+
+def assets(**names):
+    return json.dumps({'data': [{'assetCode': code, 'assetName': name} for code, name in names.items()]}).encode()
+
+
+def serve(monkeypatch, responses):
+    """Подменяет fetch: responses - {url: RestResponse}; запросы складываются в список."""
+    requests = []
+
+    async def fake_fetch(session, url, params=None, headers=None, timeout=10):
+        requests.append((url, headers))
+        return responses[url]
+
+    monkeypatch.setattr(market_meta, 'fetch', fake_fetch)
+    return requests
+
+
+def test_truncated_cache_is_treated_as_missing(tmp_path):
+    path = tmp_path / 'market.json.gz'
+    path.write_bytes(gzip.compress(json.dumps({'version': market_meta.CACHE_VERSION, 'symbols': ['BTC']}).encode())[:20])
+
+    assert MarketMetadata(str(path)).load() is None
+
+
+def test_refresh_writes_cache_that_loads_back(tmp_path, monkeypatch):
+    path = str(tmp_path / 'market.json.gz')
+    serve(monkeypatch, {
+        EXCHANGE_INFO_URL: RestResponse(200, {'ETag': '"a"'}, exchange_info('BTC', 'ETH')),
+        ASSETS_URL: RestResponse(200, {}, assets(BTC='Bitcoin')),
+    })
+    market = MarketMetadata(path)
+    change = asyncio.run(market.refresh(None))
+    assert change.listed == {'BTC', 'ETH'}
+
+    restored = MarketMetadata(path)
+    assert restored.load().listed == {'BTC', 'ETH'}
+    assert restored.names == {'BTC': 'Bitcoin'}
+    assert list(tmp_path.iterdir()) == [tmp_path / 'market.json.gz']  # временный файл не остался
+
+
+def test_not_modified_still_advances_updated_at_and_validators(tmp_path, monkeypatch):
+    path = str(tmp_path / 'market.json.gz')
+    serve(monkeypatch, {
+        EXCHANGE_INFO_URL: RestResponse(200, {'ETag': '"a"'}, exchange_info('BTC')),
+        ASSETS_URL: RestResponse(200, {}, assets(BTC='Bitcoin')),
+    })
+    market = MarketMetadata(path)
+    asyncio.run(market.refresh(None))
+    first_check = market.updated_at
+
+    requests = serve(monkeypatch, {
+        EXCHANGE_INFO_URL: RestResponse(304, {'ETag': '"b"'}, b''),
+        ASSETS_URL: RestResponse(200, {}, assets(BTC='Bitcoin')),
+    })
+    assert not asyncio.run(market.refresh(None))
+    assert dict(requests)[EXCHANGE_INFO_URL] == {'If-None-Match': '"a"'}
+
+    restored = MarketMetadata(path)
+    restored.load()
+    assert restored.updated_at > first_check
+    assert restored._validators[EXCHANGE_INFO_URL]['etag'] == '"b"'
+
+
+def test_rejected_exchange_info_is_not_remembered_as_seen(tmp_path, monkeypatch):
+    market = MarketMetadata(str(tmp_path / 'market.json.gz'))
+    serve(monkeypatch, {
+        EXCHANGE_INFO_URL: RestResponse(200, {}, exchange_info('BTC', 'ETH', 'SOL')),
+        ASSETS_URL: RestResponse(200, {}, assets()),
+    })
+    asyncio.run(market.refresh(None))
+    digest = market._validators[EXCHANGE_INFO_URL]['digest']
+
+    # Пропала большая часть пар - ответ отброшен, и его хэш не должен считаться уже виденным
+    serve(monkeypatch, {
+        EXCHANGE_INFO_URL: RestResponse(200, {}, exchange_info('BTC')),
+        ASSETS_URL: RestResponse(200, {}, assets()),
+    })
+    assert not asyncio.run(market.refresh(None))
+    assert market.symbols == {'BTC', 'ETH', 'SOL'}
+    assert market._validators[EXCHANGE_INFO_URL]['digest'] == digest
+
+
+def test_rejected_exchange_info_is_logged_once(tmp_path, monkeypatch, caplog):
+    market = MarketMetadata(str(tmp_path / 'market.json.gz'))
+    market.symbols.update({'BTC', 'ETH', 'SOL'})
+    serve(monkeypatch, {
+        EXCHANGE_INFO_URL: RestResponse(200, {}, exchange_info('BTC')),
+        ASSETS_URL: RestResponse(200, {}, assets()),
+    })
+    change = asyncio.run(market.refresh(None))
+
+    assert change.symbols_rejected and not change
+    assert len([r for r in caplog.records if 'Ignoring exchange info' in r.getMessage()]) == 1
@@ -0,0 +1,12 @@
+import metrics
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter('test_escape_total', 'Line one\nback\\slash', ('reason',))
+    counter.labels('say "hi"\\now\nplease').inc()
+
+    assert counter.render() == [
+        '# HELP test_escape_total Line one\\nback\\\\slash',
+        '# TYPE test_escape_total counter',
+        'test_escape_total{reason="say \\"hi\\"\\\\now\\nplease"} 1',
+    ]
@@ -0,0 +1,109 @@
+import asyncio
+import math
+
+import order_book
+from alert_engine import AlertEngine
+from candles import CandleStore
+from order_book import OrderBook, OrderBookSync
+
+
+def snapshot(last_update_id, bids=(), asks=()):
+    return {'lastUpdateId': last_update_id, 'bids': list(bids), 'asks': list(asks)}
+
+
+def test_book_sides_keep_best_price_and_remove_empty_levels():
+    book = OrderBook('BTC', snapshot(1, bids=[['99', '1'], ['98', '2']], asks=[['101', '1'], ['102', '3']]))
+    book.apply([['100', '4'], ['99', '0']], [['101', '0']], 2)
+
+    assert book.bids.best() == 100.0
+    assert book.asks.best() == 102.0
+    assert book.mid_price() == 101.0
+    assert book.bids.volume(2) == 6.0
+    assert book.last_update_id == 2
+
+
+def test_empty_side_has_no_mid_price_but_full_imbalance():
+    book = OrderBook('BTC', snapshot(1, bids=[['99', '1']]))
+    assert book.mid_price() is None
+    assert math.isnan(book.spread_percent())
+    assert book.imbalance(5) == 1.0
+
+
+def test_buffered_events_replayed_from_snapshot_id():
+    async def scenario():
+        loaded = asyncio.Event()
+
+        async def fetch_snapshot(symbol):
+            await loaded.wait()
+            return snapshot(105, bids=[['99', '1']], asks=[['101', '1']])
+
+        sync = OrderBookSync(fetch_snapshot)
+        # Пока грузится снимок, события копятся; u <= lastUpdateId отбрасываются при проигрывании
+        assert sync.on_event('BTC', 100, 104, [['99', '5']], []) is None
+        assert sync.on_event('BTC', 105, 107, [['100', '2']], []) is None
+        loaded.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        book = sync.get('BTC')
+        assert book is not None and book.last_update_id == 107
+        assert book.bids.best() == 100.0 and book.bids.volume(2) == 3.0
+
+        assert sync.on_event('BTC', 100, 107, [['1', '1']], []) is None  # уже применённое событие
+        assert sync.on_event('BTC', 108, 110, [], [['100.5', '1']]) is book
+        assert book.asks.best() == 100.5
+    asyncio.run(scenario())
+
+
+def test_gap_drops_book_and_resyncs():
+    async def scenario():
+        snapshots = [snapshot(10, bids=[['99', '1']]), snapshot(20, bids=[['98', '1']])]
+
+        async def fetch_snapshot(symbol):
+            return snapshots.pop(0)
+
+        sync = OrderBookSync(fetch_snapshot)
+        sync.on_event('BTC', 9, 11, [], [])
+        await asyncio.sleep(0)
+        assert sync.get('BTC').last_update_id == 11
+
+        gaps_before = order_book.GAPS._default.value
+        assert sync.on_event('BTC', 15, 21, [], []) is None  # ожидалось 12
+        assert sync.get('BTC') is None
+        assert order_book.GAPS._default.value == gaps_before + 1
+        await asyncio.sleep(0)
+        book = sync.get('BTC')
+        assert book.last_update_id == 21 and book.bids.best() == 98.0
+    asyncio.run(scenario())
+
+
+def test_stale_snapshot_is_refetched(monkeypatch):
+    monkeypatch.setattr(order_book, 'STALE_SNAPSHOT_RETRY_SECONDS', 0)
+
+    async def scenario():
+        snapshots = [snapshot(5), snapshot(30)]
+
+        async def fetch_snapshot(symbol):
+            return snapshots.pop(0)
+
+        sync = OrderBookSync(fetch_snapshot)
+        sync.on_event('BTC', 20, 25, [], [])  # снимок 5 старее: между ним и событием пропуск
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert sync.get('BTC').last_update_id == 30
+        assert not snapshots
+    asyncio.run(scenario())
+
+
+def test_book_condition_on_empty_side_uses_last_price():
+    fired = []
+    engine = AlertEngine(last_prices_ref={'BTC': 100.0}, candle_store=CandleStore(),
+                         on_condition_trigger=lambda alerts, price: fired.append(price))
+    engine.add_condition('a', 'BTC', 'depth_imbalance', 0.5, 5, 'any', 0)
+    engine.add_condition('a', 'ETH', 'depth_imbalance', 0.5, 5, 'any', 0)
+    only_bids = OrderBook('BTC', snapshot(1, bids=[['99', '1']]))
+
+    engine.process_book('BTC', only_bids, now=1.0)
+    engine.process_book('ETH', only_bids, now=1.0)  # цены ещё нет - не проверяем
+
+    assert fired == [100.0]
@@ -0,0 +1,45 @@
+import asyncio
+
+from publisher import PriceUpdatePublisher
+from subscriptions import SubscriptionRegistry
+
+
+def tick(symbol, price, previous):
+    return {'symbol': symbol, 'price': price, 'previousPrice': previous, 'priceChangePercent': 0.0}
+
+
+def make_publisher(batches, history_size=300):
+    """Публикует пакеты без подключённых клиентов: рассылки нет, история и seq ведутся."""
+    publisher = PriceUpdatePublisher(None, SubscriptionRegistry(), history_size=history_size)
+    for batch in batches:
+        for payload in batch:
+            publisher.publish(payload['symbol'], payload)
+        asyncio.run(publisher.flush())
+    return publisher
+
+
+def test_ticks_inside_interval_are_coalesced():
+    publisher = make_publisher([[tick('BTC', 101, 100), tick('BTC', 102, 101)]])
+    assert publisher.seq == 1
+    assert publisher.changes_since(publisher.epoch, 0, {'BTC'}) == [tick('BTC', 102, 100)]
+    assert publisher.ticks_superseded == 1
+
+
+def test_changes_since_merges_missed_batches_for_watchlist():
+    publisher = make_publisher([
+        [tick('BTC', 101, 100), tick('ETH', 10, 9)],
+        [tick('BTC', 103, 101)],
+        [tick('SOL', 5, 4)],
+    ])
+    assert publisher.changes_since(publisher.epoch, 1, {'BTC', 'ETH'}) == [tick('BTC', 103, 101)]
+    assert publisher.changes_since(publisher.epoch, 0, {'BTC'}) == [tick('BTC', 103, 100)]
+    assert publisher.changes_since(publisher.epoch, 3, {'BTC'}) == []
+
+
+def test_changes_since_needs_snapshot_when_history_is_not_enough():
+    publisher = make_publisher([[tick('BTC', 100 + i, 99 + i)] for i in range(5)], history_size=3)
+    assert publisher.changes_since(publisher.epoch, 1, {'BTC'}) is None  # пакет 2 уже вытеснен
+    assert publisher.changes_since(publisher.epoch, 2, {'BTC'}) == [tick('BTC', 104, 101)]
+    assert publisher.changes_since('other-epoch', 4, {'BTC'}) is None  # сервер перезапущен
+    assert publisher.changes_since(publisher.epoch, 6, {'BTC'}) is None  # seq из будущего
+    assert publisher.changes_since(publisher.epoch, -1, {'BTC'}) is None
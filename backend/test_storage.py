@@ -0,0 +1,64 @@
+import asyncio
+
+from storage import AlertStore
+
+
+def open_store(path):
+    store = AlertStore(str(path), flush_interval=0)
+    store.open()
+    return store
+
+
+def test_writes_are_coalesced_and_flushed_in_one_batch(tmp_path):
+    store = open_store(tmp_path / 'alerts.db')
+    store.save_alert('a', 'BTC', 100.0)
+    store.save_alert('a', 'BTC', 110.0)
+    store.delete_alert('a', 'BTC', 110.0)  # та же операция по ключу - остаётся только удаление
+    store.save_client_symbols('a', ['BTC'])
+    store.save_client_symbols('a', ['BTC', 'ETH'])
+    assert len(store) == 3
+
+    asyncio.run(store.flush())
+
+    assert len(store) == 0
+    state = store.load()
+    assert state['alerts'] == [('a', 'BTC', 100.0)]
+    assert state['client_symbols'] == {'a': ['BTC', 'ETH']}
+    store.close()
+
+
+def test_state_survives_restart(tmp_path):
+    path = tmp_path / 'alerts.db'
+    store = open_store(path)
+    store.save_alert('a', 'ETH', 2000.0)
+    store.save_chat_symbols('42', {'SOL', 'BTC'})
+    store.save_chat_symbols('43', {'ADA'})
+    store.save_chat_symbols('43', set())  # пустой список удаляет чат
+    store.save_last_triggered('a', 'ETH', 1900.0)
+    store.close()  # незаписанное сбрасывается при закрытии
+
+    restored = open_store(path)
+    state = restored.load()
+    assert state['alerts'] == [('a', 'ETH', 2000.0)]
+    assert state['telegram_chats'] == {'42': ['BTC', 'SOL']}
+    assert state['last_triggered'] == {'a': {'ETH': 1900.0}}
+    restored.close()
+
+
+def test_failed_flush_keeps_newer_writes(tmp_path):
+    store = open_store(tmp_path / 'alerts.db')
+    store.save_client_symbols('a', ['BTC'])
+
+    def fail(batch):
+        # Пока пишется пакет, клиент успел сменить список
+        store.save_client_symbols('a', ['ETH'])
+        raise OSError('disk full')
+
+    store._write_batch, write_batch = fail, store._write_batch
+    asyncio.run(store.flush())
+    store._write_batch = write_batch
+
+    assert len(store) == 1
+    asyncio.run(store.flush())
+    assert store.load()['client_symbols'] == {'a': ['ETH']}
+    store.close()
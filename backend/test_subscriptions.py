@@ -0,0 +1,41 @@
+from subscriptions import SubscriptionRegistry, watchlist_room
+
+
+def test_symbols_are_refcounted_across_subscribers():
+    registry = SubscriptionRegistry()
+    assert registry.set_watchlist('a', ['BTC', 'ETH']) == ({'BTC', 'ETH'}, set())
+    registry.set_watchlist('b', ['BTC'])
+
+    joined, left = registry.set_watchlist('a', ['ETH', 'SOL'])
+    assert (joined, left) == ({'SOL'}, {'BTC'})
+    assert registry.subscriber_count('BTC') == 1
+    assert registry.symbols() == {'BTC', 'ETH', 'SOL'}
+
+    assert registry.remove('b') == {'BTC'}
+    assert registry.symbols() == {'ETH', 'SOL'}
+    assert registry.subscriber_count('BTC') == 0
+
+
+def test_client_watchlists_group_identical_lists_and_skip_service_keys():
+    registry = SubscriptionRegistry()
+    registry.set_watchlist('a', ['BTC', 'ETH'])
+    registry.set_watchlist('b', ['ETH', 'BTC'])
+    registry.set_watchlist('__alerts__', ['DOGE'], service=True)
+
+    assert list(registry.client_watchlists()) == [frozenset({'BTC', 'ETH'})]
+    assert 'DOGE' in registry.symbols()
+
+    registry.remove('a')
+    assert list(registry.client_watchlists()) == [frozenset({'BTC', 'ETH'})]
+    registry.remove('b')
+    assert not registry.client_watchlists()
+
+    # Служебный ключ после remove снова может стать обычным подписчиком
+    registry.remove('__alerts__')
+    registry.set_watchlist('__alerts__', ['DOGE'])
+    assert list(registry.client_watchlists()) == [frozenset({'DOGE'})]
+
+
+def test_watchlist_room_ignores_order():
+    assert watchlist_room(['BTC', 'ETH']) == watchlist_room({'ETH', 'BTC'})
+    assert watchlist_room(['BTC']) != watchlist_room(['ETH'])
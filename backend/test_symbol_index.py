@@ -0,0 +1,44 @@
+import time
+
+import symbol_index
+from symbol_index import SymbolSearchIndex
+
+NAMES = {'BTC': 'Bitcoin', 'ETH': 'Ethereum', 'WBTC': 'Wrapped Bitcoin', 'BTT': 'BitTorrent', 'SOL': 'Solana'}
+
+
+def build():
+    return SymbolSearchIndex(NAMES, NAMES)
+
+
+def matches(results):
+    return [(r['symbol'], r['match']) for r in results]
+
+
+def test_exact_ticker_ranks_first():
+    assert matches(build().search('btc'))[0] == ('BTC', 'exact')
+
+
+def test_ticker_and_name_prefixes():
+    index = build()
+    assert ('BTT', 'prefix') in matches(index.search('BT'))
+    assert matches(index.search('ethe')) == [('ETH', 'name')]
+    # Префикс слова внутри названия
+    assert ('WBTC', 'name') in matches(index.search('bitc'))
+
+
+def test_fuzzy_match_for_typo():
+    assert matches(build().search('SOLL')) == [('SOL', 'fuzzy')]
+    assert build().search('XYZQ') == []
+
+
+def test_long_query_is_truncated_and_skips_fuzzy(monkeypatch):
+    index = build()
+    calls = []
+    deletes = symbol_index._deletes
+    monkeypatch.setattr(symbol_index, '_deletes', lambda word, depth: calls.append(word) or deletes(word, depth))
+
+    started = time.perf_counter()
+    assert index.search('Q' * 1000) == []
+    assert time.perf_counter() - started < 0.5
+    assert calls == []  # запрос длиннее любого тикера - словарь удалений не нужен
+    assert index.search('bitcoin' + 'x' * 100) == []
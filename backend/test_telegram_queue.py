@@ -0,0 +1,67 @@
+import asyncio
+
+from telegram.error import BadRequest
+
+from telegram_queue import TelegramDeliveryQueue, TokenBucket
+
+
+def test_token_bucket_rate_and_capacity():
+    bucket = TokenBucket(rate=2, capacity=2)
+    now = bucket.updated
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.delay(now) == 0.5
+    assert bucket.delay(now + 0.5) == 0
+    # Запас не копится сверх capacity
+    assert bucket.delay(now + 100) == 0
+    assert bucket.tokens == 2
+
+
+def test_token_bucket_pause():
+    bucket = TokenBucket(rate=1)
+    now = bucket.updated
+    bucket.pause(now + 5)
+    assert bucket.delay(now + 1) == 4
+    assert not bucket.is_idle(now + 1)
+    assert bucket.is_idle(now + 5)
+
+
+class FakeBot:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        if self.error is not None:
+            raise self.error
+        self.sent.append((chat_id, text))
+
+
+def deliver(bot, messages):
+    async def run():
+        queue = TelegramDeliveryQueue(lambda: bot, coalesce_window=0.01)
+        for chat_id, text in messages:
+            queue.enqueue(chat_id, text)
+        task = asyncio.create_task(queue.run())
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if not len(queue):
+                break
+        task.cancel()
+        return queue
+
+    return asyncio.run(run())
+
+
+def test_messages_to_one_chat_are_coalesced():
+    bot = FakeBot()
+    queue = deliver(bot, [(1, 'a'), (1, 'b'), (2, 'c')])
+    assert sorted(bot.sent) == [('1', 'a\nb'), ('2', 'c')]
+    assert len(queue) == 0 and queue.sent_messages == 3 and queue.sent_requests == 2
+
+
+def test_failed_batches_settle_queue_depth():
+    for error in (BadRequest('chat not found'), RuntimeError('unexpected')):
+        queue = deliver(FakeBot(error), [(1, 'a'), (1, 'b')])
+        assert len(queue) == 0
+        assert queue.failed == 2
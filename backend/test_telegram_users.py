@@ -0,0 +1,54 @@
+from alert_engine import AlertEngine
+from telegram_users import MAX_WATCHLIST_SYMBOLS, TelegramUsers
+
+
+class FakeStore:
+    def __init__(self):
+        self.alerts = []
+        self.chats = {}
+
+    def save_alert(self, owner, symbol, price):
+        self.alerts.append((owner, symbol, price))
+
+    def delete_alert(self, owner, symbol, price):
+        self.alerts.remove((owner, symbol, price))
+
+    def save_chat_symbols(self, chat_id, symbols):
+        self.chats[chat_id] = sorted(symbols)
+
+
+def make_users():
+    changes = []
+    users = TelegramUsers(AlertEngine(), FakeStore(), set(), on_change=lambda: changes.append(1))
+    return users, changes
+
+
+def test_watch_limits_list_and_indexes_watchers():
+    users, changes = make_users()
+    symbols = [f"S{i}" for i in range(MAX_WATCHLIST_SYMBOLS + 5)]
+
+    assert users.watch('1', symbols) == symbols[:MAX_WATCHLIST_SYMBOLS]
+    assert users.watch('1', ['EXTRA']) == []
+    assert users.chats_watching('S0') == {'1'}
+    assert users.unwatch('1', ['S0', 'MISSING']) == ['S0']
+    assert users.chats_watching('S0') == set()
+    assert len(changes) == 2
+
+
+def test_alert_adds_symbol_to_watchlist():
+    users, changes = make_users()
+    assert users.add_alert('1', 'BTC', 100.0) is not None
+    assert users.watchlist('1') == ['BTC']
+    assert users.add_alert('1', 'BTC', 100.0) is None
+    assert len(changes) == 1
+
+
+def test_alert_on_full_watchlist_still_refreshes_subscriptions():
+    users, changes = make_users()
+    users.watch('1', [f"S{i}" for i in range(MAX_WATCHLIST_SYMBOLS)])
+    changes.clear()
+
+    assert users.add_alert('1', 'NEW', 5.0) is not None
+
+    assert 'NEW' not in users.watchlist('1')
+    assert changes == [1]  # без пересчёта подписок символ алерта не попал бы в стримы
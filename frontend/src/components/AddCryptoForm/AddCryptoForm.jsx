@@ -1,15 +1,46 @@
 import { useState, useEffect, useRef, forwardRef } from 'react'; // 1. Импортируем forwardRef
 import './AddCryptoForm.css';
+import { API_BASE_URL } from '../../config';
+
+const SUGGEST_DEBOUNCE_MS = 150;
 
 // 2. Оборачиваем компонент в forwardRef и принимаем 'ref' как второй аргумент
 const AddCryptoForm = forwardRef(({ onAdd, onCancel, isAdding }, ref) => {
   const [inputValue, setInputValue] = useState('');
+  const [suggestions, setSuggestions] = useState([]);
   const inputRef = useRef(null);
 
   useEffect(() => {
     inputRef.current?.focus();
   }, []);
 
+  // Подсказки с сервера: запрос уходит после паузы в наборе, устаревший ответ отменяется
+  useEffect(() => {
+    const query = inputValue.trim();
+    if (!query) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(
+          `${API_BASE_URL}/api/search_symbols?q=${encodeURIComponent(query)}&limit=8`,
+          { signal: controller.signal }
+        );
+        if (!response.ok) return;
+        const data = await response.json();
+        setSuggestions(data.results || []);
+      } catch (error) {
+        if (error.name !== 'AbortError') setSuggestions([]);
+      }
+    }, SUGGEST_DEBOUNCE_MS);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [inputValue]);
+
   const handleSubmit = (e) => {
     e.preventDefault();
     if (inputValue.trim() && !isAdding) {
@@ -38,6 +69,18 @@ const AddCryptoForm = forwardRef(({ onAdd, onCancel, isAdding }, ref) => {
             autoComplete="off"
             disabled={isAdding}
           />
+          {suggestions.length > 0 && !isAdding && (
+            <ul className="symbol-suggestions">
+              {suggestions.map((item) => (
+                <li key={item.symbol}>
+                  <button type="button" onClick={() => onAdd(item.symbol)}>
+                    <span className="suggestion-symbol">{item.symbol}</span>
+                    <span className="suggestion-name">{item.name}</span>
+                  </button>
+                </li>
+              ))}
+            </ul>
+          )}
           <div className="form-buttons">
             <button
               type="button"
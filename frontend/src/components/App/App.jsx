@@ -8,13 +8,12 @@ import {
 } from 'react';
 import { Toaster, toast } from 'react-hot-toast';
 import { CSSTransition, TransitionGroup } from 'react-transition-group';
-import { socket } from '../../socket.js';
+import { socket, rememberPriceSeq } from '../../socket.js';
 import './App.css';
 import CryptoCard from '../CryptoCard/CryptoCard.jsx';
 import AddCryptoForm from '../AddCryptoForm/AddCryptoForm.jsx';
 import SearchBar from '../SearchBar/SearchBar.jsx';
 import SortControls from '../SortControls/SortControls.jsx';
-import { sendMessage as sendTelegramMessageViaBackend } from '../../services/telegramService.js';
 import notificationSound from '../../assets/notification.mp3';
 
 const DEFAULT_SYMBOLS = [
@@ -110,7 +109,8 @@ export default function App() {
   });
 
   const audioRef = useRef(null);
-  const triggeredAlertsRef = useRef({});
+  const alertsRef = useRef(alerts);
+  const cryptosRef = useRef(cryptos);
   const isInitialMount = useRef(true);
   const addFormNodeRef = useRef(null);
 
@@ -152,7 +152,6 @@ export default function App() {
       const updatedAlerts = (prev[pair] || []).filter(
         (a) => a.price !== targetPriceToRemove,
       );
-      delete triggeredAlertsRef.current[`${pair}-${targetPriceToRemove}`];
       if (updatedAlerts.length === 0) {
         const { [pair]: _, ...rest } = prev;
         return rest;
@@ -191,10 +190,19 @@ export default function App() {
     };
     document.addEventListener('click', unlockAudio);
 
-    const onConnect = () => setIsConnected(true);
+    const onConnect = () => {
+      setIsConnected(true);
+      // Сервер проверяет алерты сам, поэтому после (пере)подключения отправляем ему актуальный список
+      socket.emit('sync_alerts', { alerts: alertsRef.current });
+      // Список символов у каждого клиента свой, сервер должен знать его с первого подключения
+      socket.emit('resubscribe', {
+        symbols: cryptosRef.current.map((c) => c.symbol),
+      });
+    };
     const onDisconnect = () => setIsConnected(false);
 
     const onInitialPrices = (data) => {
+      rememberPriceSeq(data?.epoch, data?.seq);
       if (data?.cryptos) {
         setCryptos((currentList) =>
           currentList.map((existingCrypto) => {
@@ -215,10 +223,17 @@ export default function App() {
       }
     };
 
-    const onPriceUpdate = (update) => {
+    // Сервер присылает пачку последних состояний символов раз в интервал рассылки
+    const onPriceUpdates = (data) => {
+      rememberPriceSeq(data?.epoch, data?.seq);
+      if (!data?.updates?.length) return;
+      const updatesBySymbol = new Map(
+        data.updates.map((update) => [update.symbol, update]),
+      );
       setCryptos((prevCryptos) =>
         prevCryptos.map((crypto) => {
-          if (crypto.symbol === update.symbol) {
+          const update = updatesBySymbol.get(crypto.symbol);
+          if (update) {
             return {
               ...crypto,
               price: update.price,
@@ -231,28 +246,54 @@ export default function App() {
       );
     };
 
-    const onAddAlertFromBot = (data) => {
-      if (data?.pair && data.price) {
-        addAlert(data.pair, data.price);
-        toast(`Добавлен алерт для ${data.pair} из Telegram`, { icon: '🤖' });
+    // Алерт сработал на сервере (сообщение в Telegram сервер отправляет сам)
+    const onAlertTriggered = (data) => {
+      if (!data?.pair || !data.message) return;
+      toast.success(data.message, { duration: 10000, icon: '🔔' });
+      playNotificationSound();
+      // Условные алерты остаются активными, снимаются только ценовые уровни
+      if (data.kind !== 'price') return;
+      setLastTriggeredPrices((prev) => ({
+        ...prev,
+        [data.pair]: data.price,
+      }));
+      removeAlert(data.pair, data.price);
+    };
+
+    // Последние сработавшие цены, сохранённые на сервере
+    const onLastTriggeredPrices = (data) => {
+      if (data?.prices) {
+        setLastTriggeredPrices((prev) => ({ ...prev, ...data.prices }));
       }
     };
 
+    // Пара снята с торгов на Binance: сервер больше не получает по ней цены
+    const onSymbolDelisted = (data) => {
+      if (!data?.pair) return;
+      toast.error(`${data.pair} снята с торгов на Binance, цена больше не обновляется`, {
+        duration: 10000,
+      });
+    };
+
     socket.on('connect', onConnect);
     socket.on('disconnect', onDisconnect);
     socket.on('initial_prices', onInitialPrices);
-    socket.on('price_update', onPriceUpdate);
-    socket.on('add_alert_from_bot', onAddAlertFromBot);
+    socket.on('price_updates', onPriceUpdates);
+    socket.on('alert_triggered', onAlertTriggered);
+    socket.on('last_triggered_prices', onLastTriggeredPrices);
+    socket.on('symbol_delisted', onSymbolDelisted);
 
     return () => {
       document.removeEventListener('click', unlockAudio);
       socket.off('connect', onConnect);
       socket.off('disconnect', onDisconnect);
       socket.off('initial_prices', onInitialPrices);
-      socket.off('price_update', onPriceUpdate);
-      socket.off('add_alert_from_bot', onAddAlertFromBot);
+      socket.off('price_updates', onPriceUpdates);
+      socket.off('alert_triggered', onAlertTriggered);
+      socket.off('last_triggered_prices', onLastTriggeredPrices);
+      socket.off('symbol_delisted', onSymbolDelisted);
     };
-  }, [addAlert]);
+  }, [removeAlert, playNotificationSound]);
 
   const handleRemoveCrypto = useCallback((symbolToRemove) => {
     setCryptos((prevCryptos) =>
@@ -311,6 +352,7 @@ export default function App() {
   );
 
   useEffect(() => {
+    cryptosRef.current = cryptos;
     const symbols = cryptos.map((c) => c.symbol);
     localStorage.setItem(CRYPTO_SYMBOLS_STORAGE_KEY, JSON.stringify(symbols));
   }, [cryptos]);
@@ -326,7 +368,11 @@ export default function App() {
   }, [cryptos]);
 
   useEffect(() => {
+    alertsRef.current = alerts;
     localStorage.setItem(ALERTS_STORAGE_KEY, JSON.stringify(alerts));
+    if (socket.connected) {
+      socket.emit('sync_alerts', { alerts });
+    }
   }, [alerts]);
   useEffect(() => {
     localStorage.setItem(
@@ -335,53 +381,6 @@ export default function App() {
     );
   }, [lastTriggeredPrices]);
 
-  useEffect(() => {
-    cryptos.forEach((crypto) => {
-      const { price: currentPrice, previousPrice, pair: pairKey } = crypto;
-      if (
-        currentPrice === null ||
-        previousPrice === null ||
-        currentPrice === previousPrice
-      )
-        return;
-      const pairAlerts = alerts[pairKey] || [];
-
-      pairAlerts.forEach((targetAlert) => {
-        const targetPrice = targetAlert.price;
-        const alertId = `${pairKey}-${targetPrice}`;
-        if (triggeredAlertsRef.current[alertId]) return;
-
-        const minPrice = Math.min(previousPrice, currentPrice);
-        const maxPrice = Math.max(previousPrice, currentPrice);
-
-        if (targetPrice >= minPrice && targetPrice <= maxPrice) {
-          const movementDir = currentPrice > previousPrice ? '📈' : '📉';
-          const movementText =
-            currentPrice > previousPrice ? 'поднялась выше' : 'опустилась ниже';
-          const message = `${pairKey} ${movementDir} ${movementText} ${targetPrice.toFixed(
-            5,
-          )} USDT. (Сейчас: ${currentPrice.toFixed(5)} USDT)`;
-
-          toast.success(message, { duration: 10000, icon: '🔔' });
-          playNotificationSound();
-          sendTelegramMessageViaBackend(message);
-          triggeredAlertsRef.current[alertId] = true;
-          setLastTriggeredPrices((prev) => ({
-            ...prev,
-            [pairKey]: targetPrice,
-          }));
-          removeAlert(pairKey, targetPrice);
-        }
-      });
-    });
-  }, [
-    cryptos,
-    alerts,
-    removeAlert,
-    playNotificationSound,
-    setLastTriggeredPrices,
-  ]);
-
   const hasReceivedData = cryptos.some((c) => c.price !== null);
 
   const filteredCryptos = cryptos.filter(
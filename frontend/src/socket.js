@@ -2,10 +2,41 @@ import { io } from 'socket.io-client';
 
 // const SOCKET_SERVER_URL = 'http://localhost:5001';
 const SOCKET_SERVER_URL = import.meta.env.VITE_SOCKET_SERVER_URL;
+const CLIENT_ID_STORAGE_KEY = 'cryptoClientId';
+
+// Постоянный id браузера: по нему сервер хранит алерты клиента между вкладками и перезапусками
+const getClientId = () => {
+  let clientId = localStorage.getItem(CLIENT_ID_STORAGE_KEY);
+  if (!clientId) {
+    clientId = crypto.randomUUID();
+    localStorage.setItem(CLIENT_ID_STORAGE_KEY, clientId);
+  }
+  return clientId;
+};
+
+// Последний полученный пакет цен: при переподключении сервер досылает только пропущенное
+const priceStream = { epoch: null, lastSeq: null };
+
+export const rememberPriceSeq = (epoch, seq) => {
+  if (typeof seq !== 'number') return;
+  if (epoch) {
+    // Ответ на подключение: снимок или досылка - точка отсчёта (сервер мог перезапуститься)
+    priceStream.epoch = epoch;
+    priceStream.lastSeq = seq;
+  } else if (priceStream.lastSeq === null || seq > priceStream.lastSeq) {
+    priceStream.lastSeq = seq;
+  }
+};
 
 export const socket = io(SOCKET_SERVER_URL, {
   transports: ['websocket'],
   reconnection: true,
   reconnectionAttempts: Infinity,
   reconnectionDelay: 3000,
+  // auth-функция вызывается на каждое (пере)подключение, поэтому seq всегда актуален
+  auth: (cb) =>
+    cb({
+      clientId: getClientId(),
+      ...(priceStream.epoch && { epoch: priceStream.epoch, lastSeq: priceStream.lastSeq }),
+    }),
 });